@@ -0,0 +1,322 @@
+"""
+Пропускная способность, задержки, CPU и память клиента на эмуляторе шлюза сирены
+
+Эмулятор запускается в отдельном процессе, поэтому CPU и память считаются только для клиента.
+
+    python -m benchmarks.client
+    python -m benchmarks.client --requests 5000 --concurrency 64 --latency 0.005 --payload-size 50000
+    python -m benchmarks.client --scenario async_query --scenario sync_query --method order
+    python -m benchmarks.client --save before.json
+    python -m benchmarks.client --baseline before.json     # Разница с сохранённым прогоном
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import threading
+import tracemalloc
+from dataclasses import dataclass, field, asdict
+from datetime import date, timedelta
+from statistics import mean
+from time import perf_counter, process_time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from Crypto.PublicKey import RSA
+
+from benchmarks.gateway import SirenaGateway
+from utair.clients.external.sirena.base.client.async_client_batchable import AsyncBatchableClient
+from utair.clients.external.sirena.base.client.sync_client_batchable import SyncBatchableClient
+from utair.clients.external.sirena.base.connection import AsyncConnectionPool
+from utair.clients.external.sirena.base.connection.async_multiplexed_pool import AsyncMultiplexedConnectionPool
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
+from utair.clients.external.sirena.requests import GetCurrencyRates, GetOrder
+from utair.clients.external.sirena.requests.common import Passenger
+from utair.clients.external.sirena.requests.get_pricing_route import GetPricingRoute, PricingRouteSegment
+
+HOST = "127.0.0.1"
+CLIENT_ID = 42
+
+
+def make_request(method: str) -> RequestModelABC:
+    if method == "order":
+        return GetOrder(rloc="VN88T5", last_name="Тестфам")
+    if method == "pricing_route":
+        return GetPricingRoute(
+            segments=[PricingRouteSegment(departure="VKO", arrival="LED", departure_date=date.today() + timedelta(7))],
+            passengers=[Passenger(code="ADT", count=2), Passenger(code="CHD", count=1)],
+        )
+    return GetCurrencyRates(currency_one="RUB")
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int
+    seconds: float
+    rps: float
+    p50_ms: float
+    p99_ms: float
+    cpu_ms_per_request: float
+    alloc_kib_per_request: float
+    extra: Dict = field(default_factory=dict)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def _result(name: str, requests: int, seconds: float, cpu: float, latencies: List[float], alloc: List[int],
+            per_call: int, **extra) -> Result:
+    return Result(
+        name=name,
+        requests=requests,
+        seconds=seconds,
+        rps=requests / seconds,
+        p50_ms=_percentile(latencies, 50) * 1000,
+        p99_ms=_percentile(latencies, 99) * 1000,
+        cpu_ms_per_request=cpu / requests * 1000,
+        alloc_kib_per_request=mean(alloc) / per_call / 1024 if alloc else 0,
+        extra=extra,
+    )
+
+
+class Bench:
+
+    def __init__(self, options: argparse.Namespace, port: int, private_key: str):
+        self.options = options
+        self.port = port
+        self.private_key = private_key
+        self.request = make_request(options.method)
+
+    # Асинхронный клиент
+
+    def _async_client(self, pool: AsyncConnectionPool) -> AsyncBatchableClient:
+        return AsyncBatchableClient(HOST, self.port, CLIENT_ID, private_key=self.private_key, pool=pool)
+
+    async def _run_async(
+            self,
+            name: str,
+            client: AsyncBatchableClient,
+            call: Callable[[AsyncBatchableClient], Awaitable],
+            concurrency: int,
+            per_call: int = 1,
+    ) -> Result:
+        # Прогрев: хендшейк и соединения пула
+        await call(client)
+        calls = max(1, self.options.requests // per_call)
+        latencies: List[float] = []
+
+        async def worker():
+            while len(latencies) < calls:
+                started = perf_counter()
+                await call(client)
+                latencies.append(perf_counter() - started)
+
+        cpu, started = process_time(), perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        seconds, cpu = perf_counter() - started, process_time() - cpu
+
+        # Память отдельным последовательным прогоном, трассировка сильно замедляет клиента
+        alloc: List[int] = []
+        tracemalloc.start()
+        for _ in range(self.options.alloc_requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await call(client)
+            alloc.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+
+        stats = client.pool.stats
+        await client.pool.close()
+        return _result(
+            name, len(latencies) * per_call, seconds, cpu, latencies, alloc, per_call,
+            acquire_avg_ms=stats["acquire_time_avg"] * 1000,
+            acquire_max_ms=stats["acquire_time_max"] * 1000,
+        )
+
+    async def async_query(self) -> Result:
+        pool = AsyncConnectionPool(HOST, self.port, min_size=self.options.pool_size, max_size=self.options.pool_size)
+        return await self._run_async(
+            "async query", self._async_client(pool), lambda c: c.query(self.request), self.options.concurrency,
+        )
+
+    async def async_query_multiplexed(self) -> Result:
+        pool = AsyncMultiplexedConnectionPool(
+            HOST, self.port, min_size=1, max_size=self.options.pool_size, max_in_flight=self.options.concurrency,
+        )
+        return await self._run_async(
+            "async query multiplexed", self._async_client(pool), lambda c: c.query(self.request),
+            self.options.concurrency,
+        )
+
+    async def async_batch_query(self) -> Result:
+        pool = AsyncConnectionPool(HOST, self.port, min_size=self.options.pool_size, max_size=self.options.pool_size)
+        batch = [self.request] * self.options.batch_size
+        return await self._run_async(
+            "async batch_query", self._async_client(pool), lambda c: c.batch_query(batch),
+            max(1, self.options.concurrency // self.options.batch_size), per_call=self.options.batch_size,
+        )
+
+    async def pool_contention(self) -> Result:
+        # Запросов одновременно сильно больше, чем соединений в пуле
+        pool = AsyncConnectionPool(HOST, self.port, min_size=1, max_size=2)
+        return await self._run_async(
+            "pool contention", self._async_client(pool), lambda c: c.query(self.request),
+            self.options.concurrency * 4,
+        )
+
+    # Синхронный клиент: своё соединение на поток
+
+    def _sync_client(self) -> SyncBatchableClient:
+        client = SyncBatchableClient(HOST, self.port, CLIENT_ID, private_key=self.private_key)
+        client._ignore_connection_calls = True
+        client.connect(ignore=False)
+        return client
+
+    def _run_sync(
+            self,
+            name: str,
+            call: Callable[[SyncBatchableClient], object],
+            threads: int,
+            per_call: int = 1,
+    ) -> Result:
+        clients = [self._sync_client() for _ in range(threads)]
+        for client in clients:
+            call(client)
+        calls = max(1, self.options.requests // per_call)
+        latencies: List[float] = []
+
+        def worker(client: SyncBatchableClient):
+            while len(latencies) < calls:
+                started = perf_counter()
+                call(client)
+                latencies.append(perf_counter() - started)
+
+        workers = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        cpu, started = process_time(), perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        seconds, cpu = perf_counter() - started, process_time() - cpu
+
+        alloc: List[int] = []
+        tracemalloc.start()
+        for _ in range(self.options.alloc_requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            call(clients[0])
+            alloc.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+
+        for client in clients:
+            client.disconnect(ignore=False)
+        return _result(name, len(latencies) * per_call, seconds, cpu, latencies, alloc, per_call)
+
+    def sync_query(self) -> Result:
+        return self._run_sync("sync query", lambda c: c.query(self.request), self.options.threads)
+
+    def sync_batch_query(self) -> Result:
+        batch = [self.request] * self.options.batch_size
+        return self._run_sync(
+            "sync batch_query", lambda c: c.batch_query(batch), self.options.threads, per_call=self.options.batch_size,
+        )
+
+
+SCENARIOS = (
+    "async_query",
+    "async_query_multiplexed",
+    "async_batch_query",
+    "pool_contention",
+    "sync_query",
+    "sync_batch_query",
+)
+
+
+def _serve(queue: multiprocessing.Queue, gateway_options: Dict):
+    async def serve():
+        gateway = SirenaGateway(host=HOST, **gateway_options)
+        await gateway.start()
+        queue.put(gateway.port)
+        await gateway.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_gateway(gateway_options: Dict) -> (multiprocessing.Process, int):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(queue, gateway_options), daemon=True)
+    process.start()
+    return process, queue.get(timeout=30)
+
+
+def report(results: List[Result], baseline: Optional[Dict[str, Dict]] = None):
+    columns = ("rps", "p50_ms", "p99_ms", "cpu_ms_per_request", "alloc_kib_per_request")
+    print(f"{'scenario':<26}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu ms/req':>12}{'KiB/req':>10}")
+    for result in results:
+        values = asdict(result)
+        print(
+            f"{result.name:<26}{result.rps:>10.0f}{result.p50_ms:>10.2f}{result.p99_ms:>10.2f}"
+            f"{result.cpu_ms_per_request:>12.3f}{result.alloc_kib_per_request:>10.1f}"
+        )
+        if result.extra:
+            print(f"{'':<26}" + ", ".join(f"{k}: {v:.2f}" for k, v in result.extra.items()))
+        if baseline and result.name in baseline:
+            before = baseline[result.name]
+            deltas = [
+                f"{(values[c] - before[c]) / before[c] * 100:+.0f}%" if before.get(c) else "-" for c in columns
+            ]
+            print(f"{'  vs baseline':<26}{deltas[0]:>10}{deltas[1]:>10}{deltas[2]:>10}{deltas[3]:>12}{deltas[4]:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры клиента сирены на эмуляторе шлюза")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="по умолчанию все")
+    parser.add_argument("--method", default="get_currency_rates", choices=("get_currency_rates", "order",
+                                                                           "pricing_route"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4, help="потоки синхронного клиента")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--alloc-requests", type=int, default=50, help="запросы прогона с трассировкой памяти")
+    parser.add_argument("--latency", type=float, default=0.002, help="задержка ответа эмулятора, секунды")
+    parser.add_argument("--jitter", type=float, default=0.001)
+    parser.add_argument("--payload-size", type=int, default=20 * 1024)
+    parser.add_argument("--compress-level", type=int, default=6)
+    parser.add_argument("--save", help="сохранить результаты в json")
+    parser.add_argument("--baseline", help="сравнить с результатами из json")
+    options = parser.parse_args()
+
+    key = RSA.generate(1024)
+    process, port = start_gateway(dict(
+        client_public_key=key.publickey().export_key(),
+        latency=options.latency,
+        jitter=options.jitter,
+        payload_size=options.payload_size,
+        compress_level=options.compress_level,
+    ))
+    bench = Bench(options, port, key.export_key().decode())
+
+    results: List[Result] = []
+    try:
+        for scenario in options.scenario or SCENARIOS:
+            run = getattr(bench, scenario)
+            result = asyncio.run(run()) if asyncio.iscoroutinefunction(run) else run()
+            results.append(result)
+    finally:
+        process.terminate()
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    report(results, baseline)
+    if options.save:
+        with open(options.save, "w") as save_file:
+            json.dump({r.name: asdict(r) for r in results}, save_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
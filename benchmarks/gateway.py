@@ -0,0 +1,427 @@
+"""
+Эмулятор шлюза сирены для замеров клиента без доступа к настоящей сирене
+
+Говорит на том же протоколе: 100-байтный заголовок, сжатие, флаг "запрос не обработан",
+key_info, хендшейк открытым ключом и тела, зашифрованные симметричным ключом (DES).
+На запросы методов отвечает заготовленным xml заданного размера,
+задержку ответа, ошибки и время жизни симметричных ключей можно настроить.
+
+    python -m benchmarks.gateway --port 34323 --latency 0.005 --payload-size 20000 \\
+        --client-public-key path/to/client_pub.pem
+
+Открытый ключ клиента можно передать и запросом iclient_pub_key.
+"""
+import argparse
+import asyncio
+import random
+import re
+from itertools import count
+from struct import pack, unpack
+from time import time
+from typing import Callable, Dict, Optional, Set, Tuple, Union
+from zlib import compress, decompress
+
+from Crypto.Cipher import DES, PKCS1_v1_5
+from Crypto.Hash import SHA1
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+
+from utair.clients.external.sirena.base.messaging import Header
+from utair.clients.external.sirena.base.types import AsymEncryptionHandShake, PublicMethods
+
+# Флаги заголовка
+COMPRESSED = 0x04
+SYM_ENCRYPTED = 0x08
+COMPRESS_RESPONSE = 0x10
+ASYM_ENCRYPTED = 0x40
+NOT_PROCESSED = 0x01
+
+_METHOD_RE = re.compile(rb"<query>\s*<([\w-]+)")
+
+_FLIGHT = (
+    '<flight id="{n}"><company>UT</company><num>{num}</num>'
+    '<origin terminal="A">VKO</origin><destination terminal="B">LED</destination>'
+    '<deptdate>01.02.25</deptdate><deptime>10:{minute:02d}</deptime><airplane>73H</airplane>'
+    '<class baseclass="Y" seats="9">Y</class><subclass>Y</subclass><flightTime>0135</flightTime></flight>'
+)
+_VARIANT = (
+    '<variant><direction num="1">' + _FLIGHT + '</direction>'
+    '<variant_total currency="RUB">{num}00.00</variant_total>'
+    '<price brand="BASIC" fc="YOW" baggage="0PC"><fare remark="Тариф">{num}0</fare>'
+    '<taxes><tax code="YQ" owner="UT">500</tax></taxes><total>{num}00</total></price></variant>'
+)
+_SEGMENT = (
+    '<segment id="{n}" joint_id="{n}">' + _FLIGHT + '<status text="HK">HK</status>'
+    '<svc rfisc="0B5" emd="EMD" seg_id="{n}">Место у окна</svc></segment>'
+)
+_RATE = '<rate curr1="RUB" curr2="USD" owner="IATA" date="01.01.25">{num}.{minute:02d}</rate>'
+_ROUTE = '<route><origin>VKO</origin><destination>{num}</destination></route>'
+_DAY = '<flight_date date="{n}">' + _FLIGHT + '</flight_date>'
+
+# Метод -> (начало ответа, повторяемый элемент), элемент повторяется до payload_size байт
+ANSWER_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "pricing_route": ("", _VARIANT),
+    "pricing_mono_brand": ("", _VARIANT),
+    "pricing_route_and_mono_brand": ("", _VARIANT),
+    "pricing_variant": ("", _VARIANT),
+    "exchange_pricing": ("", _VARIANT),
+    "bl_pricing": ("", _VARIANT),
+    "availability": ("", _FLIGHT),
+    "schedule": ("", _FLIGHT),
+    "calendar": ("", _DAY),
+    "get_currency_rates": ("", _RATE),
+    "get_company_routes": ("", _ROUTE),
+    "order": ('<regnum version="1">VN88T5</regnum>', _SEGMENT),
+    "svc_add": ('<regnum version="1">VN88T5</regnum>', _SEGMENT),
+    "add_ssr": ('<regnum version="1">VN88T5</regnum>', _SEGMENT),
+    "view_flown_status": ("", _SEGMENT),
+}
+# Остальные методы отвечают коротким подтверждением
+DEFAULT_TEMPLATE: Tuple[str, str] = ("<ok/>", "")
+
+# Ответ метода целиком: (метод, размер) -> xml
+Answer = Callable[[str, int], bytes]
+
+
+def canned_answer(method: str, payload_size: int) -> bytes:
+    """
+    Заготовленный ответ метода размером около payload_size байт
+    """
+    head, item = ANSWER_TEMPLATES.get(method, DEFAULT_TEMPLATE)
+    items = []
+    size = 0
+    n = 0
+    while item and (not items or size < payload_size):
+        rendered = item.format(n=n, num=100 + n % 900, minute=n % 60)
+        items.append(rendered)
+        size += len(rendered.encode("utf-8"))
+        n += 1
+    return _document(f"<{method}>{head}{''.join(items)}</{method}>")
+
+
+def error_answer(method: str, code: int, text: str = "Ошибка эмулятора") -> bytes:
+    return _document(f'<{method}><error code="{code}">{text}</error></{method}>')
+
+
+def _document(answer: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<sirena><answer pult="ЭМУЛЯТОР" time="{int(time())}">{answer}</answer></sirena>'
+    ).encode("utf-8")
+
+
+class SymKey:
+    __slots__ = ("des", "expires_at")
+
+    def __init__(self, seed: bytes, expires_at: float):
+        self.des = DES.new(seed, DES.MODE_ECB)
+        self.expires_at = expires_at
+
+
+class SirenaGateway:
+    """
+    Эмулятор шлюза сирены на asyncio
+
+    Сообщения одного соединения обрабатываются параллельно,
+    ответы уходят по мере готовности с msg_id запроса (как при мультиплексировании).
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            client_public_key: Optional[Union[str, bytes, RSA.RsaKey]] = None,
+            latency: float = 0,
+            jitter: float = 0,
+            payload_size: int = 2 * 1024,
+            errors: Optional[Dict[str, int]] = None,
+            error_rate: float = 0,
+            error_code: int = 33002,
+            not_processed_rate: float = 0,
+            key_ttl: float = int(60 * 60 * 1.5),
+            compress_level: int = 6,
+            answers: Optional[Dict[str, Union[bytes, Answer]]] = None,
+            rsa_bits: int = 1024,
+    ):
+        """
+        :param client_public_key: открытый ключ клиента для ответа на хендшейк (PEM или RsaKey)
+        :param latency: задержка ответа, секунды
+        :param jitter: случайная добавка к задержке от 0 до jitter, секунды
+        :param payload_size: примерный размер ответа метода, байты
+        :param errors: метод -> код ошибки, которой всегда отвечает метод
+        :param error_rate: доля ответов с ошибкой error_code (по умолчанию "пульт занят")
+        :param not_processed_rate: доля ответов с флагом "запрос не обработан"
+        :param key_ttl: время жизни симметричного ключа, секунды, затем crypt_error=5
+        :param compress_level: уровень сжатия ответов, если клиент их принимает
+        :param answers: метод -> готовый xml или функция (метод, размер) -> xml
+        :param rsa_bits: длина ключа шлюза
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.payload_size = payload_size
+        self.errors: Dict[str, int] = errors or dict()
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.not_processed_rate = not_processed_rate
+        self.key_ttl = key_ttl
+        self.compress_level = compress_level
+        self.answers: Dict[str, Union[bytes, Answer]] = answers or dict()
+
+        self.private_key: RSA.RsaKey = RSA.generate(rsa_bits)
+        self.public_key_pem: str = self.private_key.publickey().export_key().decode()
+        self.client_public_key: Optional[RSA.RsaKey] = None
+        if client_public_key is not None:
+            self.register_client_key(client_public_key)
+
+        self._keys: Dict[int, SymKey] = dict()
+        self._last_key_id: int = 0
+        self._key_ids = count(1)
+        self._answers_cache: Dict[Tuple[str, int], bytes] = dict()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+
+        self.stats: Dict[str, int] = dict.fromkeys(
+            ("connections", "requests", "handshakes", "errors", "crypt_errors", "not_processed",
+             "bytes_in", "bytes_out"),
+            0,
+        )
+
+    async def __aenter__(self) -> "SirenaGateway":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Соединения клиентов закрываем сами, иначе обработчики отменит остановка цикла
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    def register_client_key(self, key: Union[str, bytes, RSA.RsaKey]):
+        self.client_public_key = key if isinstance(key, RSA.RsaKey) else RSA.import_key(key)
+
+    def expire_keys(self):
+        """Сирена забыла все симметричные ключи (как после истечения срока)"""
+        self._keys.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats["connections"] += 1
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    raw_header = await reader.readexactly(Header.size)
+                    header = Header.parse(raw_header)
+                    body = await reader.readexactly(header.chunk_len)
+                except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+                    # Клиент закрыл соединение или шлюз останавливается
+                    break
+                self.stats["bytes_in"] += Header.size + header.chunk_len
+                task = asyncio.ensure_future(self._process(header, body, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            self._handlers.discard(handler)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _process(self, header: Header, body: bytes, writer: asyncio.StreamWriter):
+        self.stats["requests"] += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        message = self.respond(header, body)
+        if writer.is_closing():
+            return
+        self.stats["bytes_out"] += len(message)
+        writer.write(message)
+
+    def respond(self, header: Header, body: bytes) -> bytes:
+        """
+        Ответ на сообщение: заголовок и тело
+        """
+        if self.not_processed_rate and random.random() < self.not_processed_rate:
+            self.stats["not_processed"] += 1
+            return self._message(header, b"", 0x00, success_flag=NOT_PROCESSED)
+
+        if header.meta_flag & ASYM_ENCRYPTED:
+            return self._hand_shake(header, body)
+
+        key: Optional[SymKey] = None
+        if header.meta_flag & SYM_ENCRYPTED:
+            key = self._get_key(header.key_id)
+            if key is None:
+                self.stats["crypt_errors"] += 1
+                return self._message(header, self._crypt_error(), 0x00)
+            body = self._un_pad(key.des.decrypt(body))
+        if header.meta_flag & COMPRESSED:
+            body = decompress(body)
+
+        method = self._method_name(body)
+        answer = self._answer(method, body)
+
+        flags = 0x00
+        if header.meta_flag & COMPRESS_RESPONSE:
+            compressed = compress(answer, self.compress_level)
+            if len(compressed) < len(answer):
+                answer, flags = compressed, COMPRESSED
+        if key is not None:
+            answer, flags = key.des.encrypt(self._pad(answer)), flags | SYM_ENCRYPTED
+        return self._message(header, answer, flags)
+
+    def _answer(self, method: str, body: bytes) -> bytes:
+        if method == PublicMethods.KEY_INFO.value:
+            return _document(
+                "<key_info><key_manager>"
+                f"<server_public_key>{self.public_key_pem}</server_public_key>"
+                "</key_manager></key_info>"
+            )
+        if method == PublicMethods.I_CLIENT_PUB_KEY.value:
+            pem = re.search(rb"<pub_key>(.*?)</pub_key>", body, re.S)
+            self.register_client_key(pem.group(1).strip())
+            return _document(f"<{method}><ok/></{method}>")
+
+        code = self.errors.get(method)
+        if code is None and self.error_rate and random.random() < self.error_rate:
+            code = self.error_code
+        if code is not None:
+            self.stats["errors"] += 1
+            return error_answer(method, code)
+
+        answer = self.answers.get(method)
+        if isinstance(answer, bytes):
+            return answer
+        key = (method, self.payload_size)
+        if key not in self._answers_cache:
+            self._answers_cache[key] = (answer or canned_answer)(method, self.payload_size)
+        return self._answers_cache[key]
+
+    def _hand_shake(self, header: Header, body: bytes) -> bytes:
+        """
+        Тело: длина зашифрованного ключа (4 байта), ключ, зашифрованный открытым ключом шлюза, подпись клиента
+        В ответ - тот же ключ, зашифрованный открытым ключом клиента, и его key_id в заголовке
+        """
+        method = AsymEncryptionHandShake.ASYM_HAND_SHAKE.value
+        if self.client_public_key is None:
+            return self._message(header, error_answer(method, -42, "Client public key is not registered"), 0x00)
+        (length,) = unpack("!i", body[:4])
+        encrypted, signature = body[4:4 + length], body[4 + length:]
+        seed = PKCS1_v1_5.new(self.private_key).decrypt(encrypted, None)
+        try:
+            pkcs1_15.new(self.client_public_key).verify(SHA1.new(encrypted), signature)
+        except (ValueError, TypeError):
+            seed = None
+        if not seed or len(seed) != 8:
+            return self._message(header, error_answer(method, -42, "Invalid symmetric key"), 0x00)
+
+        self.stats["handshakes"] += 1
+        key_id = next(self._key_ids)
+        self._keys[key_id] = SymKey(seed, time() + self.key_ttl)
+        self._last_key_id = key_id
+        answer = PKCS1_v1_5.new(self.client_public_key).encrypt(seed)
+        return self._message(header, pack("!i", len(answer)) + answer, ASYM_ENCRYPTED, key_id=key_id)
+
+    def _get_key(self, key_id: int) -> Optional[SymKey]:
+        # Нулевой идентификатор - последний зарегистрированный ключ
+        key = self._keys.get(key_id or self._last_key_id)
+        if key is not None and time() >= key.expires_at:
+            del self._keys[key_id or self._last_key_id]
+            return None
+        return key
+
+    @staticmethod
+    def _crypt_error() -> bytes:
+        return _document('<error code="-1" crypt_error="5" text="Неизвестный симметричный ключ"/>')
+
+    @staticmethod
+    def _method_name(body: bytes) -> str:
+        match = _METHOD_RE.search(body)
+        return match.group(1).decode() if match else "unknown"
+
+    @staticmethod
+    def _pad(body: bytes) -> bytes:
+        one = 8 - len(body) % 8
+        return body + bytes([one]) * one
+
+    @staticmethod
+    def _un_pad(body: bytes) -> bytes:
+        one = body[-1] if body else 0
+        return body[:-one] if 0 < one <= 8 else body
+
+    @staticmethod
+    def _message(request: Header, body: bytes, flags: int, success_flag: int = 0x00, key_id: int = None) -> bytes:
+        header = Header(
+            len(body), int(time()), request.msg_id, request.client_id, flags, success_flag,
+            request.key_id if key_id is None else key_id,
+        )
+        return header.to_bytes() + body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эмулятор шлюза сирены")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=34323)
+    parser.add_argument("--client-public-key", help="путь к открытому ключу клиента (PEM)")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--payload-size", type=int, default=2 * 1024)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-code", type=int, default=33002)
+    parser.add_argument("--not-processed-rate", type=float, default=0)
+    parser.add_argument("--key-ttl", type=float, default=int(60 * 60 * 1.5))
+    parser.add_argument("--compress-level", type=int, default=6)
+    args = parser.parse_args()
+
+    client_public_key = None
+    if args.client_public_key:
+        with open(args.client_public_key, "rb") as key_file:
+            client_public_key = key_file.read()
+
+    gateway = SirenaGateway(
+        host=args.host,
+        port=args.port,
+        client_public_key=client_public_key,
+        latency=args.latency,
+        jitter=args.jitter,
+        payload_size=args.payload_size,
+        error_rate=args.error_rate,
+        error_code=args.error_code,
+        not_processed_rate=args.not_processed_rate,
+        key_ttl=args.key_ttl,
+        compress_level=args.compress_level,
+    )
+
+    async def serve():
+        await gateway.start()
+        print(f"Sirena gateway emulator on {gateway.host}:{gateway.port}")
+        await gateway.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(gateway.stats)
+
+
+if __name__ == "__main__":
+    main()
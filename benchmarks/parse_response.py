@@ -0,0 +1,159 @@
+"""
+Сравнение движков разбора ответов сирены на больших ответах pricing_route и order
+Совпадение результата с xmltodict проверяет tests/test_response_parser.py
+
+    python -m benchmarks.parse_response
+"""
+import random
+import timeit
+from time import time
+
+from utair.clients.external.sirena.base.messaging import Header, Response
+from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
+from utair.clients.external.sirena.base.models.response_parser import (
+    ResponseParserABC,
+    XmlToDictParser,
+    ElementTreeParser,
+)
+
+random.seed(42)
+
+
+def _flight(n: int) -> str:
+    return f"""
+        <flight id="{n}">
+          <company>UT</company>
+          <num>{random.randint(100, 999)}</num>
+          <origin terminal="A">VKO</origin>
+          <destination terminal="B">LED</destination>
+          <deptdate>01.02.25</deptdate>
+          <deptime>{random.randint(0, 23):02d}:{random.randint(0, 59):02d}</deptime>
+          <airplane>73H</airplane>
+          <class baseclass="Y" seats="{random.randint(0, 9)}">Y</class>
+          <subclass>{random.choice("YBMHQ")}</subclass>
+          <flightTime>0135</flightTime>
+        </flight>"""
+
+
+def pricing_route_xml(variants: int) -> bytes:
+    body = "".join(
+        f"""
+      <variant>
+        <direction num="1">{_flight(i)}</direction>
+        <direction num="2">{_flight(i + 1)}{_flight(i + 2)}</direction>
+        <variant_total currency="RUB">{random.randint(1000, 99999)}.00</variant_total>
+        <price brand="BASIC" fc="YOW" baggage="0PC">
+          <fare remark="Тариф &amp; условия" fare_expdate="2025-02-01">{random.randint(1000, 9999)}</fare>
+          <taxes><tax code="YQ" owner="UT">500</tax><tax code="RI" owner="UT">200</tax></taxes>
+          <total>{random.randint(1000, 99999)}</total>
+        </price>
+      </variant>"""
+        for i in range(variants)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sirena>
+  <answer pult="ЦППКУТ" msgid="1" time="01.01.2025">
+    <pricing_route>{body}
+    </pricing_route>
+  </answer>
+</sirena>""".encode("utf-8")
+
+
+def order_xml(passengers: int, segments: int) -> bytes:
+    pax = "".join(
+        f"""
+      <passenger id="{i}" lead_pass="{str(i == 0).lower()}">
+        <name>IVAN{i}</name><surname>ИВАНОВ</surname><sex>male</sex><category rbm="ADT">ААА</category>
+        <doccode>PS</doccode><doc>{random.randint(10 ** 9, 10 ** 10)}</doc><birthdate>01.01.1990</birthdate>
+        <contacts><phone type="mobile">+79000000000</phone><email>ivan{i}@example.com</email></contacts>
+      </passenger>"""
+        for i in range(passengers)
+    )
+    segs = "".join(
+        f"""
+      <segment id="{i}" joint_id="{i}">{_flight(i)}
+        <status text="HK">HK</status>
+        <ssr code="FQTV" pass_id="1" seg_id="{i}">UT123456</ssr>
+        <svc rfisc="0B5" emd="EMD" seg_id="{i}">Место у окна</svc>
+      </segment>"""
+        for i in range(segments)
+    )
+    prices = "".join(
+        f"""
+      <price pass_id="{p}" segment-id="{s}" currency="RUB" ticket_cpn="1">
+        <fare code="YOW" base_code="YOW">{random.randint(1000, 9999)}</fare>
+        <tax code="YQ">500</tax><tax code="RI">200</tax>
+      </price>"""
+        for p in range(passengers)
+        for s in range(segments)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sirena>
+  <answer pult="ЦППКУТ" msgid="2" time="01.01.2025">
+    <order>
+      <regnum version="12">VN88T5</regnum>
+      <passengers>{pax}
+      </passengers>
+      <segments>{segs}
+      </segments>
+      <prices>{prices}
+      </prices>
+      <remarks>Текст \x07ремарки</remarks>
+    </order>
+  </answer>
+</sirena>""".encode("utf-8")
+
+
+def _response(payload: bytes, method_name: str) -> Response:
+    response = Response(Header(len(payload), int(time()), 1, 1, 0x00, 0x00), method_name=method_name)
+    response.payload = payload
+    return response
+
+
+def legacy(payload: bytes, method_name: str, parser: ResponseParserABC):
+    """Как было: декодирование в строку, полный разбор, затем data"""
+    response = _response(payload.decode("utf-8"), method_name)
+    ResponseModelABC.parser = parser
+    return ResponseModelABC.parse(response).data
+
+
+def full(payload: bytes, method_name: str, parser: ResponseParserABC):
+    """Разбор из байт, ответ целиком (payload)"""
+    ResponseModelABC.parser = parser
+    return ResponseModelABC.parse(_response(payload, method_name)).payload
+
+
+def data_only(payload: bytes, method_name: str, parser: ResponseParserABC):
+    """Разбор из байт, только данные метода (data)"""
+    ResponseModelABC.parser = parser
+    return ResponseModelABC.parse(_response(payload, method_name)).data
+
+
+def errors_only(payload: bytes, method_name: str, parser: ResponseParserABC):
+    """Только проверка на ошибки, к данным не обращаемся"""
+    ResponseModelABC.parser = parser
+    return ResponseModelABC.parse(_response(payload, method_name))
+
+
+CASES = [
+    ("legacy xmltodict, str", legacy, XmlToDictParser()),
+    ("xmltodict, bytes, payload", full, XmlToDictParser()),
+    ("etree eager, payload", full, ElementTreeParser(lazy=False)),
+    ("etree lazy, payload", full, ElementTreeParser(lazy=True)),
+    ("etree lazy, data", data_only, ElementTreeParser(lazy=True)),
+    ("etree lazy, errors only", errors_only, ElementTreeParser(lazy=True)),
+]
+
+
+def run(name: str, payload: bytes, method_name: str, number: int = 5):
+    print(f"\n{name}: {len(payload) / 1024 / 1024:.1f} MB")
+    baseline = None
+    for case, func, parser in CASES:
+        seconds = min(timeit.repeat(lambda: func(payload, method_name, parser), number=1, repeat=number))
+        baseline = baseline or seconds
+        print(f"  {case:<28} {seconds * 1000:>9.1f} ms  x{baseline / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    run("pricing_route", pricing_route_xml(variants=3000), "pricing_route")
+    run("order", order_xml(passengers=9, segments=40), "order")
@@ -0,0 +1,60 @@
+"""
+Сборка xml запросов к сирене: сравнение скорости XmlSerializer и xmltodict
+
+Побайтовое совпадение на всех моделях из requests и на случайных словарях проверяет tests/test_request_serializer.py
+
+    python -m benchmarks.serialize_request
+"""
+import timeit
+from datetime import date, timedelta
+
+from utair.clients.external.sirena.base.models.request_serializer import XmlSerializer, XmlToDictSerializer
+from utair.clients.external.sirena.requests import GetOrder
+from utair.clients.external.sirena.requests.common import Passenger, RequestParams, AnswerParams
+from utair.clients.external.sirena.requests.get_pricing_route import GetPricingRoute, PricingRouteSegment
+from utair.clients.external.sirena.requests.pnr_status import PnrStatus
+
+LEGACY = XmlToDictSerializer()
+COMPILED = XmlSerializer()
+
+
+def pricing_route(segments: int, passengers: int) -> GetPricingRoute:
+    return GetPricingRoute(
+        segments=[
+            PricingRouteSegment(departure="VKO", arrival="LED", departure_date=date.today() + timedelta(i))
+            for i in range(segments)
+        ],
+        passengers=[Passenger(code="ADT", count=1, age=30 + i) for i in range(passengers)],
+        request_params=RequestParams(min_results=10, max_results=100),
+        answer_params=AnswerParams(),
+    )
+
+
+CASES = [
+    ("pnr_status", PnrStatus(rloc="VN88T5")),
+    ("order", GetOrder(rloc="VN88T5", last_name="Тестфам")),
+    ("pricing_route 2x3", pricing_route(segments=2, passengers=3)),
+    ("pricing_route 6x9", pricing_route(segments=6, passengers=9)),
+]
+
+
+def run(number: int = 2000):
+    print(f"\n{'запрос':<22}{'xmltodict':>14}{'XmlSerializer':>16}")
+    for name, request in CASES:
+        payload = request.build()
+        legacy = min(timeit.repeat(lambda: LEGACY.serialize(request.method_name, payload), number=number, repeat=5))
+        compiled = min(timeit.repeat(
+            lambda: COMPILED.serialize(request.method_name, payload), number=number, repeat=5,
+        ))
+        print(
+            f"{name:<22}{legacy / number * 1e6:>11.1f} us{compiled / number * 1e6:>13.1f} us"
+            f"  x{legacy / compiled:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    for _, request in CASES:
+        assert COMPILED.serialize(request.method_name, request.build()) == LEGACY.serialize(
+            request.method_name, request.build()
+        )
+    run()
@@ -0,0 +1,68 @@
+"""
+Ключ для расшифровки ответа берётся по key_id из заголовка:
+истёкшие и сброшенные ключи ещё decrypt_grace секунд расшифровывают ответы, но новые запросы ими не шифруются
+"""
+from time import time
+
+import pytest
+
+from utair.clients.external.sirena.base.cache.sync_cache import SyncCacheController
+from utair.clients.external.sirena.base.client.sync_key_manager import SyncKeyManager
+
+
+@pytest.fixture
+def manager() -> SyncKeyManager:
+    return SyncKeyManager(SyncCacheController(None))
+
+
+def register(manager: SyncKeyManager, key_id: int, expires_at: float):
+    keys = manager.new_keys()
+    keys.sym_key_id = key_id
+    return manager.register(keys, expires_at)
+
+
+def test_key_by_id(manager: SyncKeyManager):
+    old = register(manager, 1, time() + 60)
+    new = register(manager, 2, time() + 120)
+
+    assert manager.current is new
+    assert manager.get(1) is old
+    assert manager.get(2) is new
+    # Без идентификатора в заголовке - действующий
+    assert manager.get(0) is new
+
+
+def test_unknown_key_is_not_replaced_by_current(manager: SyncKeyManager):
+    register(manager, 1, time() + 60)
+
+    assert manager.get(42) is None
+
+
+def test_expired_key_decrypts_during_grace(manager: SyncKeyManager):
+    expired = register(manager, 1, time() - 1)
+
+    assert manager.current is None
+    assert manager.get(1) is expired
+
+    manager.decrypt_grace = 0
+    assert manager.get(1) is None
+
+
+def test_invalidated_key_decrypts_during_grace(manager: SyncKeyManager):
+    invalid = register(manager, 1, time() + 60)
+    manager.invalidate(1)
+
+    assert manager.current is None
+    assert manager.get(1) is invalid
+
+    manager.decrypt_grace = 0
+    assert manager.get(1) is None
+
+
+def test_retired_keys_are_dropped(manager: SyncKeyManager):
+    manager.decrypt_grace = 0
+    register(manager, 1, time() - 1)
+    register(manager, 2, time() + 60)
+
+    assert 1 not in manager._keys
+    assert 2 in manager._keys
@@ -0,0 +1,125 @@
+"""
+Тело ответа, которое не удалось расшифровать или распаковать или для которого уже нет ключа,
+дочитывается из соединения: следующий ответ в том же соединении читается с заголовка
+"""
+import asyncio
+import socket
+import zlib
+from time import time
+
+import pytest
+
+from utair.clients.external.sirena.base.client.async_client import AsyncClient
+from utair.clients.external.sirena.base.client.sync_client import SyncClient
+from utair.clients.external.sirena.base.messaging import Header
+from utair.clients.external.sirena.exceptions import SirenaEncryptionKeyError
+
+# Ключ не разбирается: хендшейка в тестах нет, ответы не зашифрованы
+PRIVATE_KEY = "private key"
+METHOD = "get_currency_rates"
+COMPRESSED = 0x04
+SYM_ENCRYPTED = 0x08
+XML = b'<?xml version="1.0" encoding="UTF-8"?><sirena><answer><get_currency_rates/></answer></sirena>'
+
+
+def message(body: bytes, meta_flag: int = 0, msg_id: int = 1, key_id: int = 0) -> bytes:
+    return Header(len(body), int(time()), msg_id, 1, meta_flag, 0, key_id).to_bytes() + body
+
+
+# Битое сжатое тело длиннее куска чтения, за ним нормальный ответ
+STREAM = message(b"\xff" * 3000, COMPRESSED) + message(zlib.compress(XML), COMPRESSED, msg_id=2)
+# Ответ, зашифрованный неизвестным клиенту ключом, за ним нормальный ответ
+UNKNOWN_KEY_STREAM = message(b"\xff" * 3000, SYM_ENCRYPTED, key_id=77) + message(XML, msg_id=2)
+
+
+class StreamConnection:
+    """Соединение, которое читает ответы из готового потока байт"""
+    multiplexed = False
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+        self.disconnected = False
+
+    async def read_exactly(self, size: int) -> bytes:
+        chunk = self.data[self.position:self.position + size]
+        self.position += size
+        return chunk
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+def test_async_client_skips_broken_body():
+    async def run():
+        client = AsyncClient("127.0.0.1", 1, 1, private_key=PRIVATE_KEY)
+        client.read_chunk_size = 1024
+        connection = StreamConnection(STREAM)
+
+        response = client.response_factory(Header.parse(await client._read_header(connection)), METHOD)
+        with pytest.raises(zlib.error):
+            await client._read_body(response, connection)
+
+        response = client.response_factory(Header.parse(await client._read_header(connection)), METHOD)
+        await client._read_body(response, connection)
+        assert response.msg_id == 2
+        assert response.raw_payload == XML
+        assert connection.position == len(STREAM)
+        assert not connection.disconnected
+
+    asyncio.run(run())
+
+
+def test_sync_client_skips_broken_body():
+    client = SyncClient("127.0.0.1", 1, 1, private_key=PRIVATE_KEY)
+    client.read_chunk_size = 1024
+    client._connection, server = socket.socketpair()
+    try:
+        server.sendall(STREAM)
+
+        response = client.response_factory(Header.parse(client._read_header()), METHOD)
+        with pytest.raises(zlib.error):
+            client._read_body(response)
+
+        response = client.response_factory(Header.parse(client._read_header()), METHOD)
+        client._read_body(response)
+        assert response.msg_id == 2
+        assert response.raw_payload == XML
+    finally:
+        client._connection.close()
+        server.close()
+
+
+def test_async_client_skips_body_with_unknown_key():
+    async def run():
+        client = AsyncClient("127.0.0.1", 1, 1, private_key=PRIVATE_KEY)
+        connection = StreamConnection(UNKNOWN_KEY_STREAM)
+
+        with pytest.raises(SirenaEncryptionKeyError):
+            await client._response_for(Header.parse(await client._read_header(connection)), METHOD, connection)
+
+        response = await client._response_for(Header.parse(await client._read_header(connection)), METHOD, connection)
+        await client._read_body(response, connection)
+        assert response.msg_id == 2
+        assert response.raw_payload == XML
+        assert connection.position == len(UNKNOWN_KEY_STREAM)
+
+    asyncio.run(run())
+
+
+def test_sync_client_skips_body_with_unknown_key():
+    client = SyncClient("127.0.0.1", 1, 1, private_key=PRIVATE_KEY)
+    client._connection, server = socket.socketpair()
+    try:
+        server.sendall(UNKNOWN_KEY_STREAM)
+
+        with pytest.raises(SirenaEncryptionKeyError):
+            client._response_for(Header.parse(client._read_header()), METHOD)
+
+        response = client._response_for(Header.parse(client._read_header()), METHOD)
+        client._read_body(response)
+        assert response.msg_id == 2
+        assert response.raw_payload == XML
+    finally:
+        client._connection.close()
+        server.close()
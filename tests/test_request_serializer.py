@@ -0,0 +1,141 @@
+"""
+XmlSerializer собирает xml запроса побайтово так же, как XmlToDictSerializer (xmltodict)
+
+Для каждой модели из requests проверяются два запроса: только обязательные поля и все поля заполнены.
+Плюс случайные словари с пустыми значениями, атрибутами, текстом и вложенными списками.
+"""
+import enum
+import importlib
+import inspect
+import pkgutil
+import random
+import typing
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Type
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from utair.clients.external.sirena import requests
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
+from utair.clients.external.sirena.base.models.request_serializer import XmlSerializer, XmlToDictSerializer
+
+LEGACY = XmlToDictSerializer()
+COMPILED = XmlSerializer()
+
+RANDOM_SEEDS = range(10)
+RANDOM_PAYLOADS = 2000
+
+
+def sample(annotation: Any, filled: bool, name: str = "") -> Any:
+    """Значение поля по аннотации"""
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin is typing.Union:
+        return sample(next(a for a in args if a is not type(None)), filled, name)
+    if origin is typing.Literal:
+        return args[0]
+    if origin in (list, List):
+        return [sample(args[0] if args else str, filled) for _ in range(2)]
+    if origin in (dict, typing.Dict) or annotation in (dict, typing.Dict):
+        return {"key": "значение & <ключ>", "empty": None, "nested": {"value": 1.5, "none": []}}
+    if inspect.isclass(annotation):
+        if issubclass(annotation, BaseModel):
+            return model(annotation, filled)
+        if issubclass(annotation, enum.Enum):
+            return list(annotation)[0]
+        if issubclass(annotation, bool):
+            return True
+        if issubclass(annotation, int):
+            return 7
+        if issubclass(annotation, float):
+            return 1250.5
+        if issubclass(annotation, Decimal):
+            return Decimal("99.90")
+        if issubclass(annotation, datetime):
+            return datetime(2025, 2, 1, 10, 30)
+        if issubclass(annotation, date) or name.endswith("date"):
+            # Некоторые даты объявлены строкой, но build() ждёт date
+            return date(2025, 2, 1)
+    return "UT-123 Тест"
+
+
+def model(cls: Type[BaseModel], filled: bool) -> BaseModel:
+    values = {
+        name: sample(field.annotation, filled, name)
+        for name, field in cls.model_fields.items()
+        if filled or field.is_required() or name.endswith("date")
+    }
+    try:
+        return cls(**values)
+    except ValidationError:
+        # Дата в поле, объявленном строкой
+        return cls.model_construct(**values)
+
+
+def request_models() -> List[Type[RequestModelABC]]:
+    """Все модели запросов, вместе с вложенными частями"""
+    for module in pkgutil.iter_modules(requests.__path__):
+        try:
+            importlib.import_module(f"{requests.__name__}.{module.name}")
+        except Exception:  # noqa: модуль не импортируется с установленной версией pydantic
+            pass
+    models, pending = set(), list(RequestModelABC.__subclasses__())
+    while pending:
+        cls = pending.pop()
+        if cls in models:
+            continue
+        models.add(cls)
+        pending.extend(cls.__subclasses__())
+    return sorted(
+        (cls for cls in models if cls.__module__.startswith(requests.__name__) and not inspect.isabstract(cls)),
+        key=lambda cls: (cls.__module__, cls.__name__),
+    )
+
+
+def random_payload(rnd: random.Random, depth: int = 0) -> Any:
+    roll = rnd.random()
+    if depth > 3 or roll < 0.35:
+        return rnd.choice([
+            None, "", "a < b & c > \"d\"", "Тест", 0, 1, 1.5, 0.0, True, False, [], {}, (), ("x", None),
+        ])
+    if roll < 0.7:
+        payload = dict()
+        for _ in range(rnd.randint(0, 4)):
+            key = rnd.choice(["a", "b", "c", "@id", "@type", "#text"])
+            value = random_payload(rnd, depth + 1)
+            # Атрибуты и текст xmltodict принимает только строкой
+            payload[key] = str(value) if key[0] in "@#" and value is not None else value
+        return payload
+    return [random_payload(rnd, depth + 1) for _ in range(rnd.randint(0, 4))]
+
+
+@pytest.mark.parametrize("filled", [False, True], ids=["required", "filled"])
+@pytest.mark.parametrize("cls", request_models(), ids=lambda cls: cls.__name__)
+def test_request_model(cls: Type[RequestModelABC], filled: bool):
+    request = model(cls, filled)
+    payload = request.build()
+    method_name = request._method_name or "nested"  # У вложенных частей метода нет
+    assert COMPILED.serialize(method_name, payload) == LEGACY.serialize(method_name, payload)
+
+
+@pytest.mark.parametrize("seed", RANDOM_SEEDS)
+def test_random_payloads(seed: int):
+    rnd = random.Random(seed)
+    for _ in range(RANDOM_PAYLOADS):
+        payload = random_payload(rnd)
+        assert COMPILED.serialize("method", payload) == LEGACY.serialize("method", payload), payload
+
+
+@pytest.mark.parametrize("payload", [
+    None,
+    {},
+    [],
+    {"a": None, "b": [], "c": {}},
+    {"a": [None, {}, [], {"b": None}]},
+    {"a": {"b": {"c": None}}, "d": 0, "e": False, "f": ""},
+    {"@id": "1", "#text": "текст & <теги>", "child": {"@empty": None, "#text": ""}},
+    {"a": 1.0, "b": [0.5, {"c": 2.25}], "d": ("x", None)},
+], ids=str)
+def test_empty_and_nested_values(payload: Any):
+    assert COMPILED.serialize("method", payload) == LEGACY.serialize("method", payload)
@@ -0,0 +1,157 @@
+"""
+ElementTreeParser (сразу и лениво) разбирает ответ так же, как XmlToDictParser (xmltodict)
+
+Сравниваются ответ целиком (to_dict) и поддерево answer/<method> (find):
+force_list, текст вперемешку с тегами, атрибуты, повторяющиеся теги,
+недопустимые символы и xml с пространствами имён, который уходит в xmltodict.
+"""
+from time import time
+
+import pytest
+
+from utair.clients.external.sirena.base.messaging import Header, Response
+from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
+from utair.clients.external.sirena.base.models.response_parser import (
+    ElementTreeDocument,
+    ElementTreeParser,
+    XmlToDictParser,
+)
+
+PARSERS = [ElementTreeParser(lazy=False), ElementTreeParser(lazy=True)]
+
+
+def answer(method_name: str, body: str) -> bytes:
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sirena>
+  <answer pult="ЦППКУТ" msgid="1" time="01.01.2025">
+    <{method_name}>{body}</{method_name}>
+  </answer>
+</sirena>""".encode("utf-8")
+
+
+CASES = {
+    "force_list": (
+        "order",
+        """
+        <passengers><passenger id="1"><name>IVAN</name></passenger></passengers>
+        <segments><segment id="1"><ssr code="FQTV">UT1</ssr></segment></segments>
+        """,
+    ),
+    "force_list_repeated": (
+        "order",
+        """
+        <passengers>
+          <passenger id="1"><name>IVAN</name></passenger>
+          <passenger id="2"><name>PETR</name></passenger>
+        </passengers>
+        """,
+    ),
+    "mixed_text": (
+        "pricing_route",
+        "<variant>текст <flight>UT1</flight> ещё <flight>UT2</flight> хвост</variant>",
+    ),
+    "attributes": (
+        "pricing_route",
+        """
+        <variant num="1">
+          <fare remark="Тариф &amp; условия" fare_expdate="2025-02-01">1000</fare>
+          <class baseclass="Y" seats="9"/>
+        </variant>
+        """,
+    ),
+    "repeated": (
+        "pricing_route",
+        """
+        <variant><tax code="YQ">500</tax><tax code="RI">200</tax><tax>100</tax></variant>
+        <variant><tax code="YQ">500</tax></variant>
+        """,
+    ),
+    "empty": ("pricing_route", "<variant/><variant></variant><variant>  </variant>"),
+    "empty_method": ("pricing_route", ""),
+    "text_only": ("get_currency_rates", "RUB"),
+}
+
+
+def expected(payload: bytes, method_name: str):
+    return XmlToDictParser().parse(payload, method_name, ResponseModelABC._get_force_list(method_name))
+
+
+@pytest.mark.parametrize("parser", PARSERS, ids=["eager", "lazy"])
+@pytest.mark.parametrize("case", CASES, ids=list(CASES))
+def test_same_as_xmltodict(parser: ElementTreeParser, case: str):
+    method_name, body = CASES[case]
+    payload = answer(method_name, body)
+    legacy = expected(payload, method_name).to_dict()
+
+    document = parser.parse(payload, method_name, ResponseModelABC._get_force_list(method_name))
+    assert isinstance(document, ElementTreeDocument)
+    assert document.find("answer", method_name) == legacy["answer"][method_name]
+    assert document.to_dict() == legacy
+
+    # Сначала весь документ, потом поддерево
+    document = parser.parse(payload, method_name, ResponseModelABC._get_force_list(method_name))
+    assert document.to_dict() == legacy
+    assert document.find("answer", method_name) == legacy["answer"][method_name]
+
+
+@pytest.mark.parametrize("parser", PARSERS, ids=["eager", "lazy"])
+def test_invalid_bytes_are_stripped(parser: ElementTreeParser):
+    payload = answer("order", "<remarks>Текст \x07ремарки\x01</remarks><regnum>VN\x0b88T5</regnum>")
+    sanitized = answer("order", "<remarks>Текст ремарки</remarks><regnum>VN88T5</regnum>")
+
+    document = parser.parse(payload, "order", ResponseModelABC._get_force_list("order"))
+    assert isinstance(document, ElementTreeDocument)
+    assert document.to_dict() == expected(sanitized, "order").to_dict()
+    # xmltodict вырезает их по одному, повторяя разбор
+    assert document.to_dict() == expected(payload, "order").to_dict()
+
+
+@pytest.mark.parametrize("parser", PARSERS, ids=["eager", "lazy"])
+def test_namespaces_fall_back_to_xmltodict(parser: ElementTreeParser):
+    payload = answer("pricing_route", '<ns:variant xmlns:ns="urn:sirena" ns:num="1"><ns:fare>1</ns:fare></ns:variant>')
+
+    document = parser.parse(payload, "pricing_route", ResponseModelABC._get_force_list("pricing_route"))
+    assert not isinstance(document, ElementTreeDocument)
+    assert document.to_dict() == expected(payload, "pricing_route").to_dict()
+
+
+@pytest.mark.parametrize("parser", PARSERS, ids=["eager", "lazy"])
+def test_str_payload(parser: ElementTreeParser):
+    method_name, body = CASES["attributes"]
+    payload = answer(method_name, body)
+
+    document = parser.parse(payload.decode("utf-8"), method_name, ResponseModelABC._get_force_list(method_name))
+    assert document.to_dict() == expected(payload, method_name).to_dict()
+
+
+def response_model(payload: bytes, method_name: str, parser) -> ResponseModelABC:
+    response = Response(Header(len(payload), int(time()), 1, 1, 0x00, 0x00), method_name=method_name)
+    response.payload = payload
+    ResponseModelABC.parser = parser
+    return ResponseModelABC.parse(response)
+
+
+@pytest.fixture(autouse=True)
+def restore_parser():
+    parser = ResponseModelABC.parser
+    yield
+    ResponseModelABC.parser = parser
+
+
+@pytest.mark.parametrize("parser", PARSERS + [XmlToDictParser()], ids=["eager", "lazy", "xmltodict"])
+def test_data(parser):
+    method_name, body = CASES["repeated"]
+    payload = answer(method_name, body)
+    legacy = expected(payload, method_name).to_dict()
+    assert response_model(payload, method_name, parser).data == legacy["answer"][method_name]
+
+    # Пустой тег метода - None, как и в xmltodict
+    assert response_model(answer("pricing_route", ""), "pricing_route", parser).data is None
+
+
+@pytest.mark.parametrize("parser", PARSERS + [XmlToDictParser()], ids=["eager", "lazy", "xmltodict"])
+def test_data_without_method_raises_key_error(parser):
+    payload = answer("pricing_route", "<variant>1</variant>")
+
+    with pytest.raises(KeyError):
+        _ = response_model(payload, "order", parser).data
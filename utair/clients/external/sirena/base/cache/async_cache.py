@@ -1,5 +1,7 @@
+from time import time
 from typing import Optional
 from redis.asyncio import Redis, ConnectionPool
+from redis.asyncio.lock import Lock
 from utair.clients.external.sirena.base.cache.base_cache import BaseCacheController
 
 _ASYNC_BACKEND: Optional[Redis] = None
@@ -8,11 +10,19 @@ _ASYNC_BACKEND: Optional[Redis] = None
 class AsyncCacheController(BaseCacheController):
 
     async def get(self) -> (Optional[bytes], Optional[int]):
-        key = await self._backend.get(self._cache_key_body)
-        key_id = await self._backend.get(self._cache_key_id)
+        key, key_id = await self._backend.mget(self._cache_key_body, self._cache_key_id)
         key_id = int(key_id) if key_id else None
         return key, key_id
 
+    async def expires_at(self) -> Optional[float]:
+        """Время истечения закэшированного ключа (unix time)"""
+        ttl = await self._backend.ttl(self._cache_key_id)
+        return time() + ttl if ttl and ttl > 0 else None
+
+    def lock(self, timeout: int) -> Lock:
+        """Блокировка согласования ключа между процессами"""
+        return self._backend.lock(self._cache_key_lock, timeout=timeout, blocking_timeout=timeout)
+
     async def purge(self):
         await self._backend.delete(self._cache_key_body)
         await self._backend.delete(self._cache_key_id)
@@ -28,7 +38,14 @@ class AsyncCacheController(BaseCacheController):
             return
         if self.is_available:
             return
-        global _ASYNC_BACKEND
-        if not _ASYNC_BACKEND:
-            _ASYNC_BACKEND = Redis(connection_pool=ConnectionPool.from_url(self._redis_url))
-        self._backend = _ASYNC_BACKEND
+        self._backend = get_backend(self._redis_url)
+
+
+def get_backend(redis_url: str) -> Redis:
+    """
+    Общее на процесс подключение к redis
+    """
+    global _ASYNC_BACKEND
+    if not _ASYNC_BACKEND:
+        _ASYNC_BACKEND = Redis(connection_pool=ConnectionPool.from_url(redis_url))
+    return _ASYNC_BACKEND
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from redis.exceptions import RedisError
+from utair.clients.external.sirena.base.cache.async_cache import get_backend
+from utair.clients.external.sirena.base.cache.base_response_cache import BaseResponseCache
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
+from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
+
+
+class AsyncResponseCache(BaseResponseCache):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Запросы в сирену, которые сейчас выполняются, по ключу кэша
+        self._in_flight: Dict[str, asyncio.Future] = dict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        payload = self._lru_get(key)
+        if payload is not None or not self.is_available:
+            return payload
+        try:
+            return await self._backend.get(key)
+        except RedisError:
+            self.logger.warning("Response cache: redis get failed", exc_info=True)
+            return None
+
+    async def set(self, key: str, payload: bytes, ttl: int):
+        self._lru_set(key, payload, ttl)
+        if not self.is_available:
+            return
+        try:
+            await self._backend.set(key, payload, ex=ttl)
+        except RedisError:
+            self.logger.warning("Response cache: redis set failed", exc_info=True)
+
+    async def fetch(
+            self,
+            request: RequestModelABC,
+            query: Callable[[RequestModelABC], Awaitable[ResponseModelABC]]
+    ) -> ResponseModelABC:
+        """
+        Ответ из кэша или из сирены
+        Одинаковые запросы, пришедшие одновременно, уходят в сирену одним запросом
+        :param request: запрос
+        :param query: запрос в сирену мимо кэша
+        """
+        method_name = request.method_name
+        if not self.is_cacheable(request):
+            return await query(request)
+
+        await self.spin_up()
+        key = self.make_key(request)
+
+        if (payload := await self.get(key)) is not None:
+            self.hits[method_name] += 1
+            return self._load(payload, method_name)
+
+        if (in_flight := self._in_flight.get(key)) is not None:
+            # Такой же запрос уже выполняется, ждём его
+            try:
+                response: ResponseModelABC = await asyncio.shield(in_flight)
+                self.hits[method_name] += 1
+                payload = self._dump(response)
+                return self._load(payload, method_name) if payload is not None else response
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # Отменили первый запрос, а не нас - идём в сирену сами
+
+        self.misses[method_name] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await query(request)
+            if (payload := self._dump(response)) is not None:
+                await self.set(key, payload, self.ttl[method_name])
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Если ошибку никто не ждал, не пишем в лог "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                self._in_flight.pop(key)
+
+    async def spin_up(self):
+        if not self._redis_url:
+            return
+        if self.is_available:
+            return
+        self._backend = get_backend(self._redis_url)
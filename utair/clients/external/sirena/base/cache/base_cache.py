@@ -17,13 +17,24 @@ class BaseCacheController:
     # название симметричного ключа в кэше
     _cache_key_body: str = 'sirena_sym_key_seed_cache'
     _cache_key_id: str = 'syrena_sym_key_id_cache'
+    # блокировка согласования ключа между процессами
+    _cache_key_lock: str = 'sirena_sym_key_lock'
 
     def __init__(
             self,
             redis_url,
+            namespace: str = '',
     ):
+        """
+        :param redis_url: URL Redis
+        :param namespace: адрес сирены и client_id, у каждого клиента свой ключ в общем redis
+        """
         self._redis_url = redis_url
         self._backend = None
+        if namespace:
+            self._cache_key_body = f'{self._cache_key_body}:{namespace}'
+            self._cache_key_id = f'{self._cache_key_id}:{namespace}'
+            self._cache_key_lock = f'{self._cache_key_lock}:{namespace}'
 
     @property
     def get_ttl(self):
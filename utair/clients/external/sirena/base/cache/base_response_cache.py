@@ -0,0 +1,132 @@
+import collections
+from hashlib import sha1
+from logging import getLogger
+from time import time, monotonic
+from typing import Dict, Optional, Tuple, Union
+
+from utair.clients.external.sirena.base.messaging import Header, Response
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
+from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
+
+
+class BaseResponseCache:
+    """
+    Кэширование ответов идемпотентных (справочных) методов сирены
+
+    Ключ - адрес сирены и client_id (namespace) + имя метода + хэш от тела запроса (prepare_payload),
+    храним только успешные ответы в виде тела xml.
+    Первый уровень - LRU в памяти процесса, ограниченный по размеру,
+    второй (опциональный) - redis. Ошибки redis пишутся в лог и считаются промахом.
+    """
+    # Время жизни ответа в кэше по методам, в секундах
+    # Методы, которых нет в списке, не кэшируются
+    default_ttl: Dict[str, int] = {
+        'pricing_route': 60,
+        'availability': 60,
+        'calendar': 300,
+        'schedule': 3600,
+        'get_currency_rates': 3600,
+        'get_company_routes': 3600,
+    }
+
+    _cache_key_prefix: str = 'sirena_response_cache'
+
+    def __init__(
+            self,
+            redis_url: Optional[str] = None,
+            ttl: Optional[Dict[str, int]] = None,
+            max_size: int = 64 * 1024 * 1024,
+            namespace: str = '',
+            logger_name: str = 'sirena_client',
+    ):
+        """
+        :param redis_url: URL Redis для второго уровня кэша
+        :param ttl: время жизни по методам, дополняет и переопределяет default_ttl
+        :param max_size: максимальный суммарный размер ответов в памяти процесса, в байтах
+        :param namespace: часть ключа, разделяющая ответы разных сирен и client_id в общем redis
+        :param logger_name: логгер для ошибок redis
+        """
+        self._redis_url = redis_url
+        self._backend = None
+        self.namespace = namespace
+        self.logger = getLogger(logger_name)
+
+        self.ttl: Dict[str, int] = {**self.default_ttl, **(ttl or {})}
+        self.max_size = max_size
+
+        # key -> (время истечения, тело ответа)
+        self._lru: collections.OrderedDict[str, Tuple[float, bytes]] = collections.OrderedDict()
+        self._lru_size: int = 0
+
+        self.hits: collections.Counter = collections.Counter()
+        self.misses: collections.Counter = collections.Counter()
+
+    @property
+    def is_available(self) -> bool:
+        return True if self._backend else False
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Попадания и промахи по методам
+        """
+        return {
+            method: dict(hits=self.hits[method], misses=self.misses[method])
+            for method in set(self.hits) | set(self.misses)
+        }
+
+    def is_cacheable(self, request: RequestModelABC) -> bool:
+        return self.ttl.get(request.method_name, 0) > 0
+
+    def make_key(self, request: RequestModelABC) -> str:
+        digest = sha1(request.prepare_payload()).hexdigest()
+        return f'{self._cache_key_prefix}:{self.namespace}:{request.method_name}:{digest}'
+
+    def _lru_get(self, key: str) -> Optional[bytes]:
+        item = self._lru.get(key)
+        if item is None:
+            return None
+        expires_at, payload = item
+        if expires_at < monotonic():
+            self._lru_pop(key)
+            return None
+        self._lru.move_to_end(key)
+        return payload
+
+    def _lru_set(self, key: str, payload: bytes, ttl: int):
+        if len(payload) > self.max_size:
+            return
+        self._lru_pop(key)
+        self._lru[key] = (monotonic() + ttl, payload)
+        self._lru_size += len(payload)
+        while self._lru_size > self.max_size:
+            self._lru_pop(next(iter(self._lru)))
+
+    def _lru_pop(self, key: str):
+        item = self._lru.pop(key, None)
+        if item is not None:
+            self._lru_size -= len(item[1])
+
+    def clear(self):
+        self._lru.clear()
+        self._lru_size = 0
+
+    @staticmethod
+    def _dump(response: ResponseModelABC) -> Optional[bytes]:
+        """
+        Тело ответа для кэширования, ошибки не кэшируем
+        """
+        if response.error is not None or not response.response.raw_payload:
+            return None
+        payload: Union[str, bytes, bytearray] = response.response.raw_payload
+        return payload.encode('utf-8') if isinstance(payload, str) else bytes(payload)
+
+    @staticmethod
+    def _load(payload: bytes, method_name: str) -> ResponseModelABC:
+        """
+        Собираем ответ из закэшированного тела
+        Каждый раз новый объект, чтобы вызывающие не делили между собой изменяемые данные
+        """
+        response = Response(Header(len(payload), int(time()), 0, 0, 0x00, 0x00), method_name=method_name)
+        response.payload = payload
+        return ResponseModelABC.parse(response)
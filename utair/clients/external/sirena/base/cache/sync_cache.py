@@ -1,6 +1,8 @@
+from time import time
 from typing import Optional
 from utair.clients.external.sirena.base.cache.base_cache import BaseCacheController
 from redis import Redis
+from redis.lock import Lock
 
 
 class SyncCacheController(BaseCacheController):
@@ -10,11 +12,19 @@ class SyncCacheController(BaseCacheController):
         self._backend.delete(self._cache_key_id)
 
     def get(self) -> (Optional[bytes], Optional[int]):
-        key = self._backend.get(self._cache_key_body)
-        key_id = self._backend.get(self._cache_key_id)
+        key, key_id = self._backend.mget(self._cache_key_body, self._cache_key_id)
         key_id = int(key_id) if key_id else None
         return key, key_id
 
+    def expires_at(self) -> Optional[float]:
+        """Время истечения закэшированного ключа (unix time)"""
+        ttl = self._backend.ttl(self._cache_key_id)
+        return time() + ttl if ttl and ttl > 0 else None
+
+    def lock(self, timeout: int) -> Lock:
+        """Блокировка согласования ключа между процессами"""
+        return self._backend.lock(self._cache_key_lock, timeout=timeout, blocking_timeout=timeout)
+
     def set(self, key_text: bytes, key_id: int) -> (bytes, int):
         self._backend.mset({self._cache_key_body: key_text, self._cache_key_id: key_id})
         self._backend.expireat(self._cache_key_body, self.get_ttl)
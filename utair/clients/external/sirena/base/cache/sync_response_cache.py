@@ -0,0 +1,107 @@
+import threading
+from typing import Callable, Dict, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+from utair.clients.external.sirena.base.cache.base_response_cache import BaseResponseCache
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
+from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
+
+
+class _InFlight:
+    """
+    Выполняющийся запрос, результат которого ждут другие потоки
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[ResponseModelABC] = None
+        self.error: Optional[BaseException] = None
+
+
+class SyncResponseCache(BaseResponseCache):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        # Запросы в сирену, которые сейчас выполняются, по ключу кэша
+        self._in_flight: Dict[str, _InFlight] = dict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._lru_get(key)
+        if payload is not None or not self.is_available:
+            return payload
+        try:
+            return self._backend.get(key)
+        except RedisError:
+            self.logger.warning("Response cache: redis get failed", exc_info=True)
+            return None
+
+    def set(self, key: str, payload: bytes, ttl: int):
+        with self._lock:
+            self._lru_set(key, payload, ttl)
+        if not self.is_available:
+            return
+        try:
+            self._backend.set(key, payload, ex=ttl)
+        except RedisError:
+            self.logger.warning("Response cache: redis set failed", exc_info=True)
+
+    def fetch(
+            self,
+            request: RequestModelABC,
+            query: Callable[[RequestModelABC], ResponseModelABC]
+    ) -> ResponseModelABC:
+        """
+        Ответ из кэша или из сирены
+        Одинаковые запросы, пришедшие одновременно из разных потоков, уходят в сирену одним запросом
+        :param request: запрос
+        :param query: запрос в сирену мимо кэша
+        """
+        method_name = request.method_name
+        if not self.is_cacheable(request):
+            return query(request)
+
+        self.spin_up()
+        key = self.make_key(request)
+
+        if (payload := self.get(key)) is not None:
+            with self._lock:
+                self.hits[method_name] += 1
+            return self._load(payload, method_name)
+
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            is_leader = in_flight is None
+            if is_leader:
+                in_flight = self._in_flight[key] = _InFlight()
+                self.misses[method_name] += 1
+
+        if not is_leader:
+            # Такой же запрос уже выполняется, ждём его
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            with self._lock:
+                self.hits[method_name] += 1
+            payload = self._dump(in_flight.response)
+            return self._load(payload, method_name) if payload is not None else in_flight.response
+
+        try:
+            in_flight.response = query(request)
+            if (payload := self._dump(in_flight.response)) is not None:
+                self.set(key, payload, self.ttl[method_name])
+            return in_flight.response
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.done.set()
+
+    def spin_up(self):
+        if not self._redis_url:
+            return
+        if not self.is_available:
+            self._backend = Redis.from_url(self._redis_url)
@@ -5,17 +5,20 @@ from typing import Optional
 
 from opentelemetry import trace
 from utair.clients.external.sirena.base.client.base_client import BaseClient
+from utair.clients.external.sirena.base.client.async_key_manager import AsyncKeyManager
+from utair.clients.external.sirena.base.client.keys_container import KeysContainer
 from utair.clients.external.sirena.base.connection import AsyncConnection, AsyncConnectionPool
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.messaging import RequestABC, ResponseABC, Header
 from utair.clients.external.sirena.base.models.base_client_request import (
     RequestModelABC, KeyInfoRequest, AsymEncryptionHandShakeRequest
 )
 from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
 from utair.clients.external.sirena.base.cache.async_cache import AsyncCacheController
+from utair.clients.external.sirena.base.cache.async_response_cache import AsyncResponseCache
 from utair.clients.external.sirena.exceptions import (
     SirenaEncryptionKeyError,
     SirenaMaxRetriesExceededError,
-    SirenaEmptyResponse
 )
 
 
@@ -31,6 +34,8 @@ class AsyncClient(BaseClient):
             private_key_path: str = None,
             pool: Optional[AsyncConnectionPool] = None,
             logger_name: str = 'sirena_client',
+            response_cache: Optional[AsyncResponseCache] = None,
+            key_manager: Optional[AsyncKeyManager] = None,
     ):
         """
         :param host: хост сирены
@@ -39,6 +44,8 @@ class AsyncClient(BaseClient):
         :param redis_url: URL Redis для кэширования симметричного ключа
         :param private_key: приватный ключ строкой
         :param private_key_path: путь к файлу с приватным ключом
+        :param response_cache: кэш ответов справочных методов
+        :param key_manager: ключи шифрования, общие для клиентов, по умолчанию свои у клиента
         """
         super().__init__(
             host=host,
@@ -52,91 +59,125 @@ class AsyncClient(BaseClient):
 
         self._connection: Optional[AsyncConnectionPool] = pool
         self._inited_with_pool = True if pool else False
-        self._hand_shaking = False
 
-        self.cache: AsyncCacheController = AsyncCacheController(self.redis_url)
+        self.key_manager: AsyncKeyManager = key_manager or AsyncKeyManager(
+            AsyncCacheController(self.redis_url, namespace=f'{self.host}:{self.port}:{self.client_id}'),
+            logger_name=logger_name,
+        )
+        self.cache: AsyncCacheController = self.key_manager.cache
+        self.response_cache: Optional[AsyncResponseCache] = response_cache
 
         if not self._inited_with_pool:
             self._connection = AsyncConnectionPool(self.host, self.port)
 
+    @property
+    def pool(self) -> AsyncConnectionPool:
+        """Пул соединений клиента, статистика: client.pool.stats"""
+        return self._connection
+
     async def query(self, request: RequestModelABC, silent: bool = False) -> ResponseModelABC:
         """
         Точка входа для клиента
         Запрос к сирене
         """
-        with trace.get_tracer("sirena-client").start_span(f"sirena request: {request.method_name}") as span:
+        with trace.get_tracer("sirena-client").start_as_current_span(f"sirena request: {request.method_name}") as span:
             span.set_attribute("method", request.method_name)
             span.set_attribute("sirena.client", self.client_id)
             span.set_attribute("sirena.host", self.host)
 
-            await self.connect(self._ignore_connection_calls)
-            async with self._connection.get() as connection:
-                await self._hand_shake(connection)
-                result = await self._query(request, connection)
-                self._request_log(request=request, response=result)
-            await self.disconnect(self._ignore_connection_calls)
+            if self.response_cache is not None:
+                result = await self.response_cache.fetch(request, self._fetch)
+            else:
+                result = await self._fetch(request)
         if not silent:
             result.raise_for_error()
         return result
 
-    async def _hand_shake(self, connection: AsyncConnection, force: bool = False):
+    async def _fetch(self, request: RequestModelABC) -> ResponseModelABC:
         """
-        Обмениваемся ключами и сохраняем их
+        Запрос к сирене мимо кэша
         """
-        await self.cache.spin_up()
-        if self.hand_shake_done and not force:
-            return
+        await self.connect(self._ignore_connection_calls)
+        started = Timer.now()
+        async with self._connection.get() as connection:
+            self.instrumentation.phase(request.method_name, Phase.ACQUIRE, Timer.elapsed(started))
+            await self._hand_shake(connection)
+            result = await self._query(request, connection)
+            self._request_log(request=request, response=result)
+        await self.disconnect(self._ignore_connection_calls)
+        return result
+
+    async def _hand_shake(self, connection: AsyncConnection, stale_key_id: Optional[int] = None) -> KeysContainer:
+        """
+        Действующий симметричный ключ, общий на процесс
+        Новый согласуется, только если действующего нет
+        :param stale_key_id: ключ, который сирена не приняла
+        """
+        self.key_manager.invalidate(stale_key_id)
+        return await self.key_manager.get_keys(
+            lambda keys: self._negotiate_keys(keys, connection),
+            # Фоновое обновление ключа берёт из пула отдельное соединение
+            refresh=self._refresh_keys if self._inited_with_pool else None,
+        )
+
+    async def _negotiate_keys(self, keys: KeysContainer, connection: AsyncConnection):
+        """
+        Регистрируем в сирене новый симметричный ключ
+        """
+        await self.load_private_key()
+        keys.private_key = self.key_manager.private_key
+        if not self.key_manager.public_key:
+            # Запрашиваем у сирены паб ключ, он общий на процесс
+            key_info = await self._query(KeyInfoRequest(), connection, keys)
+            key_info.raise_for_error()
+            keys.set_pub_key(key_info.data)
+            self.key_manager.public_key = keys.public_key
+        keys.public_key = self.key_manager.public_key
 
-        if not force and self.cache.is_available:
-            # Берём из кэша, если есть
-            seed, _id = await self.cache.get()
-            if all((seed, _id)):
-                self._keys.sym_key_seed, self._keys.sym_key_id = seed, _id
-                self.hand_shake_done = True
-                return
-
-        if self.cache.is_available:
-            # Чистим кэш
-            await self.cache.purge()
-
-        if not self._keys.private_key:
-            # TODO test from string
-            await self.load_private_key()
-
-        self.logger.debug(f"Handshaking, is_force: {force}")
-        self._keys.reset_des_ecb()
-        # Запрашиваем у сирены паб ключ
-        key_info = await self._query(KeyInfoRequest(), connection)
-        key_info.raise_for_error()
-        self._keys.set_pub_key(key_info.data)
-
-        # Обмениваемся ключами, получаем симметричный ключ
-        response = await self._query(AsymEncryptionHandShakeRequest(), connection)
-        response.raise_for_error()
-        self._keys.sym_key_id = response.response.key_id
-
-        # Кэшируем ключ
-        if self.cache.is_available:
-            await self.cache.set(self._keys.sym_key_seed, self._keys.sym_key_id)
+        self.logger.debug("Handshaking")
+        # Обмениваемся ключами, получаем идентификатор симметричного ключа
+        response = await self._query(AsymEncryptionHandShakeRequest(), connection, keys)
+        if response.error is not None:
+            # Возможно, сменился ключ сирены - в следующий раз запросим заново
+            self.key_manager.public_key = None
+            response.raise_for_error()
+        keys.sym_key_id = response.response.key_id
+        self.instrumentation.handshake()
         self.logger.debug("Handshake done.")
-        self.hand_shake_done = True
 
-    async def _query(self, request: RequestModelABC, connection: AsyncConnection) -> ResponseModelABC:
+    async def _refresh_keys(self, keys: KeysContainer):
+        """Согласование ключа в фоне на отдельном соединении"""
+        async with self._connection.get() as connection:
+            await self._negotiate_keys(keys, connection)
+
+    async def _query(
+            self,
+            request: RequestModelABC,
+            connection: AsyncConnection,
+            keys: Optional[KeysContainer] = None,
+    ) -> ResponseModelABC:
+        """
+        :param keys: ключи хендшейка, для остальных запросов - действующий ключ
+        """
         attempts = 0
         hand_shake_retried = False
         while attempts < self.max_request_retries:
             attempts += 1
+            _request: Optional[RequestABC] = None
             try:
-                _request: RequestABC = self.request_factory(request)
+                _request = self.request_factory(request, keys)
                 _response: ResponseABC = await self._send_msg(_request, connection)
                 if not bool(_response):
+                    self.instrumentation.retry(request.method_name, "not_processed")
                     continue    # Сирена просит попробовать еще раз
-                response: ResponseModelABC = ResponseModelABC.parse(_response)
+                response: ResponseModelABC = self._parse_response(_response)
+                self._trace_response(_request, _response, attempts)
                 return response
             except SirenaEncryptionKeyError:
-                if hand_shake_retried:
+                if hand_shake_retried or keys is not None:
                     raise
-                await self._hand_shake(connection, force=True)
+                self.instrumentation.retry(request.method_name, "key_error")
+                await self._hand_shake(connection, stale_key_id=getattr(_request, "key_id", None))
                 hand_shake_retried = True
                 attempts -= 1
 
@@ -148,35 +189,73 @@ class AsyncClient(BaseClient):
         """
         # Один раз пишем в стрим
         message: bytes = r.make_message(self.client_id)
+        if connection.multiplexed:
+            # Ответ из стрима читает само соединение и отдаёт его по msg_id,
+            # время ожидания заголовка включает отправку в очереди соединения
+            self._record_request(r, len(message))
+            started = Timer.now()
+            header, body = await connection.exchange(message, r.msg_id)
+            response: ResponseABC = self.response_factory(header, r.method_name)
+            started = response.timer.since(Phase.WAIT_HEADER, started)
+            response.parse(body)
+            response.timer.since(Phase.READ_BODY, started)
+            return response
+
+        started = Timer.now()
         await connection.write(message)
+        started = r.timer.since(Phase.WRITE, started)
+        self._record_request(r, len(message))
         # Получаем заголовок
         header: Header = Header.parse(await self._read_header(connection))
         # Готовим ответ, складываем в него информацию полученную из заголовка
-        response: ResponseABC = self.response_factory(header, r.method_name)
+        response: ResponseABC = await self._response_for(header, r.method_name, connection)
+        started = response.timer.since(Phase.WAIT_HEADER, started)
         # Получаем тело в ответ
-        body: bytes = await self._read_body(response, connection)
-        response.parse(body)
+        await self._read_body(response, connection)
+        response.timer.since(Phase.READ_BODY, started)
         return response
 
     # noinspection PyMethodMayBeStatic
     async def _read_header(self, connection: AsyncConnection) -> bytes:
         """ Читаем заголовок """
-        header: bytes = await connection.read(Header.size)
-        if not header:
-            raise SirenaEmptyResponse()
-        while len(header) < Header.size:
-            header += await connection.read(Header.size - len(header))
-        return header
-
-    async def _read_body(self, r: ResponseABC, connection: AsyncConnection) -> bytes:
-        """ Читаем тело """
-        data: bytes = b''
-        # Читаем из стрима по всему размеру
+        return await connection.read_exactly(Header.size)
+
+    async def _response_for(self, header: Header, method_name: str, connection: AsyncConnection) -> ResponseABC:
+        """
+        Ответ по прочитанному заголовку
+        Ключа ответа уже нет - тело дочитываем, иначе следующий ответ в соединении начнётся с середины этого
+        """
+        try:
+            return self.response_factory(header, method_name)
+        except SirenaEncryptionKeyError:
+            await self._skip_body(header.chunk_len, connection)
+            raise
+
+    async def _read_body(self, r: ResponseABC, connection: AsyncConnection):
+        """
+        Читаем тело кусками точного размера,
+        каждый кусок сразу расшифровывается и распаковывается
+        """
+        r.start()
         while r.body_len > 0:
-            chunk = await connection.read(min(r.body_len, self.read_chunk_size))
-            data += chunk
+            chunk: bytes = await connection.read_exactly(min(r.body_len, self.read_chunk_size))
             r.body_len -= len(chunk)
-        return data
+            try:
+                r.feed(chunk)
+            except Exception:
+                # Тело не расшифровалось или не распаковалось - дочитываем его,
+                # иначе следующий ответ в этом соединении начнётся с середины этого
+                await self._skip_body(r.body_len, connection)
+                raise
+        r.finish()
+
+    async def _skip_body(self, size: int, connection: AsyncConnection):
+        """ Дочитываем и выбрасываем остаток тела, не вышло - закрываем соединение """
+        try:
+            while size > 0:
+                size -= len(await connection.read_exactly(min(size, self.read_chunk_size)))
+        except Exception:  # noqa
+            await connection.disconnect()
 
     async def __aenter__(self) -> "AsyncClient":
         await self.connect(ignore=False)
@@ -216,5 +295,5 @@ class AsyncClient(BaseClient):
         if super().load_private_key():
             return True
         async with aiofile.async_open(os.path.abspath(self.private_key_path)) as key_file:
-            self._keys.private_key = self._keys.parse_rsa_key(await key_file.read())
+            self.key_manager.private_key = KeysContainer.parse_rsa_key(await key_file.read())
         return True
@@ -1,17 +1,32 @@
-from typing import Optional, List
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
 from opentelemetry import trace
 
 from utair.clients.external.sirena.base.client.async_client import AsyncClient
+from utair.clients.external.sirena.base.client.async_key_manager import AsyncKeyManager
+from utair.clients.external.sirena.base.client.async_rate_limiter import AdaptiveRateLimiter
 from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection
 from utair.clients.external.sirena.base.connection.async_pool import AsyncConnectionPool
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.messaging import Header, RequestABC, ResponseABC
-from utair.clients.external.sirena.base.messaging.batch import Batch
+from utair.clients.external.sirena.base.messaging.batch import Batch, BulkItem, BulkResult
+from utair.clients.external.sirena.base.cache.async_response_cache import AsyncResponseCache
 from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
 from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
-from utair.clients.external.sirena.exceptions import SirenaEncryptionKeyError
+from utair.clients.external.sirena.exceptions import (
+    SirenaEncryptionKeyError,
+    SirenaMaxRetriesExceededError,
+    SirenaPultBusyError,
+)
+
+# Ответ на запрос пачки по msg_id, вызывается сразу после разбора ответа
+OnResponse = Callable[[int, ResponseModelABC], None]
 
 
 class AsyncBatchableClient(AsyncClient):
+    # Массовый запрос: запросов в одной пачке и соединений одновременно
+    bulk_batch_size: int = 10
+    bulk_concurrency: int = 4
 
     def __init__(
             self,
@@ -23,6 +38,8 @@ class AsyncBatchableClient(AsyncClient):
             private_key_path: str = None,
             pool: Optional[AsyncConnectionPool] = None,
             logger_name: str = 'sirena_client',
+            response_cache: Optional[AsyncResponseCache] = None,
+            key_manager: Optional[AsyncKeyManager] = None,
     ):
         """
         :param host: хост сирены
@@ -31,6 +48,8 @@ class AsyncBatchableClient(AsyncClient):
         :param redis_url: URL Redis для кэширования симметричного ключа
         :param private_key: приватный ключ строкой
         :param private_key_path: путь к файлу с приватным ключом
+        :param response_cache: кэш ответов справочных методов, пачечные запросы его не используют
+        :param key_manager: ключи шифрования, общие для клиентов, по умолчанию свои у клиента
         """
         super().__init__(
             host=host,
@@ -40,7 +59,9 @@ class AsyncBatchableClient(AsyncClient):
             private_key=private_key,
             client_id=client_id,
             pool=pool,
-            logger_name=logger_name
+            logger_name=logger_name,
+            response_cache=response_cache,
+            key_manager=key_manager,
         )
 
     async def batch_query(
@@ -54,7 +75,7 @@ class AsyncBatchableClient(AsyncClient):
         attempts = 0
         hand_shake_retried = False
 
-        with trace.get_tracer("sirena-client").start_span(
+        with trace.get_tracer("sirena-client").start_as_current_span(
                 f"sirena request: batch request of len {len(request)}"
         ) as span:
             span.set_attribute("sirena.client", self.client_id)
@@ -62,9 +83,11 @@ class AsyncBatchableClient(AsyncClient):
 
             await self.connect(self._ignore_connection_calls)
 
+            started = Timer.now()
             async with self._connection.get() as connection:
-                await self._hand_shake(connection)
-                batch: Batch = Batch.create([self.request_factory(r) for r in request])
+                self.instrumentation.phase("batch", Phase.ACQUIRE, Timer.elapsed(started))
+                keys = await self._hand_shake(connection)
+                batch: Batch = Batch.create([self.request_factory(r, keys) for r in request])
 
                 while attempts < self.max_request_retries:
                     try:
@@ -73,11 +96,15 @@ class AsyncBatchableClient(AsyncClient):
                         batch.received = 0
                         if not batch.retries_needed:
                             break
+                        self.instrumentation.retry("batch", "not_processed", batch.retries_needed)
                     except SirenaEncryptionKeyError:
                         # Один раз попробуем сделать хендшейк заново
                         if hand_shake_retried:
                             raise
-                        await self._hand_shake(connection, force=True)
+                        self.instrumentation.retry("batch", "key_error")
+                        # Пачка зашифрована старым ключом, собираем её заново
+                        keys = await self._hand_shake(connection, stale_key_id=keys.sym_key_id)
+                        batch = Batch.create([self.request_factory(r, keys) for r in request])
                         hand_shake_retried = True
                         attempts -= 1
 
@@ -87,23 +114,253 @@ class AsyncBatchableClient(AsyncClient):
             self._request_log(request=request_, response=response_)
         return batch.responses
 
+    async def bulk_query(
+            self,
+            requests: Iterable[RequestModelABC],
+            batch_size: Optional[int] = None,
+            concurrency: Optional[int] = None,
+            limiter: Optional[AdaptiveRateLimiter] = None,
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Массовый запрос к сирене, результаты отдаются по мере прихода ответов
+
+        Одинаковые запросы уходят в сирену один раз, результат получает каждая позиция.
+        Запросы уходят пачками до batch_size в concurrency соединений из пула,
+        сколько запросов может ждать ответа, решает limiter: занятый пульт и "запрос не обработан"
+        сужают окно и ставят паузу. Такие запросы, как и запросы пачки, оборвавшейся на ошибке соединения,
+        повторяются поштучно, не больше max_request_retries раз.
+        Ошибка одного запроса остаётся в его результате и не прерывает остальные,
+        непредвиденная ошибка при отправке пачки тоже попадает в результаты её запросов.
+        Дубли получают каждый свой объект ответа.
+
+        async for result in client.bulk_query(requests):
+            if result:
+                result.response.data
+        :param requests: запросы, например все маршруты на все даты
+        :param batch_size: максимум запросов в одной пачке
+        :param concurrency: соединений одновременно
+        :param limiter: окно запросов без ответа, по умолчанию batch_size * concurrency
+        """
+        requests = list(requests)
+        batch_size = batch_size or self.bulk_batch_size
+        concurrency = concurrency or self.bulk_concurrency
+        limiter = limiter or AdaptiveRateLimiter(batch_size * concurrency)
+        results: asyncio.Queue = asyncio.Queue()
+        pending: asyncio.Queue = asyncio.Queue()
+
+        def deliver(item: BulkItem):
+            # Результат отдаётся один раз, иначе не сойдётся счётчик оставшихся
+            if item.done:
+                return
+            item.done = True
+            try:
+                if item.response is not None:
+                    self._request_log(request=item.request, response=item.response)
+                delivered = item.results(requests)
+            except Exception as e:  # noqa
+                delivered = [BulkResult(index, requests[index], error=e) for index in item.indexes]
+            results.put_nowait(delivered)
+
+        unique: Dict[bytes, BulkItem] = dict()
+        for index, request in enumerate(requests):
+            try:
+                key = request.prepare_payload()
+            except Exception as e:  # noqa
+                results.put_nowait([BulkResult(index, request, error=e)])
+                continue
+            item = unique.get(key)
+            if item is None:
+                item = unique[key] = BulkItem(request)
+                pending.put_nowait(item)
+            item.indexes.append(index)
+
+        span = trace.get_tracer("sirena-client").start_span(f"sirena request: bulk request of len {len(requests)}")
+        span.set_attribute("sirena.client", self.client_id)
+        span.set_attribute("sirena.host", self.host)
+        span.set_attribute("sirena.bulk.unique", len(unique))
+        workers: List[asyncio.Task] = []
+        try:
+            await self.connect(self._ignore_connection_calls)
+            with trace.use_span(span, end_on_exit=False):
+                # Задачи берут контекст при создании, их запросы попадают в span
+                workers = [
+                    asyncio.ensure_future(self._bulk_worker(pending, limiter, batch_size, deliver))
+                    for _ in range(min(concurrency, len(unique)))
+                ]
+
+            remaining = len(requests)
+            while remaining:
+                delivered = await results.get()
+                for result in delivered:
+                    remaining -= 1
+                    yield result
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            span.end()
+            await self.disconnect(self._ignore_connection_calls)
+
+    async def _bulk_worker(
+            self,
+            pending: asyncio.Queue,
+            limiter: AdaptiveRateLimiter,
+            batch_size: int,
+            deliver: Callable[[BulkItem], None],
+    ):
+        """
+        Берём из очереди столько запросов, сколько пропускает limiter, и отправляем пачкой
+        Непредвиденная ошибка уходит в результаты запросов пачки, воркер продолжает работу
+        """
+        while True:
+            items: List[BulkItem] = []
+            try:
+                item = await pending.get()
+                if item.done:
+                    # Результат уже отдан после ошибки воркера, повтор не нужен
+                    continue
+                items.append(item)
+                granted = await limiter.acquire(min(batch_size, 1 + pending.qsize()))
+                while len(items) < granted and not pending.empty():
+                    item = pending.get_nowait()
+                    if not item.done:
+                        items.append(item)
+                # Пока ждали limiter, часть запросов забрали другие
+                limiter.give_back(granted - len(items))
+                await self._bulk_send(items, pending, limiter, deliver)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa
+                for item in items:
+                    if not item.done:
+                        item.error = e
+                        deliver(item)
+
+    async def _bulk_send(
+            self,
+            items: List[BulkItem],
+            pending: asyncio.Queue,
+            limiter: AdaptiveRateLimiter,
+            deliver: Callable[[BulkItem], None],
+    ):
+        """
+        Пачка запросов массового поиска в одном соединении
+        Каждый ответ разбирается сразу: отказ сирены отправляет запрос на повтор, остальное - в результат
+        """
+        waiting = set(items)
+        sent: Dict[int, BulkItem] = dict()
+        keys = None
+
+        def retry(item: BulkItem, reason: str, error: Optional[Exception] = None):
+            if item.attempts < self.max_request_retries:
+                self.instrumentation.retry(item.request.method_name, reason)
+                pending.put_nowait(item)
+                return
+            item.error = error
+            deliver(item)
+
+        def on_response(msg_id: int, response: ResponseModelABC):
+            item = sent.pop(msg_id, None)
+            if item is None or item not in waiting:
+                # Пачку уже отправили на повтор
+                return
+            waiting.discard(item)
+            if response.should_retry:
+                limiter.release(rejected=True)
+                retry(item, "not_processed", SirenaMaxRetriesExceededError())
+            elif isinstance(response.error, SirenaPultBusyError):
+                limiter.release(rejected=True)
+                item.response = response
+                retry(item, "pult_busy")
+            else:
+                limiter.release()
+                item.response = response
+                deliver(item)
+
+        for item in items:
+            item.attempts += 1
+            item.response = None
+        try:
+            started = Timer.now()
+            async with self._connection.get() as connection:
+                self.instrumentation.phase("bulk", Phase.ACQUIRE, Timer.elapsed(started))
+                try:
+                    keys = await self._hand_shake(connection)
+                    sirena_requests: List[RequestABC] = []
+                    for item in items:
+                        try:
+                            sirena_request = self.request_factory(item.request, keys)
+                        except SirenaEncryptionKeyError:
+                            raise
+                        except Exception as e:  # noqa
+                            waiting.discard(item)
+                            limiter.give_back(1)
+                            item.error = e
+                            deliver(item)
+                            continue
+                        sent[sirena_request.msg_id] = item
+                        sirena_requests.append(sirena_request)
+                    if sirena_requests:
+                        await self._make_batch_request(Batch.create(sirena_requests), connection, on_response)
+                except Exception:
+                    if not connection.multiplexed:
+                        # В соединении могли остаться ответы на запросы пачки
+                        await connection.disconnect()
+                    raise
+        except asyncio.CancelledError:
+            raise
+        except SirenaEncryptionKeyError as e:
+            # Сирена не знает ключ, следующая пачка согласует новый
+            self.key_manager.invalidate(keys.sym_key_id if keys is not None else None)
+            self._bulk_failed(waiting, limiter, retry, "key_error", e)
+        except Exception as e:  # noqa
+            self._bulk_failed(waiting, limiter, retry, "error", e)
+        finally:
+            sent.clear()
+            # Ответа на них уже не ждём, место в окне освобождаем
+            limiter.give_back(len(waiting))
+
+    @staticmethod
+    def _bulk_failed(
+            waiting: set,
+            limiter: AdaptiveRateLimiter,
+            retry: Callable[[BulkItem, str, Exception], None],
+            reason: str,
+            error: Exception,
+    ):
+        """Запросы пачки, оставшиеся без ответа после ошибки, уходят на повтор"""
+        failed = list(waiting)
+        waiting.clear()
+        limiter.give_back(len(failed))
+        for item in failed:
+            retry(item, reason, error)
+
     async def _make_batch_request(
             self,
             batch: Batch,
-            connection: AsyncConnection
+            connection: AsyncConnection,
+            on_response: Optional[OnResponse] = None,
     ) -> Batch:
         """
         Запрос в сирену пачкой
+        :param on_response: вызывается на каждый ответ сразу после разбора
         """
+        if connection.multiplexed:
+            return await self._make_multiplexed_batch_request(batch, connection, on_response)
+
         for b in batch.requests:
             # Пишем все запросы в стрим
             if not b.should_try:
                 continue
             message: bytes = b.sirena_request.make_message(self.client_id)
+            started = Timer.now()
             await connection.write(message)
+            b.sirena_request.timer.since(Phase.WRITE, started)
+            self._record_request(b.sirena_request, len(message))
 
         # Длинна динамична и может меняться в зависимости от неуспешных ответов
         batch_len = len(batch)
+        started = Timer.now()
         while batch.received < batch_len:
             # Читаем ответы по очереди, соотносим к айдишнику запроса
             # Получаем заголовок
@@ -111,12 +368,43 @@ class AsyncBatchableClient(AsyncClient):
             # Соответствующий на сообщение запрос
             _request: RequestABC = batch.get_request(header.msg_id)
             # Готовим ответ, складываем в него информацию полученную из заголовка
-            _response: ResponseABC = self.response_factory(header, _request.method_name)
-            _response.parse(await self._read_body(_response, connection))
+            _response: ResponseABC = await self._response_for(header, _request.method_name, connection)
+            started = _response.timer.since(Phase.WAIT_HEADER, started)
+            await self._read_body(_response, connection)
+            _response.timer.since(Phase.READ_BODY, started)
 
-            batch.add_response(ResponseModelABC.parse(_response), header.msg_id)
+            response = self._parse_response(_response)
+            batch.add_response(response, header.msg_id)
             batch.received += 1
+            if on_response is not None:
+                on_response(header.msg_id, response)
+            started = Timer.now()
 
         # Обнуляем счётчик, на случай, если нужно будет сделать ретрай
         batch.received = 0
         return batch
+
+    async def _make_multiplexed_batch_request(
+            self,
+            batch: Batch,
+            connection: AsyncConnection,
+            on_response: Optional[OnResponse] = None,
+    ) -> Batch:
+        """
+        Запрос в сирену пачкой через мультиплексированное соединение
+        Соединение само соотносит ответы с запросами, отправляем всё разом и разбираем ответы по мере прихода
+        """
+        async def send(_request: RequestABC):
+            response = self._parse_response(await self._send_msg(_request, connection))
+            batch.add_response(response, _request.msg_id)
+            if on_response is not None:
+                on_response(_request.msg_id, response)
+
+        # Дожидаемся всех отправок: после ошибки соединение вернётся в пул, и в нём не должно остаться наших запросов
+        results = await asyncio.gather(
+            *(send(b.sirena_request) for b in batch.requests if b.should_try), return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return batch
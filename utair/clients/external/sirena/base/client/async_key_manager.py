@@ -0,0 +1,117 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from redis.exceptions import LockError
+from utair.clients.external.sirena.base.cache.async_cache import AsyncCacheController
+from utair.clients.external.sirena.base.client.base_key_manager import BaseKeyManager
+from utair.clients.external.sirena.base.client.keys_container import KeysContainer
+
+# Регистрирует в сирене переданный симметричный ключ, проставляет ему key_id
+Negotiate = Callable[[KeysContainer], Awaitable[None]]
+
+
+class AsyncKeyManager(BaseKeyManager):
+
+    def __init__(self, cache: AsyncCacheController, **kwargs):
+        super().__init__(cache, **kwargs)
+        self.cache: AsyncCacheController = cache
+        # Согласование ключа, которое сейчас выполняется
+        self._in_flight: Optional[asyncio.Future] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get_keys(self, negotiate: Negotiate, refresh: Optional[Negotiate] = None) -> KeysContainer:
+        """
+        Действующий ключ, новый согласуется только если его нет
+        :param negotiate: согласование ключа в соединении запроса
+        :param refresh: согласование ключа на отдельном соединении, если передан -
+            ключ, который скоро истечёт, обновляется в фоне, запрос идёт со старым
+        """
+        keys = self.current
+        if keys is None:
+            return await self.negotiate(negotiate)
+        if refresh is not None and self.needs_refresh:
+            self._refresh_in_background(refresh)
+        return keys
+
+    async def negotiate(self, negotiate: Negotiate) -> KeysContainer:
+        """
+        Новый ключ, одно согласование на процесс: остальные ждут его результата
+        """
+        while (in_flight := self._in_flight) is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # Отменили согласование, а не нас - согласуем сами
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight = future
+        try:
+            keys = await self._negotiate_shared(negotiate)
+            future.set_result(keys)
+            return keys
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Если ошибку никто не ждал, не пишем в лог "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._in_flight = None
+
+    async def _negotiate_shared(self, negotiate: Negotiate) -> KeysContainer:
+        """
+        Ключ, согласованный другим процессом, или новый под блокировкой в redis
+        """
+        await self.cache.spin_up()
+        if not self.cache.is_available:
+            return await self._negotiate_new(negotiate)
+
+        if (keys := await self._load_cached()) is not None:
+            return keys
+        lock = self.cache.lock(self.lock_timeout)
+        locked = await lock.acquire()
+        try:
+            # Пока ждали блокировку, ключ мог согласовать другой процесс
+            if locked and (keys := await self._load_cached()) is not None:
+                return keys
+            keys = await self._negotiate_new(negotiate)
+            await self.cache.set(keys.sym_key_seed, keys.sym_key_id)
+            return keys
+        finally:
+            if locked:
+                try:
+                    await lock.release()
+                except LockError:
+                    # Блокировка истекла по таймауту
+                    pass
+
+    async def _load_cached(self) -> Optional[KeysContainer]:
+        seed, key_id = await self.cache.get()
+        if not all((seed, key_id)):
+            return None
+        return self._from_cache(seed, key_id, await self.cache.expires_at())
+
+    async def _negotiate_new(self, negotiate: Negotiate) -> KeysContainer:
+        keys = self.new_keys()
+        await negotiate(keys)
+        self.handshakes += 1
+        return self.register(keys)
+
+    def _refresh_in_background(self, refresh: Negotiate):
+        if self._in_flight is not None:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.ensure_future(self._refresh(refresh))
+
+    async def _refresh(self, refresh: Negotiate):
+        try:
+            await self.negotiate(refresh)
+        except Exception:   # noqa
+            # Текущий ключ ещё действует, попробуем позже
+            self.logger.exception("Symmetric key refresh failed")
+            self._refresh_failed()
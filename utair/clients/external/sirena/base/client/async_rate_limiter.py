@@ -0,0 +1,91 @@
+import asyncio
+import random
+from time import monotonic
+
+
+class AdaptiveRateLimiter:
+    """
+    Окно запросов в полёте, которое подстраивается под ответы сирены
+
+    Каждый обработанный ответ расширяет окно примерно на один запрос за окно,
+    занятый пульт (33002) или флаг "запрос не обработан" сужают его вдвое
+    и ставят паузу перед следующими запросами: 0.1, 0.2, 0.4... секунды со случайным разбросом.
+    Отказы, пришедшие во время паузы, окно и паузу не меняют.
+    """
+
+    def __init__(
+            self,
+            max_in_flight: int,
+            min_in_flight: int = 1,
+            backoff_base: float = 0.1,
+            backoff_max: float = 5.0,
+    ):
+        """
+        :param max_in_flight: максимум запросов без ответа, с него окно и начинается
+        :param min_in_flight: меньше окно не сужается
+        :param backoff_base: первая пауза после отказа, секунды
+        :param backoff_max: максимальная пауза, секунды
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.limit: float = float(self.max_in_flight)
+        self.in_flight: int = 0
+        self._failures: int = 0             # Отказы подряд, от них растёт пауза
+        self._paused_until: float = 0.0
+        self._changed = asyncio.Event()
+
+    @property
+    def available(self) -> int:
+        return max(0, int(self.limit) - self.in_flight)
+
+    async def acquire(self, count: int) -> int:
+        """
+        Ждём паузу и свободное место в окне
+        :return: сколько запросов можно отправить, от 1 до count
+        """
+        while True:
+            pause = self._paused_until - monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.available:
+                break
+            self._changed.clear()
+            await self._changed.wait()
+        granted = min(count, self.available)
+        self.in_flight += granted
+        return granted
+
+    def release(self, count: int = 1, rejected: bool = False):
+        """
+        :param count: запросы, на которые пришёл ответ
+        :param rejected: сирена отказала - пульт занят или запрос не обработан
+        """
+        self.in_flight = max(0, self.in_flight - count)
+        if rejected:
+            self._reject()
+        elif count:
+            self._failures = 0
+            self.limit = min(float(self.max_in_flight), self.limit + count / self.limit)
+        self._changed.set()
+
+    def give_back(self, count: int):
+        """Место в окне, которое не понадобилось или запросы не дошли до сирены, окно не меняется"""
+        self.in_flight = max(0, self.in_flight - count)
+        self._changed.set()
+
+    def _reject(self):
+        now = monotonic()
+        if now < self._paused_until:
+            # Отказы на запросы, ушедшие до паузы
+            return
+        self.limit = max(float(self.min_in_flight), self.limit / 2)
+        pause = min(self.backoff_max, self.backoff_base * 2 ** self._failures)
+        self._failures += 1
+        self._paused_until = now + pause * random.uniform(0.5, 1.0)
+
+    def __repr__(self):
+        return f"Limit: {self.limit:.1f}, In flight: {self.in_flight}, Failures in a row: {self._failures}"
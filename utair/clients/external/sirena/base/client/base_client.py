@@ -1,18 +1,24 @@
 import json
-from typing import Optional, Union
-from logging import getLogger
+import itertools
+import warnings
+from random import random
+from typing import Optional, Union, Tuple
+from logging import getLogger, INFO
 from abc import ABC
 
 from socket import socket
 
+from opentelemetry import trace
+
 from utair.clients.external.sirena.base.messaging import (
     Header, Request, RequestEncryptedSym, RequestEncryptedAsym, RequestABC
 )
 
 from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
 from utair.clients.external.sirena.base.connection.async_pool import AsyncConnectionPool
-from utair.clients.external.sirena.base.cache.base_cache import BaseCacheController
+from utair.clients.external.sirena.base.client.base_key_manager import BaseKeyManager
 from utair.clients.external.sirena.base.client.keys_container import KeysContainer
+from utair.clients.external.sirena.base.instrumentation import Instrumentation, Phase, Timer, instrumentation
 
 from utair.clients.external.sirena.base.messaging.response import (
     ResponseABC,
@@ -22,17 +28,37 @@ from utair.clients.external.sirena.base.messaging.response import (
 )
 from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
 from utair.clients.external.sirena.base.types import PublicMethods, AsymEncryptionHandShake
+from utair.clients.external.sirena.exceptions import SirenaEncryptionKeyError
+
+# Идентификаторы сообщений уникальны в рамках процесса,
+# так как мультиплексированное соединение делят между собой несколько клиентов
+_MESSAGE_IDS = itertools.count()
+_MAX_MESSAGE_ID = 0xFFFFFFFF
 
 
 class BaseClient(ABC):
     compress_response: bool = True
     compress_request: bool = True
+    # Тела запросов меньше порога не сжимаются, байты
+    compress_request_min_size: int = 512
+    # Уровень сжатия zlib, 1 - быстрее, 9 - сильнее
+    compress_level: int = 6
 
     # Размер куска, который мы читаем за раз в байтах (если он больше тела)
-    read_chunk_size: int = 1024
+    # Кратен блоку DES, чтобы куски расшифровывались без остатка
+    read_chunk_size: int = 64 * 1024
     # Максимальное кол-во попыток сделать запрос сирене и дождаться ответа
     max_request_retries: int = 5
 
+    # Метрики фаз запроса, размеров сообщений, повторов и хендшейков
+    instrumentation: Instrumentation = instrumentation
+    # Тела запросов и ответов в логе запросов
+    log_bodies: bool = True
+    # Доля успешных запросов, которые пишутся в лог, ответы с ошибкой пишутся всегда
+    log_sample_rate: float = 1.0
+    # Максимальный размер тела в логе, символы
+    log_body_max_size: int = 16 * 1024
+
     def __init__(
             self,
             host: str,
@@ -70,10 +96,8 @@ class BaseClient(ABC):
         self._connection: Optional[Union[AsyncConnectionPool, socket]] = None
         self._ignore_connection_calls = False
 
-        self._keys = KeysContainer()
-        self._handshake: bool = False
-
-        self._cache: Optional[BaseCacheController] = None
+        # Ключи шифрования, общие на процесс, создаются в наследниках
+        self.key_manager: Optional[BaseKeyManager] = None
         self.logger = getLogger(logger_name)
 
     @property
@@ -82,52 +106,103 @@ class BaseClient(ABC):
             return False
         return self._connection._closed # noqa
 
+    @property
+    def _keys(self) -> Optional[KeysContainer]:
+        """Действующий симметричный ключ"""
+        return self.key_manager.current
+
     @property
     def hand_shake_done(self) -> bool:
-        return self._handshake
+        """Есть действующий симметричный ключ"""
+        return self._keys is not None
 
     @hand_shake_done.setter
     def hand_shake_done(self, value: bool = True):
-        self._handshake = value
+        """
+        Устарело: ключ теперь общий для всех клиентов с тем же client_id и хранится в key_manager.
+        False сбрасывает действующий ключ (как reset_hand_shake()), True ничего не делает
+        """
+        warnings.warn(
+            "hand_shake_done setter is deprecated, use reset_hand_shake() to force a new handshake",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if not value:
+            self.reset_hand_shake()
+
+    def reset_hand_shake(self):
+        """
+        Перестать шифровать действующим ключом, при следующем запросе согласуется новый
+        Ключ общий, сбрасывается для всех клиентов процесса с тем же client_id
+        """
+        if self._keys is not None:
+            self.key_manager.invalidate(self._keys.sym_key_id)
 
     @property
     def next_message_id(self) -> int:
         # NB: максимально unsigned 4 byte int
-        self.msg_count += 1
+        self.msg_count = next(_MESSAGE_IDS) % _MAX_MESSAGE_ID + 1
         return self.msg_count
 
-    def request_factory(self, client_request: RequestModelABC) -> RequestABC:
+    def request_factory(self, client_request: RequestModelABC, keys: Optional[KeysContainer] = None) -> RequestABC:
+        """
+        :param client_request: запрос
+        :param keys: ключи шифрования, по умолчанию действующие, для хендшейка - согласуемые
+        """
         if client_request.method_name == AsymEncryptionHandShake.ASYM_HAND_SHAKE.value:
             # Запрос для получения ключа симметричного шифрования
-            self._keys.is_able_to_asym()
+            keys.is_able_to_asym()
             return RequestEncryptedAsym(
-                self._keys.sym_key_seed,
+                keys.sym_key_seed,
                 self.next_message_id,
                 # Компрессия не поддерживается при шифровании ассимитричным ключем
                 False, False,
-                self._keys.public_key,
-                self._keys.private_key,
+                keys.public_key,
+                keys.private_key,
                 method_name=client_request.method_name
             )
         if client_request.method_name in PublicMethods._value2member_map_:  # noqa
+            body, timer = self._prepare_payload(client_request)
             return Request(
-                body=client_request.prepare_payload(),
+                body=body,
                 msg_id=self.next_message_id,
                 gzip_request=self.compress_request,
                 gzip_response=self.compress_response,
-                method_name=client_request.method_name
+                compress_min_size=self.compress_request_min_size,
+                compress_level=self.compress_level,
+                method_name=client_request.method_name,
+                timer=timer,
             )
-        self._keys.is_able_to_sym()
+        keys = keys or self._keys
+        if keys is None:
+            # Ключ истёк или сброшен, вызывающий согласует новый
+            raise SirenaEncryptionKeyError("Symmetric key is not negotiated")
+        keys.is_able_to_sym()
+        body, timer = self._prepare_payload(client_request)
         return RequestEncryptedSym(
-            body=client_request.prepare_payload(),
+            body=body,
             msg_id=self.next_message_id,
             gzip_request=self.compress_request,
             gzip_response=self.compress_response,
-            key=self._keys.get_des_key,
-            key_id=self._keys.sym_key_id,
-            method_name=client_request.method_name
+            compress_min_size=self.compress_request_min_size,
+            compress_level=self.compress_level,
+            key=keys.get_des_key,
+            key_id=keys.sym_key_id,
+            method_name=client_request.method_name,
+            timer=timer,
         )
 
+    @staticmethod
+    def _prepare_payload(client_request: RequestModelABC) -> Tuple[bytes, Timer]:
+        """Тело запроса и время его сборки"""
+        timer = Timer()
+        started = Timer.now()
+        payload = client_request.build_payload()
+        started = timer.since(Phase.BUILD, started)
+        body = client_request.serialize(payload)
+        timer.since(Phase.SERIALIZE, started)
+        return body, timer
+
     def response_factory(self, header: Header, method_name: str) -> ResponseABC:
         if header.is_not_encrypted:
             response = Response
@@ -138,24 +213,90 @@ class BaseClient(ABC):
         else:
             raise RuntimeError("Unable to define header encryption")
 
+        # Ответ зашифрован тем ключом, которым шифровали запрос, он может быть уже не действующим
+        keys: Optional[KeysContainer] = self.key_manager.get(header.key_id)
+        if keys is None and header.is_sym_encrypted:
+            raise SirenaEncryptionKeyError(f"Unknown symmetric key id: {header.key_id}")
         return response(
             header=header,
-            key=self._keys.get_des_key,
-            private_key=self._keys.private_key,
-            public_key=self._keys.public_key,
+            key=keys.get_des_key if keys is not None else None,
+            private_key=self.key_manager.private_key,
+            public_key=self.key_manager.public_key,
             method_name=method_name
         )
 
     def load_private_key(self) -> bool:
+        if self.key_manager.private_key:
+            return True
         if not self.private_key:
             return False
-        self._keys.private_key = self._keys.parse_rsa_key(self.private_key) # noqa
+        self.key_manager.private_key = KeysContainer.parse_rsa_key(self.private_key)  # noqa
         return True
 
-    def _request_log(self, request: RequestModelABC, response: ResponseModelABC):
-        self.logger.info(f"Sirena request: {request.method_name}", extra=dict(
+    def _record_request(self, request: RequestABC, message_size: int):
+        """
+        Метрики отправленного сообщения, время фаз сбрасывается до следующей отправки
+        """
+        request.size = message_size - Header.size
+        metrics = self.instrumentation
+        if metrics.enabled:
+            metrics.phases(request.method_name, request.timer)
+            metrics.message(
+                request.method_name, "request", request.size,
+                len(request.body) if request.is_compressed_request else None,
+            )
+        request.timer.timings.clear()
+
+    def _record_response(self, response: ResponseABC):
+        metrics = self.instrumentation
+        if not metrics.enabled:
+            return
+        metrics.phases(response.method_name, response.timer)
+        metrics.message(
+            response.method_name, "response", response.size,
+            len(response.raw_payload) if response.is_compressed and response.raw_payload else None,
+        )
+
+    def _parse_response(self, response: ResponseABC) -> ResponseModelABC:
+        """Разбор ответа с записью метрик"""
+        try:
+            return ResponseModelABC.parse(response)
+        finally:
+            self._record_response(response)
+
+    @staticmethod
+    def _trace_response(request: RequestABC, response: ResponseABC, attempts: int):
+        """Размеры сообщений и число попыток в спан запроса"""
+        span = trace.get_current_span()
+        if not span.is_recording():
+            return
+        span.set_attributes({
+            "sirena.request.size": request.size,
+            "sirena.response.size": response.size,
+            "sirena.response.compressed": response.is_compressed,
+            "sirena.attempts": attempts,
+        })
+
+    def _request_log(self, request: RequestModelABC, response: Optional[ResponseModelABC]):
+        # Тела собираются только для записей, которые действительно попадут в лог
+        if not self.logger.isEnabledFor(INFO):
+            return
+        failed = response is None or response.error is not None
+        if not failed and self.log_sample_rate < 1 and random() >= self.log_sample_rate:
+            return
+        extra = dict(
             integrator_name="sirena",
             api_method=request.method_name,
-            request_body=json.dumps(request.build(), indent=4, ensure_ascii=False),
-            response_body=json.dumps(response.payload or {}, indent=4, ensure_ascii=False),
-        ))
+        )
+        if self.log_bodies:
+            payload = response.payload if response is not None else None
+            extra.update(
+                request_body=self._cut(json.dumps(request.build(), indent=4, ensure_ascii=False)),
+                response_body=self._cut(json.dumps(payload or {}, indent=4, ensure_ascii=False)),
+            )
+        self.logger.info(f"Sirena request: {request.method_name}", extra=extra)
+
+    def _cut(self, body: str) -> str:
+        if len(body) <= self.log_body_max_size:
+            return body
+        return f"{body[:self.log_body_max_size]}... ({len(body)} total)"
@@ -0,0 +1,146 @@
+from logging import getLogger
+from time import time
+from typing import Dict, Optional
+
+from Crypto.PublicKey import RSA
+from utair.clients.external.sirena.base.cache.base_cache import BaseCacheController
+from utair.clients.external.sirena.base.client.keys_container import KeysContainer
+
+
+class BaseKeyManager:
+    """
+    Ключи шифрования одного клиента (адрес сирены и client_id), общие на процесс
+
+    RSA ключи разбираются один раз, симметричные ключи хранятся по key_id вместе с готовым DES
+    и ещё decrypt_grace секунд после истечения или сброса: новые запросы ими не шифруются,
+    а ответы на запросы, отправленные со старым ключом, расшифровываются.
+    Новый ключ согласуется заранее, за refresh_before секунд до истечения текущего,
+    одновременно идёт только одно согласование на процесс, а при наличии redis - и на все процессы.
+    """
+    # За сколько секунд до истечения текущего ключа согласуется новый
+    refresh_before: int = 10 * 60
+    # Пауза перед повторной попыткой заранее согласовать ключ после неудачи, секунды
+    refresh_retry_delay: int = 30
+    # Время ожидания и удержания блокировки согласования между процессами, секунды
+    lock_timeout: int = 30
+    # Сколько секунд после истечения или сброса ключ ещё расшифровывает ответы
+    decrypt_grace: int = 5 * 60
+
+    def __init__(
+            self,
+            cache: BaseCacheController,
+            refresh_before: Optional[int] = None,
+            logger_name: str = 'sirena_client',
+    ):
+        """
+        :param cache: хранилище ключа, общее для процессов
+        :param refresh_before: за сколько секунд до истечения ключа согласовывать новый
+        :param logger_name: логгер для ошибок фонового согласования
+        """
+        self.cache = cache
+        if refresh_before is not None:
+            self.refresh_before = refresh_before
+        self.logger = getLogger(logger_name)
+
+        # RSA ключ клиента, загружается первым запросом, которому нужен хендшейк
+        self.private_key: Optional[RSA.RsaKey] = None
+        # Открытый ключ сирены из key_info
+        self.public_key: Optional[RSA.RsaKey] = None
+
+        self._keys: Dict[int, KeysContainer] = dict()
+        self._current: Optional[KeysContainer] = None
+        # Ключи, которые сирена уже не знает, и время сброса: ими не шифруем и из кэша их не берём
+        self._invalid: Dict[int, float] = dict()
+        self._refresh_after: float = 0.0
+
+        self.handshakes: int = 0
+
+    @property
+    def current(self) -> Optional[KeysContainer]:
+        """Действующий ключ, которым шифруются новые запросы"""
+        keys = self._current
+        if keys is None or self._is_expired(keys):
+            return None
+        return keys
+
+    @property
+    def needs_refresh(self) -> bool:
+        keys = self.current
+        if keys is None:
+            return True
+        now = time()
+        return now >= keys.expires_at - self.refresh_before and now >= self._refresh_after
+
+    def get(self, key_id: Optional[int]) -> Optional[KeysContainer]:
+        """
+        Ключ для расшифровки ответа по идентификатору из заголовка, без идентификатора - действующий
+        Истёкший или сброшенный ключ отдаётся ещё decrypt_grace секунд, неизвестный - None:
+        другим ключом тело не расшифровать
+        """
+        if not key_id:
+            return self.current
+        keys = self._keys.get(key_id)
+        if keys is None or self._is_retired(keys):
+            return None
+        return keys
+
+    def new_keys(self) -> KeysContainer:
+        """Новый симметричный ключ для согласования, RSA ключи общие"""
+        return KeysContainer(private_key=self.private_key, public_key=self.public_key)
+
+    def register(self, keys: KeysContainer, expires_at: Optional[float] = None) -> KeysContainer:
+        """
+        Согласованный ключ становится действующим, предыдущий расшифровывает ответы до истечения срока
+        """
+        keys.expires_at = expires_at or time() + self.cache.key_ttl
+        # Сирена могла снова выдать идентификатор сброшенного ключа
+        self._invalid.pop(keys.sym_key_id, None)
+        self._keys[keys.sym_key_id] = keys
+        if self.current is None or keys.expires_at >= self._current.expires_at:
+            self._current = keys
+        for key_id in [k for k, v in list(self._keys.items()) if self._is_retired(v)]:
+            del self._keys[key_id]
+        return keys
+
+    def invalidate(self, key_id: Optional[int]):
+        """
+        Сирена не знает ключ (истёк или сброшен), больше им не шифруем
+        Ответы на уже отправленные с ним запросы ещё расшифровываются
+        """
+        if key_id is None:
+            return
+        self._invalid.setdefault(key_id, time())
+        if self._current is not None and self._current.sym_key_id == key_id:
+            self._current = None
+
+    def _from_cache(
+            self,
+            seed: Optional[bytes],
+            key_id: Optional[int],
+            expires_at: Optional[float]
+    ) -> Optional[KeysContainer]:
+        """
+        Ключ, согласованный другим процессом, если его хватит дольше чем на refresh_before
+        """
+        if not all((seed, key_id, expires_at)) or key_id in self._invalid:
+            return None
+        if time() >= expires_at - self.refresh_before:
+            return None
+        known = self._keys.get(key_id)
+        if known is not None and known.sym_key_seed == seed:
+            return known
+        keys = self.new_keys()
+        keys.sym_key_seed, keys.sym_key_id = seed, key_id
+        return self.register(keys, expires_at)
+
+    def _refresh_failed(self):
+        self._refresh_after = time() + self.refresh_retry_delay
+
+    @staticmethod
+    def _is_expired(keys: KeysContainer) -> bool:
+        return keys.expires_at is not None and time() >= keys.expires_at
+
+    def _is_retired(self, keys: KeysContainer) -> bool:
+        """Ключ не нужен и для расшифровки: истёк или сброшен больше decrypt_grace секунд назад"""
+        ended = [t for t in (keys.expires_at, self._invalid.get(keys.sym_key_id)) if t is not None]
+        return bool(ended) and time() >= min(ended) + self.decrypt_grace
@@ -24,6 +24,8 @@ class KeysContainer:
     # Если идентификатор ключа не указан (заполнен нулями),
     # для работы берется последний зарегистрированный симметричный ключ.
     _sym_key_id: int = field(repr=False, default=None)
+    # Время истечения симметричного ключа (unix time)
+    expires_at: Optional[float] = field(repr=False, default=None)
 
     def __post_init__(self):
         self.reset_des_ecb()
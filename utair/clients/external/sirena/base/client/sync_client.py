@@ -9,7 +9,11 @@ from utair.clients.external.sirena.exceptions import (
     SirenaEmptyResponse
 )
 from utair.clients.external.sirena.base.client.base_client import BaseClient
+from utair.clients.external.sirena.base.client.keys_container import KeysContainer
+from utair.clients.external.sirena.base.client.sync_key_manager import SyncKeyManager
 from utair.clients.external.sirena.base.cache.sync_cache import SyncCacheController
+from utair.clients.external.sirena.base.cache.sync_response_cache import SyncResponseCache
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.messaging import Header, RequestABC, ResponseABC
 from utair.clients.external.sirena.base.models.base_client_request import (
     RequestModelABC, KeyInfoRequest, AsymEncryptionHandShakeRequest
@@ -28,6 +32,8 @@ class SyncClient(BaseClient):
             private_key: str = None,
             private_key_path: str = None,
             logger_name: str = 'sirena_client',
+            response_cache: Optional[SyncResponseCache] = None,
+            key_manager: Optional[SyncKeyManager] = None,
     ):
         """
         :param host: хост сирены
@@ -36,6 +42,8 @@ class SyncClient(BaseClient):
         :param redis_url: URL Redis для кэширования симметричного ключа
         :param private_key: приватный ключ строкой
         :param private_key_path: путь к файлу с приватным ключом
+        :param response_cache: кэш ответов справочных методов
+        :param key_manager: ключи шифрования, общие для клиентов, по умолчанию свои у клиента
         """
         super().__init__(
             host=host,
@@ -47,86 +55,99 @@ class SyncClient(BaseClient):
             logger_name=logger_name
         )
         self._connection: Optional[socket] = None
-        self.cache: SyncCacheController = SyncCacheController(self.redis_url)
+        self.key_manager: SyncKeyManager = key_manager or SyncKeyManager(
+            SyncCacheController(self.redis_url, namespace=f'{self.host}:{self.port}:{self.client_id}'),
+            logger_name=logger_name,
+        )
+        self.cache: SyncCacheController = self.key_manager.cache
+        self.response_cache: Optional[SyncResponseCache] = response_cache
 
     def query(self, request: RequestModelABC, silent: bool = False) -> ResponseModelABC:
         """
         Точка входа для клиента
         Запрос к сирене
         """
-        with trace.get_tracer("sirena-client").start_span(f"sirena request: {request.method_name}") as span:
+        with trace.get_tracer("sirena-client").start_as_current_span(f"sirena request: {request.method_name}") as span:
             span.set_attribute("sirena.client", self.client_id)
             span.set_attribute("sirena.host", self.host)
 
-            self.connect(self._ignore_connection_calls)
-            self._hand_shake()
-            result = self._query(request)
-            self._request_log(request=request, response=result)
-            self.disconnect(self._ignore_connection_calls)
+            if self.response_cache is not None:
+                result = self.response_cache.fetch(request, self._fetch)
+            else:
+                result = self._fetch(request)
 
         if not silent:
             result.raise_for_error()
         return result
 
-    def _hand_shake(self, force: bool = False):
+    def _fetch(self, request: RequestModelABC) -> ResponseModelABC:
         """
-        Обмениваемся ключами и сохраняем их
+        Запрос к сирене мимо кэша
         """
-        self.cache.spin_up()
-        if self.hand_shake_done and not force:
-            return
+        self.connect(self._ignore_connection_calls)
+        self._hand_shake()
+        result = self._query(request)
+        self._request_log(request=request, response=result)
+        self.disconnect(self._ignore_connection_calls)
+        return result
+
+    def _hand_shake(self, stale_key_id: Optional[int] = None) -> KeysContainer:
+        """
+        Действующий симметричный ключ, общий на процесс
+        Новый согласуется, только если действующего нет или он скоро истечёт
+        :param stale_key_id: ключ, который сирена не приняла
+        """
+        self.key_manager.invalidate(stale_key_id)
+        return self.key_manager.get_keys(self._negotiate_keys)
 
-        if not force and self.cache.is_available:
-            # Берём из кэша, если есть
-            seed, _id = self.cache.get()
-            if all((seed, _id)):
-                self._keys.sym_key_seed, self._keys.sym_key_id = seed, _id
-                self.hand_shake_done = True
-                return
-
-        if self.cache.is_available:
-            # Чистим кэш
-            self.cache.purge()
-
-        if not self._keys.private_key:
-            # TODO test from string
-            self.load_private_key()
-
-        self.logger.debug(f"Handshaking, is_force: {force}")
-        self._keys.reset_des_ecb()
-        # Запрашиваем у сирены паб ключ
-        key_info = self._query(KeyInfoRequest())
-        key_info.raise_for_error()
-        self._keys.set_pub_key(key_info.data)
-
-        # Обмениваемся ключами, получаем симметричный ключ
-        self._keys.is_able_to_asym()
-        response = self._query(AsymEncryptionHandShakeRequest())
-        response.raise_for_error()
-        self._keys.sym_key_id = response.response.key_id
-
-        # Кэшируем ключ
-        if self.cache.is_available:
-            self.cache.set(self._keys.sym_key_seed, self._keys.sym_key_id)
+    def _negotiate_keys(self, keys: KeysContainer):
+        """
+        Регистрируем в сирене новый симметричный ключ
+        """
+        self.load_private_key()
+        keys.private_key = self.key_manager.private_key
+        if not self.key_manager.public_key:
+            # Запрашиваем у сирены паб ключ, он общий на процесс
+            key_info = self._query(KeyInfoRequest(), keys)
+            key_info.raise_for_error()
+            keys.set_pub_key(key_info.data)
+            self.key_manager.public_key = keys.public_key
+        keys.public_key = self.key_manager.public_key
+
+        self.logger.debug("Handshaking")
+        # Обмениваемся ключами, получаем идентификатор симметричного ключа
+        response = self._query(AsymEncryptionHandShakeRequest(), keys)
+        if response.error is not None:
+            # Возможно, сменился ключ сирены - в следующий раз запросим заново
+            self.key_manager.public_key = None
+            response.raise_for_error()
+        keys.sym_key_id = response.response.key_id
+        self.instrumentation.handshake()
         self.logger.debug("Handshake done.")
-        self.hand_shake_done = True
 
-    def _query(self, request: RequestModelABC) -> ResponseModelABC:
+    def _query(self, request: RequestModelABC, keys: Optional[KeysContainer] = None) -> ResponseModelABC:
+        """
+        :param keys: ключи хендшейка, для остальных запросов - действующий ключ
+        """
         attempts = 0
         hand_shake_retried = False
         while attempts < self.max_request_retries:
             attempts += 1
+            _request: Optional[RequestABC] = None
             try:
-                _request: RequestABC = self.request_factory(request)
+                _request = self.request_factory(request, keys)
                 _response: ResponseABC = self._send_msg(_request)
                 if not bool(_response):
+                    self.instrumentation.retry(request.method_name, "not_processed")
                     continue    # Сирена просит попробовать еще раз
-                response: ResponseModelABC = ResponseModelABC.parse(_response)
+                response: ResponseModelABC = self._parse_response(_response)
+                self._trace_response(_request, _response, attempts)
                 return response
             except SirenaEncryptionKeyError:
-                if hand_shake_retried:
+                if hand_shake_retried or keys is not None:
                     raise
-                self._hand_shake(force=True)
+                self.instrumentation.retry(request.method_name, "key_error")
+                self._hand_shake(stale_key_id=getattr(_request, "key_id", None))
                 hand_shake_retried = True
                 attempts -= 1
 
@@ -137,34 +158,74 @@ class SyncClient(BaseClient):
         Низкоуровневый запрос в сирену
         """
         message: bytes = r.make_message(self.client_id)
-        self._connection.send(message)
+        started = Timer.now()
+        self._connection.sendall(message)
+        started = r.timer.since(Phase.WRITE, started)
+        self._record_request(r, len(message))
         # Получаем заголовок
         header: Header = Header.parse(self._read_header())
         # Готовим ответ, складываем в него информацию полученную из заголовка
-        response: ResponseABC = self.response_factory(header, r.method_name)
+        response: ResponseABC = self._response_for(header, r.method_name)
+        started = response.timer.since(Phase.WAIT_HEADER, started)
         # Получаем тело в ответ
-        body: bytes = self._read_body(response)
-        response.parse(body)
+        self._read_body(response)
+        response.timer.since(Phase.READ_BODY, started)
         # Возвращаем только ответы
         return response
 
-    def _read_header(self) -> bytes:
+    def _recv_into(self, buffer: memoryview):
+        """ Читаем из сокета ровно len(buffer) байт """
+        received = 0
+        while received < len(buffer):
+            size = self._connection.recv_into(buffer[received:])
+            if not size:
+                raise SirenaEmptyResponse()
+            received += size
+
+    def _read_header(self) -> bytearray:
         """ Читаем заголовок """
-        header: bytes = self._connection.recv(Header.size)
-        if not header:
-            raise SirenaEmptyResponse()
-        while len(header) < Header.size:
-            header += self._connection.recv(Header.size - len(header))
+        header = bytearray(Header.size)
+        self._recv_into(memoryview(header))
         return header
 
-    def _read_body(self, r: ResponseABC) -> bytes:
-        data: bytes = b''
-        # Читаем из стрима по всему размеру
+    def _response_for(self, header: Header, method_name: str) -> ResponseABC:
+        """
+        Ответ по прочитанному заголовку
+        Ключа ответа уже нет - тело дочитываем, иначе следующий ответ в сокете начнётся с середины этого
+        """
+        try:
+            return self.response_factory(header, method_name)
+        except SirenaEncryptionKeyError:
+            self._skip_body(header.chunk_len)
+            raise
+
+    def _read_body(self, r: ResponseABC):
+        """
+        Читаем тело кусками в один переиспользуемый буфер,
+        каждый кусок сразу расшифровывается и распаковывается
+        """
+        buffer = memoryview(bytearray(min(r.body_len, self.read_chunk_size)))
+        r.start()
         while r.body_len > 0:
-            chunk = self._connection.recv(min(r.body_len, self.read_chunk_size))
-            data += chunk
+            chunk = buffer[:min(r.body_len, len(buffer))]
+            self._recv_into(chunk)
             r.body_len -= len(chunk)
-        return data
+            try:
+                r.feed(chunk)
+            except Exception:
+                # Тело не расшифровалось или не распаковалось - дочитываем его,
+                # иначе следующий ответ в этом соединении начнётся с середины этого
+                self._skip_body(r.body_len)
+                raise
+        r.finish()
+
+    def _skip_body(self, size: int):
+        """ Дочитываем и выбрасываем остаток тела """
+        buffer = memoryview(bytearray(min(size, self.read_chunk_size)))
+        while size > 0:
+            chunk = buffer[:min(size, len(buffer))]
+            self._recv_into(chunk)
+            size -= len(chunk)
 
     def __enter__(self) -> "SyncClient":
         self._ignore_connection_calls = True
@@ -201,5 +262,5 @@ class SyncClient(BaseClient):
             return True
         # Читаем из файла приватный ключ
         with open(os.path.abspath(self.private_key_path)) as key_file:
-            self._keys.private_key = self._keys.parse_rsa_key(key_file.read())  # noqa
+            self.key_manager.private_key = KeysContainer.parse_rsa_key(key_file.read())  # noqa
         return True
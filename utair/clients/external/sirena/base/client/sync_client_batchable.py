@@ -1,8 +1,11 @@
-from typing import List
+from typing import List, Optional
 
 from utair.clients.external.sirena.base.client.sync_client import SyncClient
+from utair.clients.external.sirena.base.client.sync_key_manager import SyncKeyManager
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.messaging import Header, RequestABC, ResponseABC
 from utair.clients.external.sirena.base.messaging.batch import Batch
+from utair.clients.external.sirena.base.cache.sync_response_cache import SyncResponseCache
 from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
 from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
 from utair.clients.external.sirena.exceptions import SirenaEncryptionKeyError
@@ -19,6 +22,8 @@ class SyncBatchableClient(SyncClient):
             private_key: str = None,
             private_key_path: str = None,
             logger_name: str = 'sirena_client',
+            response_cache: Optional[SyncResponseCache] = None,
+            key_manager: Optional[SyncKeyManager] = None,
     ):
         """
         :param host: хост сирены
@@ -27,6 +32,8 @@ class SyncBatchableClient(SyncClient):
         :param redis_url: URL Redis для кэширования симметричного ключа
         :param private_key: приватный ключ строкой
         :param private_key_path: путь к файлу с приватным ключом
+        :param response_cache: кэш ответов справочных методов, пачечные запросы его не используют
+        :param key_manager: ключи шифрования, общие для клиентов, по умолчанию свои у клиента
         """
         super().__init__(
             host=host,
@@ -35,7 +42,9 @@ class SyncBatchableClient(SyncClient):
             private_key_path=private_key_path,
             private_key=private_key,
             client_id=client_id,
-            logger_name=logger_name
+            logger_name=logger_name,
+            response_cache=response_cache,
+            key_manager=key_manager,
         )
 
     def batch_query(
@@ -50,8 +59,8 @@ class SyncBatchableClient(SyncClient):
         hand_shake_retried = False
 
         self.connect(self._ignore_connection_calls)
-        self._hand_shake()
-        batch: Batch = Batch.create([self.request_factory(r) for r in request])
+        keys = self._hand_shake()
+        batch: Batch = Batch.create([self.request_factory(r, keys) for r in request])
 
         while attempts < self.max_request_retries:
             try:
@@ -60,11 +69,15 @@ class SyncBatchableClient(SyncClient):
                 batch.received = 0
                 if not batch.retries_needed:
                     break
+                self.instrumentation.retry("batch", "not_processed", batch.retries_needed)
             except SirenaEncryptionKeyError:
                 # Один раз попробуем сделать хендшейк заново
                 if hand_shake_retried:
                     raise
-                self._hand_shake(force=True)
+                self.instrumentation.retry("batch", "key_error")
+                # Пачка зашифрована старым ключом, собираем её заново
+                keys = self._hand_shake(stale_key_id=keys.sym_key_id)
+                batch = Batch.create([self.request_factory(r, keys) for r in request])
                 hand_shake_retried = True
                 attempts -= 1
 
@@ -86,10 +99,14 @@ class SyncBatchableClient(SyncClient):
             if not b.should_try:
                 continue
             message: bytes = b.sirena_request.make_message(self.client_id)
-            self._connection.send(message)
+            started = Timer.now()
+            self._connection.sendall(message)
+            b.sirena_request.timer.since(Phase.WRITE, started)
+            self._record_request(b.sirena_request, len(message))
 
         # Длинна динамична и может менятся в зависимости от неуспешных ответов
         batch_len = len(batch)
+        started = Timer.now()
         while batch.received < batch_len:
             # Читаем ответы по очереди, соотносим к айдишнику запроса
             # Получаем заголовок
@@ -97,11 +114,14 @@ class SyncBatchableClient(SyncClient):
             # Соотвествующий на сообщение запрос
             _request: RequestABC = batch.get_request(header.msg_id)
             # Готовим ответ, складываем в него информацию полученную из заголовка
-            _response: ResponseABC = self.response_factory(header, _request.method_name)
-            _response.parse(self._read_body(_response))
+            _response: ResponseABC = self._response_for(header, _request.method_name)
+            started = _response.timer.since(Phase.WAIT_HEADER, started)
+            self._read_body(_response)
+            _response.timer.since(Phase.READ_BODY, started)
 
-            batch.add_response(ResponseModelABC.parse(_response), header.msg_id)
+            batch.add_response(self._parse_response(_response), header.msg_id)
             batch.received += 1
+            started = Timer.now()
 
         # Обнуляем счётчик, на случай, если нужно будет сделать ретрай
         batch.received = 0
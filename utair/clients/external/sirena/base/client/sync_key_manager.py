@@ -0,0 +1,87 @@
+import threading
+from typing import Callable, Optional
+
+from redis.exceptions import LockError
+from utair.clients.external.sirena.base.cache.sync_cache import SyncCacheController
+from utair.clients.external.sirena.base.client.base_key_manager import BaseKeyManager
+from utair.clients.external.sirena.base.client.keys_container import KeysContainer
+
+# Регистрирует в сирене переданный симметричный ключ, проставляет ему key_id
+Negotiate = Callable[[KeysContainer], None]
+
+
+class SyncKeyManager(BaseKeyManager):
+
+    def __init__(self, cache: SyncCacheController, **kwargs):
+        super().__init__(cache, **kwargs)
+        self.cache: SyncCacheController = cache
+        self._lock = threading.Lock()
+
+    def get_keys(self, negotiate: Negotiate) -> KeysContainer:
+        """
+        Действующий ключ, новый согласуется только если его нет или он скоро истечёт
+        Ключ, который скоро истечёт, обновляет один поток, остальные работают со старым
+        :param negotiate: согласование ключа в соединении запроса
+        """
+        keys = self.current
+        if keys is not None and not self.needs_refresh:
+            return keys
+        if keys is not None:
+            if not self._lock.acquire(blocking=False):
+                return keys
+        else:
+            self._lock.acquire()
+        try:
+            fresh = self.current
+            if fresh is not None and not self.needs_refresh:
+                # Пока ждали, ключ согласовал другой поток
+                return fresh
+            return self._negotiate_shared(negotiate)
+        except Exception:
+            if keys is None:
+                raise
+            # Текущий ключ ещё действует, попробуем позже
+            self.logger.exception("Symmetric key refresh failed")
+            self._refresh_failed()
+            return keys
+        finally:
+            self._lock.release()
+
+    def _negotiate_shared(self, negotiate: Negotiate) -> KeysContainer:
+        """
+        Ключ, согласованный другим процессом, или новый под блокировкой в redis
+        """
+        self.cache.spin_up()
+        if not self.cache.is_available:
+            return self._negotiate_new(negotiate)
+
+        if (keys := self._load_cached()) is not None:
+            return keys
+        lock = self.cache.lock(self.lock_timeout)
+        locked = lock.acquire()
+        try:
+            # Пока ждали блокировку, ключ мог согласовать другой процесс
+            if locked and (keys := self._load_cached()) is not None:
+                return keys
+            keys = self._negotiate_new(negotiate)
+            self.cache.set(keys.sym_key_seed, keys.sym_key_id)
+            return keys
+        finally:
+            if locked:
+                try:
+                    lock.release()
+                except LockError:
+                    # Блокировка истекла по таймауту
+                    pass
+
+    def _load_cached(self) -> Optional[KeysContainer]:
+        seed, key_id = self.cache.get()
+        if not all((seed, key_id)):
+            return None
+        return self._from_cache(seed, key_id, self.cache.expires_at())
+
+    def _negotiate_new(self, negotiate: Negotiate) -> KeysContainer:
+        keys = self.new_keys()
+        negotiate(keys)
+        self.handshakes += 1
+        return self.register(keys)
@@ -1,2 +1,5 @@
 from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection   # noqa
 from utair.clients.external.sirena.base.connection.async_pool import AsyncConnectionPool     # noqa
+from utair.clients.external.sirena.base.connection.async_multiplexed_connection import AsyncMultiplexedConnection   # noqa
+from utair.clients.external.sirena.base.connection.async_multiplexed_pool import AsyncMultiplexedConnectionPool     # noqa
+from utair.clients.external.sirena.base.connection.endpoint import Endpoint     # noqa
@@ -2,21 +2,40 @@ import asyncio
 import random
 import socket
 import sys
+from time import monotonic
 from typing import Union, Optional
+from utair.clients.external.sirena.exceptions import SirenaEmptyResponse
 
 
 class AsyncConnection:
+    # Соединение используется несколькими запросами одновременно
+    multiplexed: bool = False
 
     def __init__(
             self,
             host: str,
-            port: Union[str, int]
+            port: Union[str, int],
+            max_tries: int = 5,
+            retry_delay: float = 1.0,
+            connect_timeout: Optional[float] = None,
     ):
+        """
+        :param max_tries: кол-во попыток подключения
+        :param retry_delay: пауза между попытками подключения, секунды
+        :param connect_timeout: таймаут одной попытки подключения, секунды
+        """
         self.host = host
         self.port = port
+        self.max_tries = max_tries
+        self.retry_delay = retry_delay
+        self.connect_timeout = connect_timeout
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
 
+        # Время подключения и последнего возврата в пул (monotonic), нужны пулу
+        self.created_at: float = 0.0
+        self.last_used: float = 0.0
+
         self.id = random.randint(0, 9999)   # Debugging
 
     @property
@@ -27,6 +46,16 @@ class AsyncConnection:
             return False
         return True
 
+    @property
+    def alive(self) -> bool:
+        """
+        Соединение открыто и сирена его не закрыла со своей стороны
+        Проверка ничего не пишет в сокет, у сирены нет запроса-пинга
+        """
+        if not self.connected:
+            return False
+        return not self.reader.at_eof() and self.reader.exception() is None
+
     async def write(self, data: bytes):
         self.writer.write(data)
         await self.writer.drain()
@@ -39,17 +68,32 @@ class AsyncConnection:
             await self.disconnect()
             raise
 
+    async def read_exactly(self, size: int) -> bytes:
+        """Читаем ровно size байт одним буфером"""
+        try:
+            data: bytes = await asyncio.wait_for(self.reader.readexactly(size), timeout=60)
+            return data
+        except asyncio.IncompleteReadError as e:
+            # Соединение закрылось посреди сообщения
+            await self.disconnect()
+            raise SirenaEmptyResponse() from e
+        except IOError:
+            await self.disconnect()
+            raise
+
     async def connect(self):
         if self.connected:
             return
         await self._tcp_reconnect()
 
     async def _tcp_reconnect(self):
-        max_tries = 5
         _try = 1
-        while _try <= max_tries:
+        while _try <= self.max_tries:
             try:
-                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port),
+                    timeout=self.connect_timeout
+                )
 
                 _sock = self.writer.get_extra_info("socket")
                 _sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
@@ -59,10 +103,12 @@ class AsyncConnection:
                 if sys.platform != 'darwin':
                     _sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60)
 
+                self.created_at = self.last_used = monotonic()
                 return
             except (IOError, asyncio.TimeoutError):
                 pass
-            await asyncio.sleep(1.0)
+            if _try < self.max_tries:
+                await asyncio.sleep(self.retry_delay)
             _try += 1
         raise ConnectionError(f'Can not get connection to {self.host}:{self.port}')
 
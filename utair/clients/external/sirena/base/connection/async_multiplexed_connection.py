@@ -0,0 +1,113 @@
+import asyncio
+from typing import Dict, Optional, Tuple, Union
+
+from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection
+from utair.clients.external.sirena.base.messaging.header import Header
+from utair.clients.external.sirena.exceptions import SirenaEmptyResponse
+
+
+class AsyncMultiplexedConnection(AsyncConnection):
+    """
+    Мультиплексированное соединение
+
+    Один сокет используется одновременно несколькими запросами.
+    Фоновая задача читает ответы из стрима и по msg_id из заголовка
+    отдаёт тело ожидающему запросу, поэтому ответы могут приходить в любом порядке.
+    """
+    multiplexed = True
+
+    def __init__(
+            self,
+            host: str,
+            port: Union[str, int],
+            max_in_flight: int = 32,
+            request_timeout: float = 60,
+            **kwargs,
+    ):
+        """
+        :param max_in_flight: максимальное кол-во одновременно отправленных запросов без ответа
+        :param request_timeout: время ожидания ответа на один запрос в секундах
+        """
+        super().__init__(host, port, **kwargs)
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+
+        # Кол-во клиентов, которые сейчас держат соединение (считает пул)
+        self.holders: int = 0
+
+        self._pending: Dict[int, asyncio.Future] = dict()
+        self._in_flight_limit = asyncio.Semaphore(max_in_flight)
+        self._write_lock = asyncio.Lock()
+        self._reader_task: Optional[asyncio.Task] = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def read(self, size: int) -> bytes:
+        raise RuntimeError("Multiplexed connection is read by background task, use exchange()")
+
+    async def exchange(self, data: bytes, msg_id: int) -> Tuple[Header, bytes]:
+        """
+        Отправить сообщение и дождаться ответа на него
+        :param data: сообщение целиком (заголовок + тело)
+        :param msg_id: идентификатор сообщения из заголовка
+        :return: заголовок и тело ответа
+        """
+        async with self._in_flight_limit:
+            if not self.connected:
+                raise SirenaEmptyResponse()
+            if msg_id in self._pending:
+                raise RuntimeError(f"Message {msg_id} is already in flight")
+
+            future = asyncio.get_running_loop().create_future()
+            self._pending[msg_id] = future
+            try:
+                try:
+                    async with self._write_lock:
+                        await self.write(data)
+                except IOError:
+                    await self.disconnect()
+                    raise
+                # Таймаут не рвёт соединение, опоздавший ответ просто будет отброшен
+                return await asyncio.wait_for(future, timeout=self.request_timeout)
+            finally:
+                self._pending.pop(msg_id, None)
+
+    async def connect(self):
+        if self.connected:
+            return
+        await self._tcp_reconnect()
+        self._reader_task = asyncio.ensure_future(self._read_loop(self.reader))
+
+    async def disconnect(self):
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        self._reader_task = None
+        self._fail_pending(SirenaEmptyResponse())
+        await super().disconnect()
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        """
+        Читаем ответы по очереди и раздаём их ожидающим запросам
+        """
+        try:
+            while True:
+                header: Header = Header.parse(await reader.readexactly(Header.size))
+                body: bytes = await reader.readexactly(header.chunk_len)
+                future = self._pending.get(header.msg_id)
+                if future is None or future.done():
+                    # Запрос уже отвалился по таймауту, ответ никому не нужен
+                    continue
+                future.set_result((header, body))
+        except Exception as e:  # noqa
+            # Сокет отвалился или пришёл битый заголовок - дальше стрим не разобрать:
+            # все ожидающие запросы завершаем ошибкой, закрытое соединение пул больше не выдаст
+            self._fail_pending(SirenaEmptyResponse(internal_message=repr(e)))
+            if self.writer is not None:
+                self.writer.close()
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
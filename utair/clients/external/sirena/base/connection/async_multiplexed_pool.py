@@ -0,0 +1,118 @@
+from time import monotonic
+from typing import Optional, Union
+
+from utair.clients.external.sirena.base.connection.async_multiplexed_connection import AsyncMultiplexedConnection
+from utair.clients.external.sirena.base.connection.async_pool import AsyncConnectionPool
+from utair.clients.external.sirena.base.connection.endpoint import Endpoint
+
+
+class AsyncMultiplexedConnectionPool(AsyncConnectionPool):
+    """
+    Пул мультиплексированных соединений
+
+    Соединение не забирается в монопольное пользование:
+    acquire отдаёт наименее загруженное соединение среди доступных адресов,
+    новое открывается только когда все текущие заняты полностью.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: Union[str, int],
+            min_size: int = 1,
+            max_size: int = 2,
+            max_in_flight: int = 32,
+            request_timeout: float = 60,
+            **kwargs,
+    ):
+        super().__init__(host, port, min_size=max(min_size, 1), max_size=max_size, **kwargs)
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+
+    def __repr__(self):
+        return f"{super().__repr__()}, In flight: {self.in_flight}"
+
+    @property
+    def in_flight(self) -> int:
+        return sum(c.in_flight for e in self._endpoints for c in e.free)
+
+    async def _create_new_connection(self, endpoint: Endpoint) -> AsyncMultiplexedConnection:
+        conn = AsyncMultiplexedConnection(
+            endpoint.host,
+            endpoint.port,
+            max_in_flight=self.max_in_flight,
+            request_timeout=self.request_timeout,
+            max_tries=self.connect_tries,
+            connect_timeout=self.connect_timeout,
+        )
+        await conn.connect()
+        return conn
+
+    def _in_use(self, endpoint: Endpoint) -> int:
+        # Соединения всегда лежат в free, занятость считаем по запросам
+        return sum(c.holders for c in endpoint.free)
+
+    def _load(self, endpoint: Endpoint) -> int:
+        return sum(self._conn_load(c) for c in endpoint.free) + endpoint.connecting * self.max_in_flight
+
+    @staticmethod
+    def _conn_load(conn: AsyncMultiplexedConnection) -> int:
+        """
+        Запросы без ответа на соединении: клиент с пачкой отправляет много запросов под одним acquire,
+        а только что получивший соединение ещё ничего не отправил, но отправит хотя бы один
+        """
+        return max(conn.in_flight, conn.holders)
+
+    def _idle(self, conn: AsyncMultiplexedConnection) -> bool:
+        return not conn.holders
+
+    async def _acquire(self) -> AsyncMultiplexedConnection:
+        while True:
+            self._check_available()
+            endpoints = [e for e in self._endpoints if self._routable(e)]
+            # Мёртвые соединения без запросов закрываем, с запросами - дождутся своих ошибок
+            for endpoint in endpoints:
+                for conn in [c for c in endpoint.free if not c.holders and not self._usable(c)]:
+                    endpoint.free.remove(conn)
+                    await conn.disconnect()
+
+            conn: Optional[AsyncMultiplexedConnection] = min(
+                (c for e in endpoints for c in e.free if self._usable(c)),
+                key=self._conn_load,
+                default=None,
+            )
+            if conn is None or self._conn_load(conn) >= self.max_in_flight:
+                # Выведенный из ротации единственный адрес пробуем, только если соединений нет совсем
+                endpoint = min(
+                    (e for e in endpoints if e.size < self.max_size and (e.healthy or conn is None)),
+                    key=self._load,
+                    default=None,
+                )
+                if endpoint is not None:
+                    new_conn = await self._open_connection(endpoint)
+                    if new_conn is None:
+                        if conn is None:
+                            self._connect_failed(endpoint)
+                        # Адрес выведен из ротации, пробуем следующий
+                        continue
+                    self._put_back(endpoint, new_conn)
+                    conn = new_conn
+                elif conn is None:
+                    if not any(e.connecting for e in endpoints):
+                        raise ConnectionError(f"No usable connections: {self}")
+                    # Соединения ещё открываются, ждём
+                    await self._wait()
+                    continue
+            # Соединение переполнено и открыть новое нельзя - ждать будет семафор соединения
+            conn.holders += 1
+            return conn
+
+    def _put_back(self, endpoint: Endpoint, conn: AsyncMultiplexedConnection):
+        # Соединение общее: кладём в пул и будим всех ожидающих, каждый выберет соединение сам
+        endpoint.free.append(conn)
+        self._wake_all()
+
+    async def release(self, c: AsyncMultiplexedConnection):
+        # Соединение остаётся в пуле, просто освобождаем место под следующий запрос
+        c.holders -= 1
+        c.last_used = monotonic()
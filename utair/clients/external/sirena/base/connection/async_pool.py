@@ -1,54 +1,12 @@
-import collections
-from typing import Union, Set
-from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection
-
 import asyncio
-import sys
-
-from asyncio.locks import Lock as _Lock
-
-
-class Lock(_Lock):
-
-    """
-    Fixes an issue with all Python versions that leaves pending waiters
-    without being awakened when the first waiter is canceled.
-    Code adapted from the PR https://github.com/python/cpython/pull/1031
-    Waiting once it is merged to make a proper condition to relay on
-    the stdlib implementation or this one patched
-    """
-
-    # NB: hacks
-    if sys.version_info < (3, 7, 0):
-        async def acquire(self):
-            """Acquire a lock.
-            This method blocks until the lock is unlocked, then sets it to
-            locked and returns True.
-            """
-            if not self._locked and all(w.cancelled() for w in self._waiters):
-                self._locked = True
-                return True
-
-            fut = self._loop.create_future()
-
-            self._waiters.append(fut)
-            try:
-                await fut
-                self._locked = True
-                return True
-            except asyncio.CancelledError:
-                if not self._locked:  # pragma: no cover
-                    self._wake_up_first()
-                raise
-            finally:
-                self._waiters.remove(fut)
+import collections
+from logging import getLogger
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union
 
-        def _wake_up_first(self):
-            """Wake up the first waiter who isn't cancelled."""
-            for fut in self._waiters:
-                if not fut.done():
-                    fut.set_result(True)
-                    break
+from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection
+from utair.clients.external.sirena.base.connection.endpoint import Endpoint
+from utair.clients.external.sirena.exceptions import SirenaPoolExhaustedError
 
 
 class CloseEvent:
@@ -99,6 +57,17 @@ class _AsyncConnectionContextManager:
 
 
 class AsyncConnectionPool:
+    """
+    Пул соединений к одному или нескольким шлюзам сирены
+
+    Соединение берётся на наименее загруженном доступном адресе.
+    Адрес, к которому не удалось подключиться, выводится из ротации с нарастающей паузой,
+    поэтому мёртвый шлюз не стоит запросу повторных попыток подключения.
+    Единственный адрес из ротации не выводится: запросу больше некуда идти, и он подключается сам.
+    Освободившееся соединение отдаётся первому ожидающему напрямую.
+    Фоновая задача закрывает мёртвые, старые и лишние простаивающие соединения,
+    возвращает в ротацию выведенные адреса и добирает min_size соединений на каждый адрес.
+    """
 
     def __init__(
             self,
@@ -106,31 +75,117 @@ class AsyncConnectionPool:
             port: Union[str, int],
             min_size: int = 2,
             max_size: int = 4,
+            endpoints: Optional[Sequence[Union[str, Tuple[str, Union[str, int]]]]] = None,
+            acquire_timeout: Optional[float] = None,
+            max_waiters: Optional[int] = None,
+            connect_timeout: Optional[float] = 5,
+            connect_tries: int = 1,
+            max_idle_time: Optional[float] = 300,
+            max_lifetime: Optional[float] = None,
+            health_check_interval: Optional[float] = 10,
+            eject_backoff: float = 1,
+            max_eject_backoff: float = 60,
+            logger_name: str = 'sirena_client',
             **kwargs,
     ):
+        """
+        :param min_size: соединений на каждый адрес, которые держатся открытыми
+        :param max_size: максимум соединений на каждый адрес
+        :param endpoints: адреса шлюзов "host:port" или (host, port), по умолчанию host и port
+        :param acquire_timeout: время ожидания соединения, секунды
+        :param max_waiters: максимум ожидающих соединения, следующие сразу получают ошибку
+        :param connect_timeout: таймаут подключения к шлюзу, секунды
+        :param connect_tries: попыток подключения, прежде чем адрес будет выведен из ротации
+        :param max_idle_time: простаивающие дольше соединения сверх min_size закрываются, секунды
+        :param max_lifetime: соединения старше закрываются при возврате в пул, секунды
+        :param health_check_interval: период фоновой проверки, секунды, None - без фоновой проверки
+        :param eject_backoff: пауза после первой неудачи подключения к адресу, секунды
+        :param max_eject_backoff: максимальная пауза, секунды
+        :param logger_name: логгер для ошибок фоновой проверки
+        """
         self.host = host
         self.port = port
 
         self.min_size = min_size
         self.max_size = max_size
-
-        self._pool: collections.deque[AsyncConnection] = collections.deque(maxlen=max_size)
-        self._used: Set[AsyncConnection] = set()
-        self._acquiring: int = 0
-        self._cond = asyncio.Condition(lock=Lock())
+        self.acquire_timeout = acquire_timeout
+        self.max_waiters = max_waiters
+        self.connect_timeout = connect_timeout
+        self.connect_tries = connect_tries
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.logger = getLogger(logger_name)
+
+        self._endpoints: List[Endpoint] = [
+            Endpoint.from_address(address, backoff=eject_backoff, max_backoff=max_eject_backoff)
+            for address in (endpoints or [(host, port)])
+        ]
+        self._by_address: Dict[Tuple[str, int], Endpoint] = {e.address: e for e in self._endpoints}
+
+        # Ожидающие соединения, получают его через future (None - место освободилось, пробуем снова)
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._started = False
+        self._maintenance_task: Optional[asyncio.Task] = None
         self._close_state = CloseEvent(self._do_close)
 
+        self._acquired: int = 0
+        self._timeouts: int = 0
+        self._acquire_time_total: float = 0.0
+        self._acquire_time_max: float = 0.0
+
     def __repr__(self):
-        return f"Pool size: {self.size}, Free size: {self.free_size}, Closed: {self._closed}"
+        return (
+            f"Pool size: {self.size}, Free size: {self.free_size}, In use: {self.in_use}, "
+            f"Waiting: {self.waiting}, Closed: {self._closed}"
+        )
+
+    @property
+    def endpoints(self) -> List[Endpoint]:
+        return list(self._endpoints)
 
     @property
-    def free_size(self):
-        return len(self._pool)
+    def free_size(self) -> int:
+        return sum(len(e.free) for e in self._endpoints)
 
     @property
-    def size(self):
+    def size(self) -> int:
         """Current pool size."""
-        return self.free_size + len(self._used) + self._acquiring
+        return sum(e.size for e in self._endpoints)
+
+    @property
+    def in_use(self) -> int:
+        return sum(self._in_use(e) for e in self._endpoints)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def stats(self) -> Dict:
+        """
+        Состояние пула и время получения соединения (секунды)
+        """
+        return {
+            "in_use": self.in_use,
+            "free": self.free_size,
+            "connecting": sum(e.connecting for e in self._endpoints),
+            "waiting": self.waiting,
+            "acquired": self._acquired,
+            "timeouts": self._timeouts,
+            "acquire_time_avg": self._acquire_time_total / self._acquired if self._acquired else 0.0,
+            "acquire_time_max": self._acquire_time_max,
+            "endpoints": {
+                f"{e.host}:{e.port}": {
+                    "in_use": self._in_use(e),
+                    "free": len(e.free),
+                    "connecting": e.connecting,
+                    "healthy": e.healthy,
+                    "failures": e.failures,
+                }
+                for e in self._endpoints
+            },
+        }
 
     @property
     def _closed(self):
@@ -144,90 +199,264 @@ class AsyncConnectionPool:
         """Wait until pool gets closed."""
         await self._close_state.wait()
 
-    async def _create_new_connection(self) -> AsyncConnection:
-        conn = AsyncConnection(self.host, self.port)
+    async def _create_new_connection(self, endpoint: Endpoint) -> AsyncConnection:
+        conn = AsyncConnection(
+            endpoint.host,
+            endpoint.port,
+            max_tries=self.connect_tries,
+            connect_timeout=self.connect_timeout,
+        )
         await conn.connect()
         return conn
 
+    async def _open_connection(self, endpoint: Endpoint) -> Optional[AsyncConnection]:
+        """
+        Новое соединение к адресу, при неудаче адрес выводится из ротации
+        """
+        endpoint.connecting += 1
+        try:
+            conn = await self._create_new_connection(endpoint)
+        except ConnectionError:
+            endpoint.mark_failed()
+            # Место освободилось, а адрес мог выйти из ротации - ожидающие проверят заново
+            self._wake_all()
+            return None
+        finally:
+            endpoint.connecting -= 1
+        endpoint.mark_ok()
+        return conn
+
     async def clear(self):
-        async with self._cond:
-            await self._do_clear()
+        """Закрыть все свободные соединения"""
+        waiters = []
+        for endpoint in self._endpoints:
+            while endpoint.free:
+                waiters.append(endpoint.free.popleft().disconnect())
+        await asyncio.gather(*waiters)
 
     async def close(self):
         if not self._close_state.is_set():
             self._close_state.set()
 
-    async def _do_clear(self):
+    async def _do_close(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(ConnectionError("Pool is closed"))
         waiters = []
-        while self._pool:
-            conn = self._pool.popleft()
-            waiters.append(conn.disconnect())
+        for endpoint in self._endpoints:
+            while endpoint.free:
+                waiters.append(endpoint.free.popleft().disconnect())
+            for conn in endpoint.used:
+                waiters.append(conn.disconnect())
         await asyncio.gather(*waiters)
 
-    async def _do_close(self):
-        async with self._cond:
-            assert not self._acquiring, self._acquiring
-            waiters = []
-            while self._pool:
-                conn = self._pool.popleft()
-                waiters.append(conn.disconnect())
-            for conn in self._used:
-                waiters.append(conn.disconnect())
-            await asyncio.gather(*waiters)
+    def _in_use(self, endpoint: Endpoint) -> int:
+        """Кол-во занятых соединений адреса"""
+        return len(endpoint.used)
+
+    def _load(self, endpoint: Endpoint) -> int:
+        """Нагрузка на адрес, по ней выбирается адрес для нового запроса"""
+        return self._in_use(endpoint) + endpoint.connecting
+
+    def _usable(self, conn: AsyncConnection) -> bool:
+        """Соединение живое и не старше max_lifetime"""
+        if not conn.alive:
+            return False
+        return self.max_lifetime is None or monotonic() - conn.created_at < self.max_lifetime
+
+    def _idle(self, conn: AsyncConnection) -> bool:
+        """Свободным соединением сейчас никто не пользуется"""
+        return True
 
-    def _drop_closed(self):
-        for i in range(self.free_size):
-            conn = self._pool[0]
-            if not conn.connected:
-                self._pool.popleft()
-            else:
-                self._pool.rotate(-1)
+    def _routable(self, endpoint: Endpoint) -> bool:
+        """Адрес в ротации, единственный адрес - всегда"""
+        return endpoint.healthy or len(self._endpoints) == 1
+
+    def _pick_endpoint(self) -> Optional[Endpoint]:
+        """
+        Наименее загруженный доступный адрес, у которого есть свободное соединение или место под новое
+        """
+        candidates = [e for e in self._endpoints if self._routable(e) and (e.free or e.size < self.max_size)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda e: (self._load(e), not e.free))
+
+    def _check_available(self):
+        if self._closed:
+            raise Exception("Pool is closed")
+        if not any(self._routable(e) for e in self._endpoints):
+            raise ConnectionError(f"Can not get connection to any of {', '.join(map(str, self._endpoints))}")
 
     async def fill_free(self):
-        self._drop_closed()
-        while self.size < self.min_size:
-            self._acquiring += 1
-            try:
-                conn = await self._create_new_connection()
-                # TODO чё-нибудь писануть в стрим, чтоб проверить?
-                self._pool.append(conn)
-            finally:
-                self._acquiring -= 1
-                self._drop_closed()
-        if self.free_size:
-            return
+        """
+        Добираем min_size соединений на каждый доступный адрес (прогрев) и запускаем фоновую проверку
+        """
+        self._started = True
+        if self._maintenance_task is None and self.health_check_interval and not self._closed:
+            self._maintenance_task = asyncio.ensure_future(self._maintenance())
+        await asyncio.gather(*(self._fill_endpoint(e) for e in self._endpoints if e.healthy))
+
+    async def _fill_endpoint(self, endpoint: Endpoint):
+        while not self._closed and endpoint.healthy and endpoint.size < self.min_size:
+            conn = await self._open_connection(endpoint)
+            if conn is None:
+                return
+            self._put_back(endpoint, conn)
 
     async def acquire(self) -> AsyncConnection:
         if self._closed:
             raise Exception("Pool is closed")
-        async with self._cond:
-            if self._closed:
-                raise Exception("Pool is closed")
-            while True:
-                await self.fill_free()
-                if self.free_size:
-                    conn = self._pool.popleft()
-                    assert conn.connected, conn
-                    assert conn not in self._used, (conn, self._used)
-                    self._used.add(conn)
+        if not self._started:
+            await self.fill_free()
+        started = monotonic()
+        try:
+            conn = await asyncio.wait_for(self._acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise SirenaPoolExhaustedError(internal_message=f"Acquire timeout {self.acquire_timeout}s, {self}")
+        elapsed = monotonic() - started
+        self._acquired += 1
+        self._acquire_time_total += elapsed
+        self._acquire_time_max = max(self._acquire_time_max, elapsed)
+        return conn
+
+    async def _acquire(self) -> AsyncConnection:
+        while True:
+            self._check_available()
+            endpoint = self._pick_endpoint()
+            if endpoint is None:
+                # Все соединения заняты, ждём освобождения
+                conn = await self._wait()
+                if conn is not None:
                     return conn
-                else:
-                    await self._cond.wait()
+                continue
+
+            conn = await self._pop_free(endpoint)
+            if conn is None:
+                conn = await self._open_connection(endpoint)
+                if conn is None:
+                    self._connect_failed(endpoint)
+                    # Адрес выведен из ротации, пробуем следующий
+                    continue
+            endpoint.used.add(conn)
+            return conn
+
+    def _connect_failed(self, endpoint: Endpoint):
+        """Подключение к единственному адресу не удалось - другого нет, запрос получает ошибку"""
+        if len(self._endpoints) == 1:
+            raise ConnectionError(f"Can not connect to {endpoint}")
+
+    async def _pop_free(self, endpoint: Endpoint) -> Optional[AsyncConnection]:
+        """
+        Последнее вернувшееся свободное соединение, чтобы давно простаивающие закрылись по max_idle_time
+        """
+        while endpoint.free:
+            conn = endpoint.free.pop()
+            if self._usable(conn):
+                return conn
+            await conn.disconnect()
+        return None
+
+    async def _wait(self) -> Optional[AsyncConnection]:
+        if self.max_waiters is not None and len(self._waiters) >= self.max_waiters:
+            raise SirenaPoolExhaustedError(internal_message=f"Too many waiters: {self.max_waiters}, {self}")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Соединение успели отдать, но ожидающий уже ушёл (таймаут) - возвращаем его в пул
+            if waiter.done() and not waiter.cancelled() and waiter.result() is not None:
+                conn: AsyncConnection = waiter.result()
+                endpoint = self._by_address[(conn.host, int(conn.port))]
+                endpoint.used.discard(conn)
+                self._put_back(endpoint, conn)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def _wake_waiter(self, conn: Optional[AsyncConnection] = None) -> bool:
+        """Отдаём соединение (или освободившееся место) первому ожидающему"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(conn)
+                return True
+        return False
+
+    def _wake_all(self):
+        while self._wake_waiter():
+            pass
+
+    def _put_back(self, endpoint: Endpoint, conn: AsyncConnection):
+        if self._wake_waiter(conn):
+            endpoint.used.add(conn)
+        else:
+            endpoint.free.append(conn)
 
     async def release(self, c: AsyncConnection):
-        assert c in self._used, ("Invalid connection, maybe from other pool", c)
-        self._used.remove(c)
-        self._pool.append(c)
-        # Не отключаем соединение, просто возвращаем его обратно в пул
-        # if c.connected:
-        #     await c.disconnect()
-        asyncio.ensure_future(self._wakeup())
-
-    async def _wakeup(self, closing_conn=None):
-        async with self._cond:
-            self._cond.notify()
-        if closing_conn is not None:
-            await closing_conn.wait_closed()
+        endpoint = self._by_address.get((c.host, int(c.port)))
+        assert endpoint is not None and c in endpoint.used, ("Invalid connection, maybe from other pool", c)
+        endpoint.used.remove(c)
+        c.last_used = monotonic()
+        if self._closed or not self._usable(c):
+            await c.disconnect()
+            # Место освободилось, ожидающий откроет новое соединение
+            self._wake_waiter()
+            return
+        # Не отключаем соединение, возвращаем его в пул или сразу отдаём ожидающему
+        self._put_back(endpoint, c)
+
+    async def _maintenance(self):
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self._check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:   # noqa
+                self.logger.exception("Connection pool health check failed")
+
+    async def _check(self):
+        """
+        Закрываем мёртвые, старые и лишние простаивающие соединения,
+        добираем min_size на доступных адресах, в том числе вернувшихся в ротацию
+        """
+        now = monotonic()
+        closing = []
+        for endpoint in self._endpoints:
+            # min_size держится на каждом адресе, закрытые считаем по адресу
+            closed = 0
+            keep = collections.deque()
+            # Слева соединения, которые простаивают дольше всех
+            for conn in endpoint.free:
+                if not self._idle(conn):
+                    keep.append(conn)
+                elif not self._usable(conn):
+                    closing.append(conn)
+                    closed += 1
+                elif (
+                    self.max_idle_time is not None
+                    and now - conn.last_used > self.max_idle_time
+                    and endpoint.size - closed > self.min_size
+                ):
+                    closing.append(conn)
+                    closed += 1
+                else:
+                    keep.append(conn)
+            endpoint.free = keep
+        await asyncio.gather(*(conn.disconnect() for conn in closing))
+
+        returned = [e for e in self._endpoints if e.failures and e.healthy]
+        await self.fill_free()
+        if any(not e.failures for e in returned):
+            # Адрес вернулся в ротацию, ожидающие могут попробовать его
+            self._wake_all()
 
     def get(self):
         """
@@ -0,0 +1,71 @@
+from collections import deque
+from time import monotonic
+from typing import Deque, Set, Tuple, Union
+
+from utair.clients.external.sirena.base.connection.async_connection import AsyncConnection
+
+
+class Endpoint:
+    """
+    Адрес шлюза сирены и соединения пула к нему
+
+    Неудачное подключение выводит адрес из ротации на backoff секунд,
+    каждая следующая неудача подряд удваивает паузу, но не больше max_backoff.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: Union[str, int],
+            backoff: float = 1.0,
+            max_backoff: float = 60.0,
+    ):
+        self.host = host
+        self.port = int(port)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.free: Deque[AsyncConnection] = deque()
+        self.used: Set[AsyncConnection] = set()
+        self.connecting: int = 0
+
+        self.failures: int = 0
+        self.ejected_until: float = 0.0
+
+    @classmethod
+    def from_address(cls, address: Union[str, Tuple[str, Union[str, int]]], **kwargs) -> "Endpoint":
+        """
+        :param address: "host:port" или (host, port)
+        """
+        if isinstance(address, str):
+            host, _, port = address.rpartition(":")
+        else:
+            host, port = address
+        return cls(host, port, **kwargs)
+
+    def __repr__(self):
+        return (
+            f"{self.host}:{self.port} free: {len(self.free)}, used: {len(self.used)}, "
+            f"connecting: {self.connecting}, healthy: {self.healthy}"
+        )
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.host, self.port
+
+    @property
+    def size(self) -> int:
+        return len(self.free) + len(self.used) + self.connecting
+
+    @property
+    def healthy(self) -> bool:
+        return monotonic() >= self.ejected_until
+
+    def mark_ok(self):
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def mark_failed(self):
+        self.failures += 1
+        pause = min(self.backoff * 2 ** min(self.failures - 1, 16), self.max_backoff)
+        self.ejected_until = monotonic() + pause
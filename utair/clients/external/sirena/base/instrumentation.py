@@ -0,0 +1,125 @@
+from time import perf_counter
+from typing import Dict, Optional
+
+from opentelemetry import metrics
+
+
+class Phase:
+    """
+    Фазы запроса к сирене, время каждой пишется в гистограмму sirena.client.phase.duration
+    """
+    BUILD = "build"                     # Сборка словаря запроса
+    SERIALIZE = "serialize"             # Словарь запроса в xml
+    COMPRESS = "compress"               # Сжатие тела запроса
+    ENCRYPT = "encrypt"                 # Шифрование тела запроса
+    ACQUIRE = "pool_acquire"            # Ожидание соединения в пуле
+    WRITE = "write"                     # Отправка сообщения
+    WAIT_HEADER = "wait_header"         # От отправки до заголовка ответа
+    READ_BODY = "read_body"             # Чтение тела, вместе с расшифровкой и распаковкой на лету
+    DECRYPT = "decrypt"                 # Расшифровка тела ответа
+    DECOMPRESS = "decompress"           # Распаковка тела ответа
+    PARSE = "xml_parse"                 # Разбор xml ответа
+    VALIDATE = "validation"             # Сборка pydantic модели ответа
+
+
+class Timer:
+    """
+    Время фаз сообщения, секунды
+    С выключенными метриками (instrumentation.enabled = False) время не берётся совсем
+    """
+    __slots__ = ("timings",)
+
+    def __init__(self):
+        self.timings: Dict[str, float] = dict()
+
+    @staticmethod
+    def now() -> float:
+        """Начало фазы, 0 - если метрики выключены"""
+        return perf_counter() if instrumentation.enabled else 0.0
+
+    @staticmethod
+    def elapsed(started: float) -> float:
+        """Время от started, 0 - если метрики выключены"""
+        if not started or not instrumentation.enabled:
+            return 0.0
+        return perf_counter() - started
+
+    def add(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def since(self, phase: str, started: float) -> float:
+        """Записать время фазы от started, вернуть текущее время для следующей фазы"""
+        if not started or not instrumentation.enabled:
+            # Метрики выключены или были выключены в начале фазы
+            return 0.0
+        now = perf_counter()
+        self.add(phase, now - started)
+        return now
+
+
+class Instrumentation:
+    """
+    Метрики клиента в OpenTelemetry по методам сирены:
+    время фаз запроса, размеры сообщений, степень сжатия, повторы и хендшейки
+
+    Без настроенного MeterProvider инструменты ничего не делают,
+    enabled = False отключает запись совсем
+    """
+    enabled: bool = True
+
+    def __init__(self, meter_name: str = "sirena-client"):
+        meter = metrics.get_meter(meter_name)
+        self.phase_duration = meter.create_histogram(
+            "sirena.client.phase.duration", unit="s", description="Время фазы запроса к сирене",
+        )
+        self.message_size = meter.create_histogram(
+            "sirena.client.message.size", unit="By", description="Размер тела сообщения на проводе",
+        )
+        self.compression_ratio = meter.create_histogram(
+            "sirena.client.compression.ratio", unit="1", description="Размер тела до сжатия к размеру после",
+        )
+        self.retries = meter.create_counter(
+            "sirena.client.retries", unit="1", description="Повторы запросов",
+        )
+        self.handshakes = meter.create_counter(
+            "sirena.client.handshakes", unit="1", description="Согласования симметричного ключа",
+        )
+
+    def phase(self, method: str, phase: str, seconds: float):
+        if self.enabled:
+            self.phase_duration.record(seconds, {"sirena.method": method, "sirena.phase": phase})
+
+    def phases(self, method: str, timer: Optional[Timer]):
+        if not self.enabled or timer is None:
+            return
+        for phase, seconds in timer.timings.items():
+            self.phase_duration.record(seconds, {"sirena.method": method, "sirena.phase": phase})
+
+    def message(self, method: str, direction: str, size: int, raw_size: Optional[int] = None):
+        """
+        :param direction: request или response
+        :param size: размер тела на проводе
+        :param raw_size: размер тела до сжатия, если оно сжато
+        """
+        if not self.enabled:
+            return
+        attributes = {"sirena.method": method, "sirena.direction": direction, "sirena.compressed": bool(raw_size)}
+        self.message_size.record(size, attributes)
+        if raw_size and size:
+            self.compression_ratio.record(raw_size / size, attributes)
+
+    def retry(self, method: str, reason: str, count: int = 1):
+        """
+        :param reason: not_processed - флаг "запрос не обработан" в заголовке, key_error - неизвестный ключ,
+            pult_busy - занят пульт (33002), error - пачка массового запроса оборвалась на ошибке соединения
+        """
+        if self.enabled and count:
+            self.retries.add(count, {"sirena.method": method, "sirena.retry.reason": reason})
+
+    def handshake(self):
+        if self.enabled:
+            self.handshakes.add(1)
+
+
+# Общие на процесс инструменты
+instrumentation = Instrumentation()
@@ -1,6 +1,7 @@
 from abc import abstractmethod
-from typing import Optional
-from zlib import compress, decompress
+from typing import Optional, Union
+from zlib import compress, decompressobj
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.messaging.message import MessageABC
 from utair.clients.external.sirena.base.messaging.header import Header
 
@@ -24,17 +25,46 @@ class RequestABC(MessageABC):
         self.is_compressed_request = gzip_request
         self.is_compressed_response = gzip_response
 
+        # Тела меньше порога и тела, которые не ужались, уходят без сжатия
+        self.compress_min_size: int = kwargs.get('compress_min_size', 0)
+        self.compress_level: int = kwargs.get('compress_level', -1)
+
         self.method_name = kwargs.get('method_name')
+        # Время сборки, сжатия, шифрования и отправки
+        self.timer: Timer = kwargs.get('timer') or Timer()
+        # Размер отправленного тела на проводе
+        self.size: int = 0
 
     @abstractmethod
     def make_message(self, client_id: int) -> bytes:
         raise NotImplementedError()
 
+    @staticmethod
+    def assemble(header: Header, body: bytes = b'') -> bytearray:
+        """
+        Сообщение одним буфером: заголовок пишется на место, тело копируется один раз
+        Если тело не передано, его место (header.chunk_len байт) заполняет вызывающий
+        """
+        message = bytearray(Header.size + header.chunk_len)
+        header.pack_into(message)
+        if body:
+            message[Header.size:] = body
+        return message
+
     def prepare_message(self) -> (bytes, bytes):
         body = self.body
         flag = 0x00
+        if self.is_compressed_request and len(body) >= self.compress_min_size:
+            started = Timer.now()
+            compressed = compress(body, self.compress_level)
+            self.timer.since(Phase.COMPRESS, started)
+            if len(compressed) < len(body):
+                body = compressed
+            else:
+                self.is_compressed_request = False
+        else:
+            self.is_compressed_request = False
         if self.is_compressed_request:
-            body = compress(self.body)
             flag = flag | self._request_compression_flag
         if self.is_compressed_response:
             flag = flag | self._response_compression_flag
@@ -48,7 +78,12 @@ class ResponseABC(MessageABC):
     """
     Абстрактный класс низкоуровнего ответа от шлюза сирены
     """
+    # Размер куска, которым тело целиком прогоняется через расшифровку и распаковку в parse
+    decode_chunk_size: int = 64 * 1024
+
     def __init__(self, header: Header, **kwargs):
+        # Размер тела на проводе, body_len уменьшается по мере чтения
+        self.size = header.chunk_len
         self.body_len = header.chunk_len
         self.is_compressed = header.is_compressed
         self.timestamp = header.timestamp
@@ -56,9 +91,16 @@ class ResponseABC(MessageABC):
         self.success = bool(header)
         self.key_id = header.key_id
 
-        self.payload = None
+        # Тело как пришло (после расшифровки и распаковки), xml разбирается из него без декодирования
+        self.raw_payload: Optional[Union[bytes, bytearray, str]] = None
+        self._payload: Optional[str] = None
         self.method_name = kwargs.get('method_name')
 
+        self._decompressor = None
+        self._buffer: Optional[bytearray] = None
+        # Время чтения, расшифровки, распаковки и разбора
+        self.timer = Timer()
+
     def __nonzero__(self) -> bool:
         return self.success
 
@@ -67,17 +109,64 @@ class ResponseABC(MessageABC):
     def __repr__(self):
         return f"{self.__class__.__name__} with ID: {self.msg_id}, status: {self.success}"
 
+    @property
+    def payload(self) -> Optional[str]:
+        """
+        Тело ответа строкой, декодируется при первом обращении
+        """
+        if self._payload is None and self.raw_payload:
+            raw = self.raw_payload
+            self._payload = raw if isinstance(raw, str) else raw.decode('utf-8')
+        return self._payload
+
+    @payload.setter
+    def payload(self, value: Optional[Union[bytes, bytearray, str]]):
+        self.raw_payload = value
+        self._payload = None
+
     def decode(self):
-        self.payload = self.payload.decode('utf-8') if self.payload else None
-
-    def parse(self, body) -> bytes:
-        """Обработчик тела ответа"""
-        result = body
-        if self.is_compressed:
-            try:
-                result = decompress(result)
-            except Exception:
-                raise
-        self.payload = result
-        self.decode()
-        return result
+        # payload и так отдаётся строкой, оставлено для совместимости
+        self.payload = self.payload
+
+    def start(self):
+        """
+        Начало потокового чтения тела
+        """
+        self._decompressor = decompressobj() if self.is_compressed else None
+        self._buffer = bytearray()
+
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]):
+        """
+        Очередной кусок тела из сокета
+        Ссылку на кусок не храним, буфер под него можно переиспользовать
+        """
+        self._write(chunk)
+
+    def finish(self) -> bytearray:
+        """
+        Конец тела, в payload остаётся распакованный xml
+        """
+        if self._decompressor is not None:
+            started = Timer.now()
+            self._buffer += self._decompressor.flush()
+            self.timer.since(Phase.DECOMPRESS, started)
+        self.payload, self._buffer, self._decompressor = self._buffer, None, None
+        return self.raw_payload
+
+    def _write(self, data: Union[bytes, bytearray, memoryview]):
+        if self._decompressor is not None:
+            started = Timer.now()
+            data = self._decompressor.decompress(data)
+            self.timer.since(Phase.DECOMPRESS, started)
+        self._buffer += data
+
+    def parse(self, body) -> bytearray:
+        """
+        Обработчик тела ответа, прочитанного целиком
+        Тело остаётся байтами в raw_payload, xml разбирается из них без декодирования в строку
+        """
+        self.start()
+        view = memoryview(body)
+        for offset in range(0, len(view), self.decode_chunk_size):
+            self.feed(view[offset:offset + self.decode_chunk_size])
+        return self.finish()
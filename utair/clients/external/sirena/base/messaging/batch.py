@@ -1,6 +1,7 @@
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
 from utair.clients.external.sirena.base.messaging.request import RequestABC
+from utair.clients.external.sirena.base.models.base_client_request import RequestModelABC
 from utair.clients.external.sirena.base.models.base_client_response import ResponseModelABC
 
 
@@ -49,3 +50,46 @@ class Batch:
     @property
     def requests(self) -> List[Request]:
         return [r for r in self._request_map.values()]
+
+
+@dataclass
+class BulkResult:
+    index: int                                      # Позиция запроса во входном списке
+    request: RequestModelABC
+    response: Optional[ResponseModelABC] = None     # Ответ сирены, ошибка сирены лежит в response.error
+    error: Optional[Exception] = None               # Ошибка запроса: ответ не получен или в нём ошибка сирены
+
+    def __bool__(self) -> bool:
+        return self.error is None
+
+    def raise_for_error(self):
+        if self.error is not None:
+            raise self.error
+
+
+@dataclass(eq=False)
+class BulkItem:
+    """Уникальный запрос массового поиска и позиции его дублей во входном списке"""
+    request: RequestModelABC
+    indexes: List[int] = field(default_factory=list)
+    attempts: int = 0
+    response: Optional[ResponseModelABC] = None
+    error: Optional[Exception] = None
+    done: bool = False                              # Результат уже отдан
+
+    def results(self, requests: List[RequestModelABC]) -> List[BulkResult]:
+        """
+        Результат на каждую позицию запроса
+        Дубли получают свой разбор того же ответа, словари ответа между позициями не общие
+        :param requests: входной список запросов
+        """
+        results = []
+        for n, index in enumerate(self.indexes):
+            response = self.response
+            if n and response is not None:
+                response = type(response).parse(response.response)
+            error = self.error
+            if error is None and response is not None:
+                error = response.error
+            results.append(BulkResult(index, requests[index], response, error))
+        return results
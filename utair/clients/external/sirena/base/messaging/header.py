@@ -1,5 +1,5 @@
 from time import time
-from struct import unpack, pack
+from struct import unpack, pack, pack_into
 from dataclasses import dataclass
 from utair.clients.external.sirena.base.messaging.message import MessageABC
 
@@ -73,3 +73,10 @@ class Header(MessageABC):
             self.msg_id, self.client_id, self.meta_flag, self.success_flag, self.key_id
         )
         return header
+
+    def pack_into(self, buffer: bytearray, offset: int = 0):
+        """Записать заголовок в начало готового буфера сообщения"""
+        pack_into(
+            self._format, buffer, offset, self.chunk_len, int(time()),
+            self.msg_id, self.client_id, self.meta_flag, self.success_flag, self.key_id
+        )
@@ -8,6 +8,7 @@ from Crypto.Signature import pkcs1_15
 
 
 from utair.clients.external.sirena.base.messaging.base import RequestABC, Header
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 
 
 class Request(RequestABC):
@@ -15,7 +16,7 @@ class Request(RequestABC):
 
     encryption_flag = None
 
-    def make_message(self, client_id=None) -> bytes:
+    def make_message(self, client_id=None) -> bytearray:
         body, meta = self.prepare_message()
         header = Header(
             len(body),
@@ -25,8 +26,7 @@ class Request(RequestABC):
             meta,
             0x00
         )
-        msg = bytes(header) + body
-        return msg
+        return self.assemble(header, body)
 
 
 class RequestEncryptedSym(RequestABC):
@@ -58,12 +58,14 @@ class RequestEncryptedSym(RequestABC):
             message_bytes += bytes([one]) * one
         return message_bytes
 
-    def make_message(self, client_id=None) -> bytes:
+    def make_message(self, client_id=None) -> bytearray:
         body, meta = self.prepare_message()
-        body = self.pad(body)
-        encrypted_body = self.key.encrypt(body)
+        # Шифруем сразу в буфер сообщения: целые блоки как есть,
+        # добиваем только последний неполный блок
+        aligned = len(body) - len(body) % self.block_size
+        last_block = self.pad(body[aligned:])
         header = Header(
-            len(encrypted_body),
+            aligned + len(last_block),
             int(time()),
             self.msg_id,
             client_id,
@@ -71,7 +73,13 @@ class RequestEncryptedSym(RequestABC):
             0x00,
             self.key_id
         )
-        msg = bytes(header) + encrypted_body
+        msg = self.assemble(header)
+        encrypted_body = memoryview(msg)[Header.size:]
+        started = Timer.now()
+        if aligned:
+            self.key.encrypt(memoryview(body)[:aligned], output=encrypted_body[:aligned])
+        self.key.encrypt(last_block, output=encrypted_body[aligned:])
+        self.timer.since(Phase.ENCRYPT, started)
         return msg
 
 
@@ -115,9 +123,11 @@ class RequestEncryptedAsym(RequestABC):
         body = password_crypted_len + message_encrypted + signature
         return body
 
-    def make_message(self, client_id=None):
+    def make_message(self, client_id=None) -> bytearray:
         body, meta = self.prepare_message()
+        started = Timer.now()
         body = self.encrypt(body)
+        self.timer.since(Phase.ENCRYPT, started)
         header = Header(
             len(body),
             int(time()),
@@ -126,5 +136,4 @@ class RequestEncryptedAsym(RequestABC):
             meta,
             0x00,
         )
-        msg = bytes(header) + body
-        return msg
+        return self.assemble(header, body)
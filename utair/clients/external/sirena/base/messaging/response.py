@@ -1,7 +1,9 @@
 from struct import unpack
+from typing import Union
 from Crypto.Cipher import DES, PKCS1_v1_5
 from Crypto.PublicKey import RSA
 from utair.clients.external.sirena.base.messaging.base import ResponseABC, Header
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena.base.types import AsymEncryptionHandShake
 
 
@@ -15,6 +17,7 @@ class ResponseEncryptedSym(ResponseABC):
     """
     Ответ зашифрованный симмитричным ключем
     """
+    block_size: int = 8
 
     def __init__(
             self,
@@ -28,21 +31,46 @@ class ResponseEncryptedSym(ResponseABC):
         )
         self.key: DES = key
 
-    def decrypt(self, body: bytes) -> str:
+    def decrypt(self, body: bytes) -> bytes:
+        started = Timer.now()
         plaintext = self.key.decrypt(body)
+        self.timer.since(Phase.DECRYPT, started)
         return plaintext
 
-    def parse(self, body):
-        """Обработчик тела ответа"""
-        body = self.decrypt(body)
-        decompressed = super(ResponseEncryptedSym, self).parse(body)
-        self.payload = self.un_pad(decompressed)
+    def start(self):
+        super().start()
+        # Хвост куска, не кратный блоку DES, ждёт следующего куска
+        self._tail = b''
+
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]):
+        """Расшифровываем тело поблочно по мере чтения"""
+        if self._tail:
+            chunk = self._tail + bytes(chunk)
+        view = memoryview(chunk)
+        aligned = len(view) - len(view) % self.block_size
+        self._tail = bytes(view[aligned:])
+        if aligned:
+            self._write(self.decrypt(view[:aligned]))
+
+    def finish(self) -> bytearray:
+        if self._tail:
+            # Тело не кратно блоку, DES упадёт с ошибкой как и при расшифровке целиком
+            self._write(self.decrypt(self._tail))
+        payload = super().finish()
+        self.un_pad(payload)
+        return payload
 
     @classmethod
-    def un_pad(cls, message_bytes: bytes) -> bytes:
-        """Распаковать сообщение по стандартам PKCS padding"""
-        one = message_bytes[-1]
+    def un_pad(cls, message_bytes: Union[bytes, bytearray]) -> Union[bytes, bytearray]:
+        """
+        Распаковать сообщение по стандартам PKCS padding
+        bytearray обрезается на месте
+        """
+        one = message_bytes[-1] if message_bytes else 0
         if 0 < one < 8:
+            if isinstance(message_bytes, bytearray):
+                del message_bytes[-one:]
+                return message_bytes
             return message_bytes[:-one]
         return message_bytes
 
@@ -62,6 +90,17 @@ class ResponseEncryptedAsym(ResponseABC):
         self.public_key = public_key
         super().__init__(header, method_name=kwargs.get('method_name'))
 
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]):
+        # RSA расшифровывается только целиком, копим тело
+        self._buffer += chunk
+
+    def finish(self):
+        body, self._buffer = self._buffer, None
+        started = Timer.now()
+        self.parse(body)
+        self.timer.since(Phase.DECRYPT, started)
+        return self.payload
+
     def parse(self, body):
         """Обработчик тела ответа на запрос"""
         # Длина зашифрованного сообщения в сетевом формате находится в первых 4 байтах сообщения
@@ -1,7 +1,11 @@
-from typing import Optional
+from typing import Optional, ClassVar
 from abc import ABC, abstractmethod
 from pydantic import BaseModel, field_validator, Field
-from xmltodict import unparse
+from utair.clients.external.sirena.base.models.request_serializer import (
+    RequestSerializerABC,
+    XmlSerializer,
+    remove_empty_values,
+)
 from utair.clients.external.sirena.base.types import AsymEncryptionHandShake, PublicMethods
 
 
@@ -9,6 +13,9 @@ class RequestModelABC(BaseModel, ABC):
     _method_name: str = ''
     _nested: bool = False   # Вложенная часть
 
+    # Движок сборки xml, можно подменить на XmlToDictSerializer()
+    serializer: ClassVar[RequestSerializerABC] = XmlSerializer()
+
     @field_validator("rloc", check_fields=False)
     def format_rloc(cls, rloc: Optional[str]) -> Optional[str]:
         """
@@ -51,36 +58,25 @@ class RequestModelABC(BaseModel, ABC):
         """
         Удаляем пустые значения из запроса
         """
-        return cls._recursive_filter(payload, None, list(), dict())
-
-    @classmethod
-    def _recursive_filter(cls, item, *forbidden):
-        if isinstance(item, list):
-            return [cls._recursive_filter(entry, *forbidden) for entry in item if entry not in forbidden]
-        if isinstance(item, dict):
-            result = {}
-            for key, value in item.items():
-                if isinstance(value, float):
-                    value = str(value)
-                value = cls._recursive_filter(value, *forbidden)
-                if key not in forbidden and value not in forbidden:
-                    result[key] = value
-            return result
-        return item
+        return remove_empty_values(payload)
 
     def prepare_payload(self) -> bytes:
         """
         Подготовка запроса
         """
-        blank_dict = {
-            'sirena': {
-                'query': {
-                    self.method_name: self._remove_empty_values(self.build())
-                }
-            }
-        }
-        xml_query = unparse(blank_dict).encode('utf-8')
-        return xml_query
+        return self.serialize(self.build_payload())
+
+    def build_payload(self) -> dict:
+        """
+        Запрос словарём, пустые значения убирает serialize
+        """
+        return self.build()
+
+    def serialize(self, payload: dict) -> bytes:
+        """
+        Словарь запроса в xml
+        """
+        return self.serializer.serialize(self.method_name, payload)
 
 
 class KeyInfoRequest(RequestModelABC):
@@ -1,9 +1,14 @@
 from abc import ABC
-from typing import Optional, Dict
+from typing import Optional, Dict, ClassVar
 from pydantic import BaseModel, PrivateAttr
-from xmltodict import parse, expat
 from utair.clients.external.sirena.base.messaging.response import ResponseABC
+from utair.clients.external.sirena.base.models.response_parser import (
+    ResponseParserABC,
+    ElementTreeParser,
+    ParsedDocument,
+)
 from utair.clients.external.sirena.base.exception import BaseError
+from utair.clients.external.sirena.base.instrumentation import Phase, Timer
 from utair.clients.external.sirena import exceptions
 from utair.clients.external.sirena.base.types import (
     AsymEncryptionHandShake,
@@ -63,7 +68,11 @@ class ResponseModelABC(BaseModel, ABC):
     response: ResponseABC
     error: Optional[BaseError] = None
 
-    _parsed_response: Optional[Dict] = PrivateAttr(default=None)
+    # Движок разбора xml, можно подменить на XmlToDictParser() или ElementTreeParser(lazy=False)
+    parser: ClassVar[ResponseParserABC] = ElementTreeParser()
+
+    _document: Optional[ParsedDocument] = PrivateAttr(default=None)
+    _document_parsed: bool = PrivateAttr(default=False)
     _root_level_key: str = "answer"
 
     class Config:
@@ -82,15 +91,29 @@ class ResponseModelABC(BaseModel, ABC):
 
     @classmethod
     def parse(cls, response: ResponseABC) -> "ResponseModelABC":
-        response = cls(response=response)
-        response._check_for_error()
-        return response
+        started = Timer.now()
+        model = cls(response=response)
+        started = response.timer.since(Phase.VALIDATE, started)
+        model._check_for_error()
+        # Проверка ошибок разбирает xml, в ленивом режиме словари собираются позже
+        response.timer.since(Phase.PARSE, started)
+        return model
+
+    @property
+    def document(self) -> Optional[ParsedDocument]:
+        if not self._document_parsed:
+            self._document = self._parse_response()
+            self._document_parsed = True
+        return self._document
 
     @property
     def payload(self) -> Optional[Dict]:
-        if self._parsed_response is None:
-            self._parsed_response = self._parse_response()
-        return self._parsed_response
+        """
+        Ответ целиком (содержимое тега sirena)
+        """
+        if self.document is None:
+            return None
+        return self.document.to_dict()
 
     def raise_for_error(self):
         if self.error is not None:
@@ -114,53 +137,26 @@ class ResponseModelABC(BaseModel, ABC):
 
     @property
     def data(self) -> Optional[Dict]:
-        if not self.payload or self.error is not None:
-            return self.payload
-        return self.payload[self._root_level_key][self.method_name]
-
-    @staticmethod
-    def _remove_symbol(_base_xml: str, _line_no: int, _offset: int) -> str:
         """
-        Метод вырезания некорректного символа в xml, который не позволяет корректно распарсить xml
-        :param _base_xml: базовый текст xml
-        :param _line_no: номер строки, на которой произошла ошибка
-        :param _offset: отступ с начала строки, на котором произошла ошибка
-        :return: скорректированный xml
+        Ответ метода (содержимое answer/<method>), KeyError если его нет в ответе
+        В ленивом режиме разбора собирается только это поддерево
         """
-        splitted = _base_xml.split("\n")
-        line = splitted[_line_no - 1]
-        splitted[_line_no - 1] = line[:_offset] + line[_offset + 1 :]
-        return "\n".join(splitted)
-
-    def _parse_response(self) -> Optional[Dict]:
-        """
-        В некоторых случаях агенты добавляют нечитаемые символы
-        в элементы, пробуем распарсить несколько раз
-        """
-        result = None
-        result_attempt = 0
-        payload = self.response.payload
-        while not result and result_attempt < 5:
-            try:
-                result = dict(
-                    parse(
-                        payload,
-                        attr_prefix="@",
-                        cdata_key="text",
-                        force_list=self._get_force_list(self.method_name),
-                        dict_constructor=dict,
-                    )
-                )["sirena"]
-            except expat.ExpatError as e:
-                if (
-                    self.response.method_name
-                    == AsymEncryptionHandShake.ASYM_HAND_SHAKE.value
-                ):
-                    payload = self._remove_symbol(payload, e.lineno, e.offset - 1)
-                else:
-                    payload = self._remove_symbol(payload, e.lineno, e.offset)
-                result_attempt += 1
-        return result
+        if self.document is None or self.error is not None:
+            return self.payload
+        data = self.document.find(self._root_level_key, self.method_name)
+        if data is None:
+            # Пустой тег или его нет совсем - различаем по полному ответу
+            return self.payload[self._root_level_key][self.method_name]
+        return data
+
+    def _parse_response(self) -> Optional[ParsedDocument]:
+        if not self.response.raw_payload:
+            return None
+        return self.parser.parse(
+            self.response.raw_payload,
+            self.method_name,
+            self._get_force_list(self.method_name),
+        )
 
     @staticmethod
     def _get_force_list(method_name: str):
@@ -215,17 +211,18 @@ class ResponseModelABC(BaseModel, ABC):
         return tuple()
 
     def _check_for_error(self):
-        self._check_expired_keys_error(self.payload)
-
-        error_level = self.payload.get(self._root_level_key, dict()).get(
-            self.method_name
-        )
-        if not error_level:
+        if self.document is None:
             return
-        if "error" not in error_level:
+        self._check_expired_keys_error(self.document)
+
+        # Собираем только тег ошибки, а не весь ответ
+        error = self.document.find(self._root_level_key, self.method_name, "error")
+        if error is None:
             return
-        error_code = error_level.get("error", {}).get("@code")
-        error_text = error_level.get("error", {}).get("text")
+        if isinstance(error, dict):
+            error_code, error_text = error.get("@code"), error.get("text")
+        else:
+            error_code, error_text = None, error
         if error_code in EXCEPTION_MAP:
             error_class = EXCEPTION_MAP[error_code]
             self.error = error_class()
@@ -234,11 +231,10 @@ class ResponseModelABC(BaseModel, ABC):
             message=f"Unhandled error by sirena response with code {error_code}: {error_text}"
         )
 
-    def _check_expired_keys_error(self, error: Dict):
-        root_level = error.get(self._root_level_key)
-        error = root_level.get("error")
+    def _check_expired_keys_error(self, document: ParsedDocument):
+        error = document.find(self._root_level_key, "error")
         if not error and self.method_name != "describe":
-            error = root_level.get("describe")
+            error = document.find(self._root_level_key, "describe")
         if not error:
             return
         if error and all(
@@ -0,0 +1,218 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Tuple
+from xml.sax.saxutils import quoteattr
+
+from xmltodict import unparse
+
+_ATTR_PREFIX = "@"
+_CDATA_KEY = "#text"
+_XMLNS_KEY = "@xmlns"
+_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+# Пустые значения, которые не попадают в запрос
+_EMPTY = (None, list(), dict())
+
+
+def remove_empty_values(item: Any) -> Any:
+    """
+    Удаляем пустые значения из запроса рекурсивно, float приводятся к строке
+    Элемент списка проверяется до очистки: словарь, ставший пустым, в списке остаётся
+    """
+    if isinstance(item, list):
+        return [remove_empty_values(entry) for entry in item if entry not in _EMPTY]
+    if isinstance(item, dict):
+        result = {}
+        for key, value in item.items():
+            if isinstance(value, float):
+                value = str(value)
+            value = remove_empty_values(value)
+            if key not in _EMPTY and value not in _EMPTY:
+                result[key] = value
+        return result
+    return item
+
+
+def _escape(data: str) -> str:
+    if "&" in data:
+        data = data.replace("&", "&amp;")
+    if ">" in data:
+        data = data.replace(">", "&gt;")
+    if "<" in data:
+        data = data.replace("<", "&lt;")
+    return data
+
+
+class RequestSerializerABC(ABC):
+    """
+    Движок сборки xml запроса к сирене
+    """
+
+    @abstractmethod
+    def serialize(self, method_name: str, payload: Any) -> bytes:
+        """
+        :param method_name: метод в сирене
+        :param payload: результат build() запроса, пустые значения ещё не удалены
+        """
+        raise NotImplementedError()
+
+
+class XmlToDictSerializer(RequestSerializerABC):
+    """
+    Сборка через xmltodict: очистка словаря от пустых значений, затем unparse
+    """
+
+    def serialize(self, method_name: str, payload: Any) -> bytes:
+        document = {
+            'sirena': {
+                'query': {
+                    method_name: remove_empty_values(payload)
+                }
+            }
+        }
+        return unparse(document).encode('utf-8')
+
+
+class XmlSerializer(RequestSerializerABC):
+    """
+    Сборка xml за один проход по результату build()
+
+    Пустые значения пропускаются на лету, без промежуточного очищенного словаря и SAX генератора.
+    Обёртка запроса собирается один раз на метод, открывающие и закрывающие теги - один раз на имя.
+    Результат побайтово совпадает с XmlToDictSerializer.
+    """
+
+    def __init__(self):
+        self._envelopes: Dict[str, Tuple[str, str]] = dict()
+        self._tags: Dict[str, Tuple[str, str, str]] = dict()
+
+    def serialize(self, method_name: str, payload: Any) -> bytes:
+        envelope = self._envelopes.get(method_name)
+        if envelope is None:
+            envelope = self._envelopes[method_name] = (
+                f"{_DECLARATION}<sirena><query>", "</query></sirena>"
+            )
+        head, tail = envelope
+        out: List[str] = [head]
+        # Корень запроса пишется, даже если после очистки он пуст
+        if isinstance(payload, dict):
+            self._dict(out, method_name, payload, filtered=True, keep_empty=True)
+        elif isinstance(payload, list):
+            self._raw(out, method_name, remove_empty_values(payload))
+        else:
+            self._raw(out, method_name, payload)
+        out.append(tail)
+        return "".join(out).encode("utf-8")
+
+    def _tag(self, key: str) -> Tuple[str, str, str]:
+        """<key>, <key и </key>"""
+        tag = self._tags.get(key)
+        if tag is None:
+            tag = self._tags[key] = (f"<{key}>", f"<{key}", f"</{key}>")
+        return tag
+
+    def _dict(self, out: List[str], key: str, value: dict, filtered: bool, keep_empty: bool) -> bool:
+        """
+        Элемент из словаря
+        :param filtered: пропускать пустые значения
+        :param keep_empty: писать элемент, даже если после очистки словарь пуст
+        :return: элемент записан
+        """
+        mark = len(out)
+        # Место под открывающий тег, атрибуты известны только после обхода
+        out.append("")
+        attrs = None
+        cdata = None
+        kept = False
+        for child_key, child in value.items():
+            if filtered:
+                if isinstance(child, float):
+                    child = str(child)
+                if child_key == _CDATA_KEY or child_key.startswith(_ATTR_PREFIX):
+                    child = remove_empty_values(child)
+                    if child in _EMPTY:
+                        continue
+                elif not self._child(out, child_key, child):
+                    continue
+                kept = True
+            elif not (child_key == _CDATA_KEY or child_key.startswith(_ATTR_PREFIX)):
+                self._raw(out, child_key, child)
+                continue
+
+            if child_key == _CDATA_KEY:
+                cdata = child
+            elif child_key.startswith(_ATTR_PREFIX):
+                if attrs is None:
+                    attrs = dict()
+                if child_key == _XMLNS_KEY and isinstance(child, dict):
+                    for prefix, uri in child.items():
+                        attrs[f"xmlns:{prefix}" if prefix else "xmlns"] = str(uri)
+                else:
+                    attrs[child_key[1:]] = child if isinstance(child, str) else str(child)
+
+        if filtered and not kept and not keep_empty:
+            del out[mark:]
+            return False
+
+        opened, start, closed = self._tag(key)
+        if attrs:
+            out[mark] = start + "".join(f" {name}={quoteattr(v)}" for name, v in attrs.items()) + ">"
+        else:
+            out[mark] = opened
+        if cdata:
+            if not isinstance(cdata, str):
+                cdata = str(cdata, "utf-8")
+            out.append(_escape(cdata))
+        out.append(closed)
+        return True
+
+    def _child(self, out: List[str], key: str, value: Any) -> bool:
+        """
+        Значение словаря с очисткой от пустых значений
+        :return: элемент записан
+        """
+        if value is None:
+            return False
+        if isinstance(value, dict):
+            return self._dict(out, key, value, filtered=True, keep_empty=False)
+        if isinstance(value, list):
+            entries = [entry for entry in value if entry not in _EMPTY]
+            if not entries:
+                return False
+            for entry in entries:
+                if isinstance(entry, dict):
+                    # Словарь в списке остаётся, даже если после очистки пуст
+                    self._dict(out, key, entry, filtered=True, keep_empty=True)
+                elif isinstance(entry, list):
+                    self._scalar(out, key, remove_empty_values(entry))
+                else:
+                    self._scalar(out, key, entry)
+            return True
+        if isinstance(value, str) or not hasattr(value, "__iter__"):
+            self._scalar(out, key, value)
+            return True
+        # Прочие коллекции очистка не трогает
+        self._raw(out, key, value)
+        return True
+
+    def _raw(self, out: List[str], key: str, value: Any):
+        """Значение без очистки, как его пишет xmltodict"""
+        if not hasattr(value, "__iter__") or isinstance(value, (str, dict)):
+            value = [value]
+        for entry in value:
+            if entry is None:
+                entry = dict()
+            if isinstance(entry, dict):
+                self._dict(out, key, entry, filtered=False, keep_empty=True)
+            else:
+                self._scalar(out, key, entry)
+
+    def _scalar(self, out: List[str], key: str, value: Any):
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif not isinstance(value, str):
+            value = str(value)
+        opened, _, closed = self._tag(key)
+        if value:
+            out.append(opened + _escape(value) + closed)
+        else:
+            out.append(opened + closed)
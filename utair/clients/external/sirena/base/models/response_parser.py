@@ -0,0 +1,239 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Sequence, Union
+from xml.etree.ElementTree import Element, XMLParser, ParseError
+
+from xmltodict import parse, expat
+from utair.clients.external.sirena.base.types import AsymEncryptionHandShake
+
+# Управляющие символы, недопустимые в XML 1.0 (кроме \t, \n, \r)
+_INVALID_XML_BYTES = bytes(b for b in range(0x20) if b not in (0x09, 0x0A, 0x0D))
+_INVALID_XML_BYTES_RE = re.compile(b"[" + re.escape(_INVALID_XML_BYTES) + b"]")
+
+_ATTR_PREFIX = "@"
+_CDATA_KEY = "text"
+
+
+class ParsedDocument:
+    """
+    Разобранный ответ сирены (содержимое корневого тега sirena)
+    """
+
+    def __init__(self, data: Optional[Dict]):
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return self._data
+
+    def find(self, *path: str) -> Any:
+        """
+        Поддерево по пути от корня, None если его нет
+        """
+        node = self.to_dict()
+        for key in path:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+
+class ResponseParserABC(ABC):
+    """
+    Движок разбора xml ответа сирены
+    """
+
+    @abstractmethod
+    def parse(
+            self,
+            payload: Union[bytes, str],
+            method_name: str,
+            force_list: Sequence[str]
+    ) -> Optional[ParsedDocument]:
+        """
+        :param payload: тело ответа
+        :param method_name: метод в сирене
+        :param force_list: теги, которые всегда разбираются в список
+        """
+        raise NotImplementedError()
+
+
+class XmlToDictParser(ResponseParserABC):
+    """
+    Разбор через xmltodict
+
+    В некоторых случаях агенты добавляют нечитаемые символы
+    в элементы, пробуем распарсить несколько раз, вырезая символ, на котором упал парсер
+    """
+    max_attempts: int = 5
+
+    def parse(
+            self,
+            payload: Union[bytes, str],
+            method_name: str,
+            force_list: Sequence[str]
+    ) -> Optional[ParsedDocument]:
+        result = None
+        result_attempt = 0
+        while not result and result_attempt < self.max_attempts:
+            try:
+                result = dict(
+                    parse(
+                        payload,
+                        attr_prefix=_ATTR_PREFIX,
+                        cdata_key=_CDATA_KEY,
+                        force_list=force_list,
+                        dict_constructor=dict,
+                    )
+                )["sirena"]
+            except expat.ExpatError as e:
+                if not isinstance(payload, str):
+                    payload = bytes(payload).decode("utf-8")
+                if method_name == AsymEncryptionHandShake.ASYM_HAND_SHAKE.value:
+                    payload = self._remove_symbol(payload, e.lineno, e.offset - 1)
+                else:
+                    payload = self._remove_symbol(payload, e.lineno, e.offset)
+                result_attempt += 1
+        return ParsedDocument(result) if result is not None else None
+
+    @staticmethod
+    def _remove_symbol(_base_xml: str, _line_no: int, _offset: int) -> str:
+        """
+        Метод вырезания некорректного символа в xml, который не позволяет корректно распарсить xml
+        :param _base_xml: базовый текст xml
+        :param _line_no: номер строки, на которой произошла ошибка
+        :param _offset: отступ с начала строки, на котором произошла ошибка
+        :return: скорректированный xml
+        """
+        splitted = _base_xml.split("\n")
+        line = splitted[_line_no - 1]
+        splitted[_line_no - 1] = line[:_offset] + line[_offset + 1:]
+        return "\n".join(splitted)
+
+
+class ElementTreeDocument(ParsedDocument):
+    """
+    Ответ, разобранный в дерево ElementTree
+
+    Словари собираются из дерева по запросу и только для нужного поддерева,
+    результат совпадает с тем, что отдаёт xmltodict
+    """
+
+    def __init__(self, root: Element, force_list: Sequence[str]):
+        super().__init__(None)
+        self._root: Optional[Element] = root
+        self._force_list = frozenset(force_list)
+        # Уже собранные поддеревья, чтобы не собирать их повторно при сборке всего документа
+        self._converted: Dict[Element, Any] = dict()
+
+    def to_dict(self) -> Optional[Dict]:
+        if self._root is not None:
+            self._data = self._convert(self._root)
+            # Дерево больше не нужно, освобождаем память
+            self._root = None
+            self._converted.clear()
+        return self._data
+
+    def find(self, *path: str) -> Any:
+        if self._root is None:
+            return super().find(*path)
+        element = self._root
+        for key in path:
+            matches = [child for child in element if child.tag == key]
+            if not matches:
+                return None
+            if len(matches) > 1 or key in self._force_list:
+                # В словаре тут будет список, собираем как есть
+                return super().find(*path)
+            element = matches[0]
+        if element not in self._converted:
+            self._converted[element] = self._convert(element)
+        return self._converted[element]
+
+    def _convert(self, element: Element) -> Any:
+        converted = self._converted
+        if converted and element in converted:
+            return converted[element]
+
+        force_list = self._force_list
+        attrib = element.attrib
+        item: Optional[Dict] = {_ATTR_PREFIX + k: v for k, v in attrib.items()} if attrib else None
+        text = element.text
+        chunks = [text] if text else None
+
+        for child in element:
+            if item is None:
+                item = {}
+            key = child.tag
+            value = self._convert(child)
+            # Повторяющиеся теги собираются в список
+            if key in item:
+                existing = item[key]
+                if isinstance(existing, list):
+                    existing.append(value)
+                else:
+                    item[key] = [existing, value]
+            elif key in force_list:
+                item[key] = [value]
+            else:
+                item[key] = value
+            if child.tail:
+                if chunks is None:
+                    chunks = [child.tail]
+                else:
+                    chunks.append(child.tail)
+
+        # Как и xmltodict: текст элемента вместе с текстом между дочерними тегами
+        data = ("".join(chunks).strip() or None) if chunks else None
+        if item is None:
+            return data
+        if data:
+            if _CDATA_KEY in item:
+                existing = item[_CDATA_KEY]
+                item[_CDATA_KEY] = existing + [data] if isinstance(existing, list) else [existing, data]
+            elif _CDATA_KEY in force_list:
+                item[_CDATA_KEY] = [data]
+            else:
+                item[_CDATA_KEY] = data
+        return item
+
+
+class ElementTreeParser(ResponseParserABC):
+    """
+    Разбор через ElementTree за один проход
+
+    Недопустимые символы вырезаются одним проходом по байтам до разбора,
+    xml разбирается сразу из байт без декодирования в строку.
+    В ленивом режиме словари собираются только при обращении к данным
+    и только для нужного поддерева (answer/<method>), иначе - сразу после разбора.
+    При ошибке разбора и для xml с пространствами имён используется XmlToDictParser.
+    """
+
+    def __init__(self, lazy: bool = True, fallback: Optional[ResponseParserABC] = None):
+        self.lazy = lazy
+        self.fallback = fallback or XmlToDictParser()
+
+    def parse(
+            self,
+            payload: Union[bytes, bytearray, str],
+            method_name: str,
+            force_list: Sequence[str]
+    ) -> Optional[ParsedDocument]:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if _INVALID_XML_BYTES_RE.search(payload):
+            # Копию тела делаем только если есть что вырезать
+            payload = payload.translate(None, _INVALID_XML_BYTES)
+        if b"xmlns" in payload:
+            # ElementTree разворачивает пространства имён в теги, xmltodict - нет
+            return self.fallback.parse(payload, method_name, force_list)
+        try:
+            parser = XMLParser()
+            parser.feed(payload)
+            root = parser.close()
+        except ParseError:
+            return self.fallback.parse(payload, method_name, force_list)
+
+        document = ElementTreeDocument(root, force_list)
+        if not self.lazy:
+            document.to_dict()
+        return document
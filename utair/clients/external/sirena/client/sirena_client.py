@@ -1,9 +1,18 @@
-from typing import Optional
+from typing import Dict, Tuple
 from utair.clients.external.sirena.base.client.async_client_batchable import AsyncBatchableClient
 from utair.clients.external.sirena.base.connection.async_pool import AsyncConnectionPool
+from utair.clients.external.sirena.base.connection.async_multiplexed_pool import AsyncMultiplexedConnectionPool
+from utair.clients.external.sirena.base.cache.async_cache import AsyncCacheController
+from utair.clients.external.sirena.base.cache.async_response_cache import AsyncResponseCache
+from utair.clients.external.sirena.base.client.async_key_manager import AsyncKeyManager
 from utair.clients.external.sirena.config import SirenaClientConfig
 
-_CONNECTION_POOL: Optional[AsyncConnectionPool] = None
+# Пулы соединений по настройкам: сирена, адреса, мультиплексирование и размеры пула
+_CONNECTION_POOLS: Dict[tuple, AsyncConnectionPool] = dict()
+# Кэши ответов по настройкам: сирена, client_id, redis, ttl и размер
+_RESPONSE_CACHES: Dict[tuple, AsyncResponseCache] = dict()
+# Ключи шифрования по клиентам: (host, port, client_id)
+_KEY_MANAGERS: Dict[Tuple[str, int, int], AsyncKeyManager] = dict()
 
 
 class SirenaClient(AsyncBatchableClient):
@@ -20,20 +29,76 @@ class SirenaClient(AsyncBatchableClient):
             private_key_path=self.config.private_key_path,
             pool=self._connection_pool if self.config.use_connection_pool else None,
             redis_url=self.config.redis_url,
-            logger_name=self.config.logger_name
+            logger_name=self.config.logger_name,
+            response_cache=self._response_cache if self.config.use_response_cache else None,
+            key_manager=self._key_manager,
         )
+        self.log_bodies = self.config.log_bodies
+        self.log_sample_rate = self.config.log_sample_rate
+        self.log_body_max_size = self.config.log_body_max_size
+        self.compress_request_min_size = self.config.compress_request_min_size
+        self.compress_level = self.config.compress_level
 
     @property
     def _connection_pool(self) -> AsyncConnectionPool:
-        global _CONNECTION_POOL
-        if not _CONNECTION_POOL:
-            _CONNECTION_POOL = AsyncConnectionPool(
-                host=self.config.host,
-                port=self.config.port,
-                min_size=self.config.pool_min_size,
-                max_size=self.config.pool_max_size
+        pool_config = dict(
+            host=self.config.host,
+            port=self.config.port,
+            min_size=self.config.pool_min_size,
+            max_size=self.config.pool_max_size,
+            endpoints=self.config.pool_endpoints,
+            acquire_timeout=self.config.pool_acquire_timeout,
+            max_waiters=self.config.pool_max_waiters,
+            connect_timeout=self.config.pool_connect_timeout,
+            max_idle_time=self.config.pool_max_idle_time,
+            max_lifetime=self.config.pool_max_lifetime,
+            health_check_interval=self.config.pool_health_check_interval,
+            logger_name=self.config.logger_name,
+        )
+        multiplexing = dict(
+            max_in_flight=self.config.max_in_flight,
+            request_timeout=self.config.request_timeout,
+        ) if self.config.use_multiplexing else dict()
+        key = tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in {**pool_config, **multiplexing}.items()
+        ) + (self.config.use_multiplexing,)
+        if key not in _CONNECTION_POOLS:
+            if self.config.use_multiplexing:
+                _CONNECTION_POOLS[key] = AsyncMultiplexedConnectionPool(**multiplexing, **pool_config)
+            else:
+                _CONNECTION_POOLS[key] = AsyncConnectionPool(**pool_config)
+        return _CONNECTION_POOLS[key]
+
+    @property
+    def _response_cache(self) -> AsyncResponseCache:
+        redis_url = self.config.redis_url if self.config.response_cache_use_redis else None
+        ttl = self.config.response_cache_ttl or dict()
+        key = (
+            self.config.host, self.config.port, self.config.client_id,
+            redis_url, tuple(sorted(ttl.items())), self.config.response_cache_max_size,
+        )
+        if key not in _RESPONSE_CACHES:
+            _RESPONSE_CACHES[key] = AsyncResponseCache(
+                redis_url=redis_url,
+                ttl=ttl,
+                max_size=self.config.response_cache_max_size,
+                namespace=f'{self.config.host}:{self.config.port}:{self.config.client_id}',
+                logger_name=self.config.logger_name,
+            )
+        return _RESPONSE_CACHES[key]
+
+    @property
+    def _key_manager(self) -> AsyncKeyManager:
+        key = (self.config.host, self.config.port, self.config.client_id)
+        if key not in _KEY_MANAGERS:
+            namespace = f'{self.config.host}:{self.config.port}:{self.config.client_id}'
+            _KEY_MANAGERS[key] = AsyncKeyManager(
+                AsyncCacheController(self.config.redis_url, namespace=namespace),
+                refresh_before=self.config.key_refresh_before,
+                logger_name=self.config.logger_name,
             )
-        return _CONNECTION_POOL
+        return _KEY_MANAGERS[key]
 
     async def __aenter__(self) -> "SirenaClient":
         await self.connect(ignore=False)
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Optional, Dict, List
 from dataclasses import dataclass
 import base64
 
@@ -18,7 +18,35 @@ class SirenaClientConfig:
     use_connection_pool: bool = False
     pool_min_size: int = 2
     pool_max_size: int = 4
+    # Несколько шлюзов ["host:port", ...], соединения берутся на наименее загруженном доступном
+    # pool_min_size и pool_max_size считаются на каждый адрес
+    pool_endpoints: Optional[List[str]] = None
+    pool_acquire_timeout: Optional[float] = None        # Время ожидания свободного соединения, секунды
+    pool_max_waiters: Optional[int] = None              # Максимум запросов в очереди за соединением
+    pool_connect_timeout: Optional[float] = 5           # Таймаут подключения к шлюзу, секунды
+    pool_max_idle_time: Optional[float] = 300           # Простаивающие соединения сверх pool_min_size, секунды
+    pool_max_lifetime: Optional[float] = None           # Максимальное время жизни соединения, секунды
+    pool_health_check_interval: Optional[float] = 10    # Период фоновой проверки соединений и адресов, секунды
+    # Несколько запросов одновременно в одном соединении, ответы разбираются по msg_id
+    # Работает только вместе с use_connection_pool
+    use_multiplexing: bool = False
+    max_in_flight: int = 32                 # Максимум запросов без ответа на одно соединение
+    request_timeout: float = 60             # Время ожидания ответа на запрос, секунды
+    # Кэш ответов справочных методов (pricing_route, schedule, ...), общий на процесс для одинаковых настроек
+    use_response_cache: bool = False
+    response_cache_ttl: Optional[Dict[str, int]] = None         # Время жизни по методам, секунды
+    response_cache_max_size: int = 64 * 1024 * 1024            # Размер кэша в памяти, байты
+    response_cache_use_redis: bool = False                      # Второй уровень кэша в redis_url
+    # За сколько секунд до истечения симметричного ключа согласовывать новый, секунды
+    key_refresh_before: int = 10 * 60
+    # Сжатие тел запросов: меньше порога уходят как есть
+    compress_request_min_size: int = 512    # Порог сжатия, байты
+    compress_level: int = 6                 # Уровень сжатия zlib, 1-9
     logger_name: str = 'sirena_client'
+    # Лог запросов: тела пишутся только если логгер пишет INFO
+    log_bodies: bool = True                 # Писать тела запроса и ответа
+    log_sample_rate: float = 1.0            # Доля успешных запросов в логе, ошибки пишутся всегда
+    log_body_max_size: int = 16 * 1024      # Максимальный размер тела в логе, символы
 
     def __post_init__(self):
         try:
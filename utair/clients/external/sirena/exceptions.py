@@ -73,6 +73,13 @@ class SirenaMaxRetriesExceededError(BaseSirenaError):
     message = "The request max count limit has been exceeded."
 
 
+class SirenaPoolExhaustedError(BaseSirenaError):
+    """Не дождались свободного соединения в пуле или очередь ожидающих переполнена"""
+    http_code = 500
+    error_code = 50006
+    message = "No free connection in sirena connection pool"
+
+
 class SirenaWrongDocumentIssuedCountry(BaseSirenaError):
     """Документ не мог быть выпущен в предоставленной с ним стране"""
     http_code = 400
@@ -1,5 +1,14 @@
+from typing import Dict, Tuple
 from utair.clients.external.sirena.config import SirenaClientConfig
 from utair.clients.external.sirena.base.client.sync_client_batchable import SyncBatchableClient
+from utair.clients.external.sirena.base.cache.sync_cache import SyncCacheController
+from utair.clients.external.sirena.base.cache.sync_response_cache import SyncResponseCache
+from utair.clients.external.sirena.base.client.sync_key_manager import SyncKeyManager
+
+# Кэши ответов по настройкам: сирена, client_id, redis, ttl и размер
+_RESPONSE_CACHES: Dict[tuple, SyncResponseCache] = dict()
+# Ключи шифрования по клиентам: (host, port, client_id)
+_KEY_MANAGERS: Dict[Tuple[str, int, int], SyncKeyManager] = dict()
 
 
 class SirenaClient(SyncBatchableClient):
@@ -16,8 +25,45 @@ class SirenaClient(SyncBatchableClient):
             private_key=self.config.private_key,
             private_key_path=self.config.private_key_path,
             redis_url=self.config.redis_url,
-            logger_name=self.config.logger_name
+            logger_name=self.config.logger_name,
+            response_cache=self._response_cache if self.config.use_response_cache else None,
+            key_manager=self._key_manager,
+        )
+        self.log_bodies = self.config.log_bodies
+        self.log_sample_rate = self.config.log_sample_rate
+        self.log_body_max_size = self.config.log_body_max_size
+        self.compress_request_min_size = self.config.compress_request_min_size
+        self.compress_level = self.config.compress_level
+
+    @property
+    def _response_cache(self) -> SyncResponseCache:
+        redis_url = self.config.redis_url if self.config.response_cache_use_redis else None
+        ttl = self.config.response_cache_ttl or dict()
+        key = (
+            self.config.host, self.config.port, self.config.client_id,
+            redis_url, tuple(sorted(ttl.items())), self.config.response_cache_max_size,
         )
+        if key not in _RESPONSE_CACHES:
+            _RESPONSE_CACHES[key] = SyncResponseCache(
+                redis_url=redis_url,
+                ttl=ttl,
+                max_size=self.config.response_cache_max_size,
+                namespace=f'{self.config.host}:{self.config.port}:{self.config.client_id}',
+                logger_name=self.config.logger_name,
+            )
+        return _RESPONSE_CACHES[key]
+
+    @property
+    def _key_manager(self) -> SyncKeyManager:
+        key = (self.config.host, self.config.port, self.config.client_id)
+        if key not in _KEY_MANAGERS:
+            namespace = f'{self.config.host}:{self.config.port}:{self.config.client_id}'
+            _KEY_MANAGERS[key] = SyncKeyManager(
+                SyncCacheController(self.config.redis_url, namespace=namespace),
+                refresh_before=self.config.key_refresh_before,
+                logger_name=self.config.logger_name,
+            )
+        return _KEY_MANAGERS[key]
 
     def __enter__(self) -> "SirenaClient":
         self._ignore_connection_calls = True